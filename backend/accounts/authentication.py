@@ -0,0 +1,124 @@
+"""
+Token authentication without a database query per request.
+
+CachedTokenAuthentication resolves a token to its user like DRF's
+TokenAuthentication, then keeps the token's user (only USER_FIELDS, never
+the password hash) in the shared Django cache for TOKEN_AUTH_CACHE_TTL
+seconds and in a per-process LRU of TOKEN_AUTH_LOCAL_CACHE_SIZE tokens. A process trusts its own copy
+for TOKEN_AUTH_LOCAL_TTL seconds before looking at the shared cache again,
+so a warm request costs no query and usually no cache round trip.
+
+Saving or deleting a user or a token (user updates, password resets, token
+rotation) drops the cached entries (see signals.py). Other processes notice
+within TOKEN_AUTH_LOCAL_TTL seconds.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+# What requests read from request.user: permissions, created_by and /me/.
+# Other fields are loaded from the database if something asks for them.
+USER_FIELDS = [
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in ('id', 'username', 'first_name', 'last_name', 'email',
+                         'is_staff', 'is_superuser', 'is_active')
+]
+
+
+def cache_key(key):
+    # Hashed so the cache never holds usable tokens in its keys
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+class LocalTokenCache:
+    """A thread-safe LRU of token key -> (token, cached_at)"""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, token):
+        with self.lock:
+            self.entries[key] = (token, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = LocalTokenCache(settings.TOKEN_AUTH_LOCAL_CACHE_SIZE)
+
+
+def cached_token(key):
+    """The token with this key, its user loaded, or None if there is none"""
+    entry = local_tokens.get(key)
+    if entry is not None and time.monotonic() - entry[1] < settings.TOKEN_AUTH_LOCAL_TTL:
+        return entry[0]
+
+    user_values = cache.get(cache_key(key))
+    if user_values is None:
+        user_values = (
+            Token.objects.filter(key=key)
+            .values_list(*[f'user__{name}' for name in USER_FIELDS])
+            .first()
+        )
+        if user_values is None:
+            local_tokens.discard(key)
+            return None
+        cache.set(cache_key(key), user_values, settings.TOKEN_AUTH_CACHE_TTL)
+
+    # The fields left out are deferred, so saving this user cannot blank them
+    user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, user_values)
+    token = Token(key=key, user=user)
+    local_tokens.set(key, token)
+    return token
+
+
+def invalidate_tokens(*keys):
+    """Forget the cached users of these token keys"""
+    for key in keys:
+        local_tokens.discard(key)
+    cache.delete_many([cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication served from the token cache"""
+
+    def authenticate_credentials(self, key):
+        token = cached_token(key)
+        if token is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        # Requests get their own copies, so changes to request.user stay local
+        token = copy.copy(token)
+        token.user = copy.copy(token.user)
+        return token.user, token
@@ -1,10 +1,24 @@
 # backend/accounts/management/commands/create_initial_data.py
+import os
+
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from deployments.models import DeploymentStatus, Department
+from deployments.models import DeploymentStatus, Department, Technician
+from deployments.synthetic import generate_project, write_fixture
 
 class Command(BaseCommand):
-    help = 'Creates initial data for the application'
+    help = 'Creates initial data for the application, plus optional synthetic projects and spreadsheets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projects', type=int, default=0,
+                            help='Number of synthetic projects to generate')
+        parser.add_argument('--deployments', type=int, default=100,
+                            help='Deployments per synthetic project')
+        parser.add_argument('--fields', type=int, default=5,
+                            help='Custom fields per synthetic project')
+        parser.add_argument('--fixtures', metavar='DIR',
+                            help='Also write matching .xlsx and .csv import files to DIR')
+        parser.add_argument('--seed', type=int, default=0)
 
     def handle(self, *args, **kwargs):
         self.stdout.write('Creating initial data...')
@@ -35,14 +49,14 @@ class Command(BaseCommand):
             {'name': 'Pending', 'order': 1},
             {'name': 'In Progress', 'order': 2},
             {'name': 'On Hold', 'order': 3},
-            {'name': 'Completed', 'order': 4},
+            {'name': 'Completed', 'order': 4, 'is_completed': True},
             {'name': 'Cancelled', 'order': 5}
         ]
         
         for status_data in default_statuses:
             status, created = DeploymentStatus.objects.get_or_create(
                 name=status_data['name'],
-                defaults={'order': status_data['order']}
+                defaults={'order': status_data['order'], 'is_completed': status_data.get('is_completed', False)}
             )
             if created:
                 self.stdout.write(self.style.SUCCESS(f'Created deployment status: {status.name}'))
@@ -64,4 +78,28 @@ class Command(BaseCommand):
                 )
                 self.stdout.write(self.style.SUCCESS(f'Created department: {dept.name}'))
         
+        # Technicians to spread synthetic deployments over
+        if kwargs['projects'] and not Technician.objects.exists():
+            for i in range(1, 6):
+                Technician.objects.create(username=f'tech{i}', name=f'Technician {i}')
+        
+        admin = User.objects.filter(is_superuser=True).order_by('id').first()
+        for i in range(kwargs['projects']):
+            project = generate_project(
+                f"Synthetic {kwargs['deployments']}x{kwargs['fields']} #{i + 1}", admin,
+                deployments=kwargs['deployments'], fields=kwargs['fields'], seed=kwargs['seed'] + i
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Created project {project.name} with {kwargs['deployments']} deployments"
+            ))
+        
+        if kwargs['fixtures']:
+            os.makedirs(kwargs['fixtures'], exist_ok=True)
+            for suffix in ['xlsx', 'csv']:
+                path = write_fixture(
+                    os.path.join(kwargs['fixtures'], f"deployments_{kwargs['deployments']}x{kwargs['fields']}.{suffix}"),
+                    kwargs['deployments'], kwargs['fields'], seed=kwargs['seed']
+                )
+                self.stdout.write(self.style.SUCCESS(f'Wrote {path}'))
+        
         self.stdout.write(self.style.SUCCESS('Initial data creation completed!'))
\ No newline at end of file
@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens
+
+
+@receiver([post_save, post_delete], sender=Token)
+def token_changed(sender, instance, **kwargs):
+    # Now for this process, and again once committed so no request can
+    # re-cache the token as it was before the commit
+    key = instance.key
+    invalidate_tokens(key)
+    transaction.on_commit(lambda: invalidate_tokens(key))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Covers updates, password resets and deactivation; deleting a user
+    # deletes its token, which is handled above. Logging in only saves
+    # last_login, which the token cache does not hold.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    if not created:
+        keys = list(Token.objects.filter(user_id=instance.id).values_list('key', flat=True))
+        invalidate_tokens(*keys)
+        transaction.on_commit(lambda: invalidate_tokens(*keys))
@@ -1,3 +1,89 @@
-from django.test import TestCase
+from django.contrib.auth.models import User, update_last_login
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from .authentication import cache_key, local_tokens
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        cls.user = User.objects.create_user(username='tech', password='tech12345')
+        cls.admin_token = Token.objects.create(user=cls.admin)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+
+    def get_me(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return self.client.get('/api/accounts/users/me/')
+
+    def test_warm_requests_make_no_queries(self):
+        self.assertEqual(self.get_me(self.token).data['username'], 'tech')
+        with self.assertNumQueries(0):
+            response = self.get_me(self.token)
+        self.assertEqual(response.data['username'], 'tech')
+
+        # Another process has only the shared cache
+        local_tokens.clear()
+        with self.assertNumQueries(0):
+            self.get_me(self.token)
+
+    def test_cache_holds_no_password_and_survives_logins(self):
+        self.get_me(self.token)
+        self.assertNotIn(self.user.password, cache.get(cache_key(self.token.key)))
+
+        update_last_login(None, User.objects.get(pk=self.user.pk))
+        self.assertIsNotNone(cache.get(cache_key(self.token.key)))
+        with self.assertNumQueries(0):
+            self.get_me(self.token)
+
+    def test_user_stats(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get('/api/accounts/users/stats/').data, {'total': 2, 'admins': 1})
+
+    def test_unknown_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-token')
+        self.assertEqual(self.client.get('/api/accounts/users/me/').status_code, 401)
+
+    def test_user_update_is_seen_at_once(self):
+        self.get_me(self.token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.admin_token.key}')
+        response = self.client.patch(f'/api/accounts/users/{self.user.id}/', {'first_name': 'Terry'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.get_me(self.token).data['first_name'], 'Terry')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.admin_token.key}')
+        self.client.delete(f'/api/accounts/users/{self.user.id}/')
+        self.assertEqual(self.get_me(self.token).status_code, 401)
+
+    def test_deactivation_and_password_reset(self):
+        self.get_me(self.token)
+        User.objects.get(pk=self.user.pk).save()
+        with self.assertNumQueries(1):
+            self.get_me(self.token)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.admin_token.key}')
+        response = self.client.post(
+            f'/api/accounts/users/{self.user.id}/reset_password/', {'password': 'N3w-passphrase!'}
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertIsNone(cache.get(cache_key(self.token.key)))
+        self.assertIsNone(local_tokens.get(self.token.key))
+
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.get_me(self.token).status_code, 401)
+
+    def test_rotated_token_stops_working(self):
+        self.get_me(self.token)
+        self.token.delete()
+        new_token = Token.objects.create(user=self.user)
+        self.assertEqual(self.get_me(self.token).status_code, 401)
+        self.assertEqual(self.get_me(new_token).status_code, 200)
@@ -1,10 +1,12 @@
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+from django.db.models import Count, Q
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from backend.permissions import IsAdminUser
+from backend.pagination import KeysetPagination
 from .serializers import (
     UserSerializer, 
     UserCreateSerializer, 
@@ -38,9 +40,13 @@ def login_view(request):
         )
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class UserPagination(KeysetPagination):
+    ordering = 'username'
+
 # User viewset for CRUD operations
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('username')
+    pagination_class = UserPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -57,6 +63,11 @@ class UserViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated()]
         return [IsAdminUser()]
     
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """User counts for the admin dashboard"""
+        return Response(User.objects.aggregate(total=Count('id'), admins=Count('id', filter=Q(is_staff=True))))
+    
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def me(self, request):
         """Get current user information"""
@@ -0,0 +1,40 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a unique, indexed key. Pages are fetched with
+    WHERE key > <cursor> instead of OFFSET, so a page deep into a large
+    table costs the same as the first one.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = settings.MAX_PAGE_SIZE
+
+
+class LookupPagination(KeysetPagination):
+    """
+    For small lookup tables that the frontend loads whole into dropdowns.
+    Lists are returned unpaginated unless the client asks for a page with
+    `cursor` or `page_size`.
+    """
+
+    def is_requested(self, request):
+        return self.cursor_query_param in request.query_params or \
+            self.page_size_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class OffsetPagination(LimitOffsetPagination):
+    """
+    For orderings cursor pagination cannot page through, such as a custom
+    field value that repeats or is missing. Takes the same page_size
+    parameter as KeysetPagination.
+    """
+    limit_query_param = 'page_size'
+    max_limit = settings.MAX_PAGE_SIZE
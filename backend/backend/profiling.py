@@ -0,0 +1,233 @@
+"""
+Request profiling, switched on with PROFILING_ENABLED.
+
+ProfilingMiddleware times every request and splits the time into SQL
+(query count and duration, from a database execute wrapper), serializer
+`.data` and the rest. The figures are sent back as a Server-Timing header,
+which browser dev tools show in the network panel, and kept in a ring
+buffer of the last PROFILING_BUFFER_SIZE requests. profiling_stats
+aggregates that buffer per view and action (e.g.
+DeploymentViewSet.export_excel) for staff users.
+
+With PROFILING_SAMPLE_RATE above zero, that fraction of requests also runs
+under cProfile; the last PROFILING_PROFILES_KEPT reports are included in
+the stats response.
+"""
+import cProfile
+import contextvars
+import io
+import pstats
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+
+# Timings of the request being handled in this thread / task
+current_timings = contextvars.ContextVar('profiling_timings', default=None)
+
+
+class RequestTimings:
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self._serializing = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+
+class RequestLog:
+    """Ring buffer of recent request timings plus sampled profiles"""
+
+    def __init__(self, size, profiles_kept):
+        self.lock = threading.Lock()
+        self.requests = deque(maxlen=size)
+        self.profiles = deque(maxlen=profiles_kept)
+
+    def add(self, record, profile=None):
+        with self.lock:
+            self.requests.append(record)
+            if profile is not None:
+                self.profiles.append(profile)
+
+    def clear(self):
+        with self.lock:
+            self.requests.clear()
+            self.profiles.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.requests), list(self.profiles)
+
+
+request_log = RequestLog(settings.PROFILING_BUFFER_SIZE, settings.PROFILING_PROFILES_KEPT)
+
+
+def timed_serializer_data(data_property):
+    """Wrap BaseSerializer.data so time spent serializing is recorded"""
+    getter = data_property.fget
+
+    def data(self):
+        timings = current_timings.get()
+        # Only time the outermost serializer
+        if timings is None or timings._serializing:
+            return getter(self)
+        timings._serializing += 1
+        start = time.perf_counter()
+        try:
+            return getter(self)
+        finally:
+            timings.serialize += time.perf_counter() - start
+            timings._serializing -= 1
+
+    data.profiled = True
+    return property(data)
+
+
+def view_name(request):
+    """'DeploymentViewSet.export_excel' for viewset actions, else the view's name"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    func = match.func
+    cls = getattr(func, 'cls', None)
+    if cls is not None:
+        actions = getattr(func, 'actions', None) or {}
+        action = actions.get(request.method.lower())
+        return f'{cls.__name__}.{action}' if action else cls.__name__
+    return getattr(func, '__qualname__', match.view_name)
+
+
+def profile_report(profiler, limit=40):
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if not getattr(BaseSerializer.data.fget, 'profiled', False):
+            BaseSerializer.data = timed_serializer_data(BaseSerializer.data)
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        profiler = None
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            profiler = cProfile.Profile()
+
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                if profiler is not None:
+                    try:
+                        profiler.enable()
+                    except ValueError:
+                        # Another profiler is already active in this process
+                        profiler = None
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - start
+
+        db_ms, serialize_ms, total_ms = timings.db * 1000, timings.serialize * 1000, total * 1000
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.1f};desc="{timings.queries} queries"',
+            f'serialize;dur={serialize_ms:.1f}',
+            f'app;dur={max(total_ms - db_ms - serialize_ms, 0):.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+        name = view_name(request)
+        if name:
+            record = {
+                'view': name,
+                'method': request.method,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'db_ms': round(db_ms, 2),
+                'queries': timings.queries,
+                'serialize_ms': round(serialize_ms, 2),
+                'time': timezone.now().isoformat(),
+            }
+            profile = None
+            if profiler is not None:
+                profile = {**record, 'path': request.path, 'report': profile_report(profiler)}
+            request_log.add(record, profile)
+
+        return response
+
+
+def summarize(records):
+    """Per-view count and timing statistics for a list of request records"""
+    by_view = {}
+    for record in records:
+        by_view.setdefault(record['view'], []).append(record)
+
+    summary = []
+    for view, rows in by_view.items():
+        totals = sorted(row['total_ms'] for row in rows)
+        summary.append({
+            'view': view,
+            'count': len(rows),
+            'errors': sum(1 for row in rows if row['status'] >= 500),
+            'total_ms': {
+                'mean': round(statistics.fmean(totals), 2),
+                'p50': totals[len(totals) // 2],
+                'p95': totals[min(len(totals) - 1, int(len(totals) * 0.95))],
+                'max': totals[-1],
+            },
+            'db_ms_mean': round(statistics.fmean(row['db_ms'] for row in rows), 2),
+            'queries_mean': round(statistics.fmean(row['queries'] for row in rows), 1),
+            'queries_max': max(row['queries'] for row in rows),
+            'serialize_ms_mean': round(statistics.fmean(row['serialize_ms'] for row in rows), 2),
+        })
+    # Views costing the most overall first
+    summary.sort(key=lambda entry: -entry['total_ms']['mean'] * entry['count'])
+    return summary
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([permissions.IsAdminUser])
+def profiling_stats(request):
+    """Per-view timings of recent requests (DELETE clears them)"""
+    if request.method == 'DELETE':
+        request_log.clear()
+        return Response(status=204)
+
+    records, profiles = request_log.snapshot()
+    return Response({
+        'enabled': settings.PROFILING_ENABLED,
+        'requests': len(records),
+        'views': summarize(records),
+        'profiles': profiles,
+    })
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third-party apps
     'rest_framework',
@@ -55,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.profiling.ProfilingMiddleware',  # First, so it times everything else
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Make sure this is before CommonMiddleware
@@ -111,14 +113,98 @@ CORS_ALLOWED_ORIGINS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'backend.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.getenv('PAGE_SIZE', '100')),
 }
 
+# Users resolved from API tokens are cached (accounts/authentication.py) for
+# TOKEN_AUTH_CACHE_TTL seconds. Each process keeps up to
+# TOKEN_AUTH_LOCAL_CACHE_SIZE of them and re-checks the shared cache at most
+# every TOKEN_AUTH_LOCAL_TTL seconds
+TOKEN_AUTH_CACHE_TTL = int(os.getenv('TOKEN_AUTH_CACHE_TTL', '60'))
+TOKEN_AUTH_LOCAL_TTL = float(os.getenv('TOKEN_AUTH_LOCAL_TTL', '5'))
+TOKEN_AUTH_LOCAL_CACHE_SIZE = int(os.getenv('TOKEN_AUTH_LOCAL_CACHE_SIZE', '1024'))
+
+# Largest page a client may request with ?page_size=
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '1000'))
+
+# Cache used for computed data such as project stats. Point this at a shared
+# backend (e.g. Redis or Memcached) when running several server processes
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Statuses, technicians and departments are cached (deployments/reference.py).
+# Each process re-checks the shared cache for changes at most this often
+REFERENCE_CACHE_LOCAL_TTL = float(os.getenv('REFERENCE_CACHE_LOCAL_TTL', '5'))
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', '86400'))
+
+# Number of rows written per bulk INSERT when importing spreadsheets
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+
+# Hand uploads to the import worker (manage.py run_import_worker) and answer
+# 202 right away, unless the client sends background=false
+IMPORT_IN_BACKGROUND = os.getenv('IMPORT_IN_BACKGROUND', 'True') == 'True'
+IMPORT_WORKER_PROCESSES = int(os.getenv('IMPORT_WORKER_PROCESSES', '2'))
+
+# Seconds between a running job's heartbeats, and without one after which
+# the job is failed as orphaned (its worker was killed)
+IMPORT_JOB_HEARTBEAT = int(os.getenv('IMPORT_JOB_HEARTBEAT', '15'))
+IMPORT_JOB_TIMEOUT = int(os.getenv('IMPORT_JOB_TIMEOUT', '120'))
+
+# Number of rows fetched per query when exporting spreadsheets
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+# Uploaded spreadsheets are kept parsed here (backend/staging.py) so later
+# steps can refer to them by upload ID. Unused uploads are removed after
+# UPLOAD_STAGING_TTL seconds, least recently used first past the size limit
+UPLOAD_STAGING_DIR = os.getenv('UPLOAD_STAGING_DIR', str(BASE_DIR / 'upload_staging'))
+UPLOAD_STAGING_TTL = int(os.getenv('UPLOAD_STAGING_TTL', '86400'))
+UPLOAD_STAGING_MAX_BYTES = int(os.getenv('UPLOAD_STAGING_MAX_BYTES', str(2 * 1024 ** 3)))
+
+# Deployment change events (deployments/events.py), streamed per project at
+# /api/deployments/events/<project>/ when served through backend.asgi. The
+# 'local' backend only reaches streams in the process that made the change;
+# 'postgres' shares events between processes with LISTEN/NOTIFY
+DEPLOYMENT_EVENTS_BACKEND = os.getenv('DEPLOYMENT_EVENTS_BACKEND', 'local')
+DEPLOYMENT_EVENTS_CHANNEL = os.getenv('DEPLOYMENT_EVENTS_CHANNEL', 'deployment_events')
+# Events a slow client may fall behind by before it is told to reload
+EVENT_STREAM_QUEUE_SIZE = int(os.getenv('EVENT_STREAM_QUEUE_SIZE', '100'))
+# Seconds between keepalive comments, and before a stream is closed for the
+# browser to reconnect (with a delay of EVENT_STREAM_RETRY_MS)
+EVENT_STREAM_HEARTBEAT = float(os.getenv('EVENT_STREAM_HEARTBEAT', '15'))
+EVENT_STREAM_MAX_AGE = float(os.getenv('EVENT_STREAM_MAX_AGE', '300'))
+EVENT_STREAM_RETRY_MS = int(os.getenv('EVENT_STREAM_RETRY_MS', '3000'))
+
+# Deletions are remembered this long for delta sync (/deployments/changes/);
+# clients that last synced earlier get the whole project again
+TOMBSTONE_RETENTION_DAYS = int(os.getenv('TOMBSTONE_RETENTION_DAYS', '30'))
+
+# Seconds a project's dashboard stats stay cached; deployment changes clear them
+PROJECT_STATS_CACHE_TIMEOUT = int(os.getenv('PROJECT_STATS_CACHE_TIMEOUT', '3600'))
+
+# Seconds a process trusts its check for the fuzzy-search index (pg_trgm)
+TRIGRAM_CHECK_INTERVAL = int(os.getenv('TRIGRAM_CHECK_INTERVAL', '300'))
+
+# Request profiling (backend/profiling.py): Server-Timing headers and
+# per-view timings at /api/profiling/ for staff users
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+# Number of recent requests the per-view statistics are computed over
+PROFILING_BUFFER_SIZE = int(os.getenv('PROFILING_BUFFER_SIZE', '1000'))
+# Fraction of requests to run under cProfile (0 disables), and how many of
+# those reports to keep
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_PROFILES_KEPT = int(os.getenv('PROFILING_PROFILES_KEPT', '20'))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,114 @@
+"""
+Row-by-row readers for uploaded spreadsheets.
+
+XLSX files are opened in openpyxl's read-only mode and CSV files are read
+with the csv module, so only the rows being processed are held in memory.
+Legacy .xls files fall back to pandas.
+"""
+import csv
+import io
+import os
+from itertools import islice
+
+import pandas as pd
+from django.conf import settings
+from openpyxl import load_workbook
+
+
+def header_names(raw_headers):
+    """
+    Name blank and repeated headers the way pandas.read_excel does. Headers
+    that are not text (dates, numbers) become strings, so the column list
+    can be stored as JSON.
+    """
+    names = []
+    seen = {}
+    for position, header in enumerate(raw_headers):
+        if header is None or header == '':
+            name = f"Unnamed: {position}"
+        else:
+            name = str(header)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def is_empty_row(values):
+    return all(value is None or value == '' for value in values)
+
+
+class SpreadsheetReader:
+    """
+    Iterate the rows of an uploaded XLSX or CSV file lazily.
+
+    `columns` holds the header row. `rows()` yields (line_number, row) pairs
+    where `row` maps column names to cell values and `line_number` is the
+    1-based line in the sheet (the header is line 1). Blank rows are
+    skipped.
+    """
+
+    def __init__(self, file_obj, name=None):
+        self.file_obj = file_obj
+        name = name or getattr(file_obj, 'name', '') or ''
+        self.extension = os.path.splitext(name)[1].lower()
+        self._workbook = None
+        self._text = None
+        self._rows = self._open()
+        try:
+            self.columns = header_names(next(self._rows))
+        except StopIteration:
+            self.columns = []
+
+    def _open(self):
+        if hasattr(self.file_obj, 'seek'):
+            self.file_obj.seek(0)
+
+        if self.extension == '.csv':
+            self._text = io.TextIOWrapper(self.file_obj, encoding='utf-8-sig', newline='')
+            return iter(csv.reader(self._text))
+
+        if self.extension == '.xls':
+            # openpyxl cannot read the old binary format
+            df = pd.read_excel(self.file_obj, header=None, dtype=object)
+            return (
+                [None if pd.isna(value) else value for value in row]
+                for row in df.itertuples(index=False)
+            )
+
+        self._workbook = load_workbook(self.file_obj, read_only=True, data_only=True)
+        return self._workbook.active.iter_rows(values_only=True)
+
+    def rows(self):
+        width = len(self.columns)
+        for line_number, values in enumerate(self._rows, start=2):
+            values = list(values)[:width]
+            if is_empty_row(values):
+                continue
+            values += [None] * (width - len(values))
+            if self.extension == '.csv':
+                values = [value if value != '' else None for value in values]
+            yield line_number, dict(zip(self.columns, values))
+        self.close()
+
+    def chunks(self, size=None):
+        """Yield lists of at most `size` (line_number, row) pairs"""
+        size = size or settings.IMPORT_BATCH_SIZE
+        rows = self.rows()
+        while True:
+            chunk = list(islice(rows, size))
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+        if self._text is not None:
+            # Leave the uploaded file itself open for the caller
+            self._text.detach()
+            self._text = None
@@ -0,0 +1,239 @@
+"""
+Uploaded spreadsheets staged on local disk, so a file that goes through
+several steps (analyze_excel, create_with_excel, import_excel) is sent and
+parsed only once.
+
+stage_upload() stores the file under UPLOAD_STAGING_DIR in a directory
+named after a hash of its content, parses it and writes the rows back out
+as pickled batches, which are many times faster to read than the sheet.
+The hash is the upload ID the later steps send instead of the file; staging
+the same file twice reuses the first copy. Results derived from the rows,
+such as the column profiles, are cached next to them (StagedUpload.cached).
+
+Uploads are removed once unused for UPLOAD_STAGING_TTL seconds, and the
+least recently used ones go first when the staging area outgrows
+UPLOAD_STAGING_MAX_BYTES. The directory is per server, so processes
+sharing uploads must share the disk.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.files import File
+
+from .spreadsheets import SpreadsheetReader
+
+UPLOAD_ID_PATTERN = re.compile(r'[0-9a-f]{64}')
+META_FILE = 'meta.json'
+ROWS_FILE = 'rows.pickle'
+
+
+class UploadNotFound(Exception):
+    """The upload ID is unknown or the upload has expired"""
+
+
+def staging_dir():
+    path = str(settings.UPLOAD_STAGING_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class StagedReader:
+    """Reads staged rows with the same interface as SpreadsheetReader"""
+
+    def __init__(self, upload):
+        self.columns = upload.columns
+        self.path = os.path.join(upload.path, ROWS_FILE)
+        self._file = None
+
+    def rows(self):
+        self._file = open(self.path, 'rb')
+        try:
+            while True:
+                try:
+                    batch = pickle.load(self._file)
+                except EOFError:
+                    return
+                for line_number, values in batch:
+                    yield line_number, dict(zip(self.columns, values))
+        finally:
+            self.close()
+
+    def chunks(self, size=None):
+        """Yield lists of at most `size` (line_number, row) pairs"""
+        size = size or settings.IMPORT_BATCH_SIZE
+        rows = self.rows()
+        while True:
+            chunk = list(islice(rows, size))
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class StagedUpload:
+
+    def __init__(self, upload_id):
+        self.id = upload_id
+        self.path = os.path.join(staging_dir(), upload_id)
+        try:
+            with open(os.path.join(self.path, META_FILE)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise UploadNotFound(upload_id)
+        self.name = meta['name']
+        self.columns = meta['columns']
+        self.row_count = meta['row_count']
+        self.size = meta['size']
+
+    @property
+    def source_path(self):
+        """The file as uploaded"""
+        return os.path.join(self.path, 'source' + os.path.splitext(self.name)[1].lower())
+
+    def reader(self):
+        return StagedReader(self)
+
+    def open_source(self):
+        return File(open(self.source_path, 'rb'), name=self.name)
+
+    def touch(self):
+        # The meta file's modification time marks the last use
+        os.utime(os.path.join(self.path, META_FILE))
+
+    def cached(self, key, compute):
+        """compute(reader), worked out once per upload and then read back"""
+        path = os.path.join(self.path, f'{key}.pickle')
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        result = compute(self.reader())
+        # Write then rename, so a concurrent reader never sees half a file
+        fd, tmp_path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        return result
+
+
+def get_upload(upload_id):
+    """The staged upload with this ID; raises UploadNotFound"""
+    upload_id = str(upload_id or '').lower()
+    if not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+        raise UploadNotFound(upload_id)
+    upload = StagedUpload(upload_id)
+    upload.touch()
+    return upload
+
+
+def request_upload(request):
+    """
+    The upload a request names with `upload_id`, or the `file` it sent,
+    staged now. None if it has neither; raises UploadNotFound.
+    """
+    upload_id = request.data.get('upload_id')
+    if upload_id:
+        return get_upload(upload_id)
+    file_obj = request.FILES.get('file')
+    return stage_upload(file_obj) if file_obj else None
+
+
+def stage_upload(file_obj, name=None):
+    """Store and parse an uploaded file, unless it is already staged"""
+    name = os.path.basename(name or getattr(file_obj, 'name', '') or 'upload.xlsx')
+    extension = os.path.splitext(name)[1].lower()
+    root = staging_dir()
+    work_dir = tempfile.mkdtemp(dir=root, prefix='.staging-')
+    try:
+        # The extension decides how the file is parsed, so it is part of the ID
+        digest = hashlib.sha256(extension.encode() + b'\0')
+        source = os.path.join(work_dir, 'source' + extension)
+        if hasattr(file_obj, 'seek'):
+            file_obj.seek(0)
+        with open(source, 'wb') as out:
+            if hasattr(file_obj, 'chunks'):
+                chunks = file_obj.chunks()
+            else:
+                chunks = iter(lambda: file_obj.read(1 << 20), b'')
+            for chunk in chunks:
+                digest.update(chunk)
+                out.write(chunk)
+        upload_id = digest.hexdigest()
+
+        try:
+            return get_upload(upload_id)
+        except UploadNotFound:
+            pass
+
+        with open(source, 'rb') as f:
+            reader = SpreadsheetReader(f, name)
+            row_count = 0
+            with open(os.path.join(work_dir, ROWS_FILE), 'wb') as out:
+                for chunk in reader.chunks():
+                    row_count += len(chunk)
+                    batch = [(line_number, [row[column] for column in reader.columns])
+                             for line_number, row in chunk]
+                    pickle.dump(batch, out, protocol=pickle.HIGHEST_PROTOCOL)
+            columns = reader.columns
+
+        with open(os.path.join(work_dir, META_FILE), 'w') as f:
+            json.dump({
+                'name': name,
+                'columns': columns,
+                'row_count': row_count,
+                'size': sum(entry.stat().st_size for entry in os.scandir(work_dir)),
+                'created': time.time(),
+            }, f)
+
+        try:
+            os.rename(work_dir, os.path.join(root, upload_id))
+        except OSError:
+            # Staged by a concurrent request in the meantime
+            pass
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    evict_uploads(keep=upload_id)
+    return get_upload(upload_id)
+
+
+def evict_uploads(keep=None):
+    """Remove expired uploads, then the least recently used above the size limit"""
+    root = staging_dir()
+    now = time.time()
+    uploads = []
+    for entry in os.scandir(root):
+        if not entry.is_dir():
+            continue
+        try:
+            last_used = os.stat(os.path.join(entry.path, META_FILE)).st_mtime
+            with open(os.path.join(entry.path, META_FILE)) as f:
+                size = json.load(f)['size']
+        except (OSError, ValueError, KeyError):
+            # Half-written uploads are cleaned up once they are old enough
+            last_used, size = entry.stat().st_mtime, 0
+        uploads.append((last_used, size, entry))
+
+    total = sum(size for _, size, _ in uploads)
+    for last_used, size, entry in sorted(uploads, key=lambda upload: upload[0]):
+        expired = now - last_used > settings.UPLOAD_STAGING_TTL
+        if entry.name == keep or not (expired or total > settings.UPLOAD_STAGING_MAX_BYTES):
+            continue
+        if entry.name.startswith('.') and not expired:
+            # Still being staged
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        total -= size
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from .profiling import profiling_stats
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -9,6 +10,7 @@ urlpatterns = [
     path('api/deployments/', include('deployments.urls')),
     path('api/accounts/', include('accounts.urls')),  # This will include the login view at /api/accounts/login/
     path('api-auth/', include('rest_framework.urls')),  # For browsable API authentication
+    path('api/profiling/', profiling_stats, name='profiling-stats'),  # Staff only
 ]
 
 # Serve media files in development
@@ -1,9 +1,10 @@
 from django.contrib import admin
-from .models import DeploymentStatus, Technician, Department, Deployment, DeploymentField
+from .models import DeploymentStatus, Technician, Department, Deployment, DeploymentField, ImportJob
 
 # Register the models
 admin.site.register(DeploymentStatus)
 admin.site.register(Technician)
 admin.site.register(Department)
 admin.site.register(Deployment)
-admin.site.register(DeploymentField)
\ No newline at end of file
+admin.site.register(DeploymentField)
+admin.site.register(ImportJob)
\ No newline at end of file
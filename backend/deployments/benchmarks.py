@@ -0,0 +1,196 @@
+"""
+Micro-benchmarks for the backend hot paths, run by the run_benchmarks
+command against a throwaway test database.
+
+Each scenario is timed over several runs (median wall time), with the
+number of SQL queries of the last timed run and the peak Python memory
+(tracemalloc) of one extra run, which is kept separate because tracing
+slows everything down.
+"""
+import io
+import json
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from .models import DeploymentStatus
+from .synthetic import generate_project, write_fixture
+
+SCENARIOS = [
+    'import_excel', 'export_excel', 'analyze_excel', 'create_with_excel',
+    'create_from_upload', 'deployment_list', 'deployment_retrieve',
+]
+
+
+def measure(func, repeat, setup=None):
+    """Measure func(), or func(setup()) with setup() left out of the figures"""
+    def prepare():
+        return (setup(),) if setup else ()
+
+    times = []
+    queries = 0
+    for _ in range(repeat):
+        args = prepare()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            func(*args)
+            times.append(time.perf_counter() - start)
+        queries = len(captured)
+
+    args = prepare()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_ms': round(statistics.median(times) * 1000, 2),
+        'queries': queries,
+        'peak_memory_kb': round(peak / 1024),
+    }
+
+
+class Benchmark:
+    """The scenarios for one data size, sharing a project and a spreadsheet"""
+
+    def __init__(self, client, user, size, fields):
+        self.client = client
+        self.user = user
+        self.size = size
+        self.fields = fields
+        self.project = generate_project(f'Benchmark {size}', user, deployments=size, fields=fields)
+        self.deployment = self.project.deployments.order_by('id').first()
+
+        buffer = io.BytesIO()
+        write_fixture(buffer, size, fields)
+        self.sheet = buffer.getvalue()
+
+    def upload(self):
+        return SimpleUploadedFile('deployments.xlsx', self.sheet)
+
+    def check(self, response, expected=200):
+        if response.status_code != expected:
+            raise AssertionError(f'{response.status_code}: {getattr(response, "data", response)}')
+        return response
+
+    def fresh_upload(self):
+        """The sheet as an upload that has not been staged yet"""
+        shutil.rmtree(settings.UPLOAD_STAGING_DIR, ignore_errors=True)
+        return self.upload()
+
+    setup_analyze_excel = setup_create_with_excel = fresh_upload
+
+    def setup_create_from_upload(self):
+        # Analyzed first, as the project form does
+        response = self.check(self.client.post(
+            '/api/projects/analyze_excel/', {'file': self.fresh_upload()}, format='multipart'
+        ))
+        return response.data['upload_id']
+
+    def setup_import_excel(self):
+        return generate_project(f'Import {self.size}', self.user, deployments=0, fields=self.fields)
+
+    def import_excel(self, project):
+        column_map = {str(field.id): field.name for field in project.fields.all()}
+        self.check(self.client.post('/api/deployments/deployments/import_excel/', {
+            'project': project.id, 'file': self.upload(), 'background': 'false',
+            'column_map': json.dumps(column_map),
+        }, format='multipart'))
+
+    def export_excel(self):
+        response = self.check(self.client.get(
+            '/api/deployments/deployments/export_excel/', {'project': self.project.id}
+        ))
+        b''.join(response.streaming_content)
+
+    def analyze_excel(self, upload):
+        self.check(self.client.post(
+            '/api/projects/analyze_excel/', {'file': upload}, format='multipart'
+        ))
+
+    def create_with_excel(self, upload):
+        self.check(self.client.post('/api/projects/create_with_excel/', {
+            'name': f'Created {self.size}', 'description': '', 'file': upload
+        }, format='multipart'), expected=201)
+
+    def create_from_upload(self, upload_id):
+        self.check(self.client.post('/api/projects/create_with_excel/', {
+            'name': f'Created {self.size}', 'description': '', 'upload_id': upload_id
+        }, format='multipart'), expected=201)
+
+    def deployment_list(self):
+        self.check(self.client.get(
+            '/api/deployments/deployments/', {'project': self.project.id, 'page_size': 100}
+        ))
+
+    def deployment_retrieve(self):
+        self.check(self.client.get(f'/api/deployments/deployments/{self.deployment.id}/'))
+
+
+def run_benchmarks(sizes, fields=5, repeat=3, scenarios=None, log=None):
+    """
+    Run `scenarios` (default: all) at every size. Returns
+    {scenario: {size: measurements}}. Expects an empty, migrated database.
+    Uploads are staged in a temporary directory, removed afterwards.
+    """
+    user, _ = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})
+    if not DeploymentStatus.objects.exists():
+        DeploymentStatus.objects.create(name='Pending', order=1)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    results = {}
+    staging_dir = tempfile.mkdtemp()
+    try:
+        with override_settings(UPLOAD_STAGING_DIR=staging_dir):
+            for size in sizes:
+                benchmark = Benchmark(client, user, size, fields)
+                for scenario in scenarios or SCENARIOS:
+                    result = measure(
+                        getattr(benchmark, scenario), repeat,
+                        setup=getattr(benchmark, f'setup_{scenario}', None)
+                    )
+                    results.setdefault(scenario, {})[str(size)] = result
+                    if log:
+                        log(f'{scenario:<20} {size:>8} rows  {result["wall_ms"]:>10.1f} ms  '
+                            f'{result["queries"]:>6} queries  {result["peak_memory_kb"]:>8} KiB')
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return results
+
+
+def compare(baseline, current, threshold):
+    """
+    Lines describing each measurement that moved, and whether any got
+    worse by more than `threshold` (a fraction; query counts must not grow)
+    """
+    lines = []
+    regressed = False
+    for scenario, sizes in current.items():
+        for size, result in sizes.items():
+            old = baseline.get(scenario, {}).get(size)
+            if not old:
+                continue
+            for key in ['wall_ms', 'queries', 'peak_memory_kb']:
+                before, after = old[key], result[key]
+                if key == 'queries':
+                    worse = after > before
+                else:
+                    worse = before and (after - before) / before > threshold
+                if before != after:
+                    change = f'{(after - before) / before:+.0%}' if before else 'new'
+                    flag = '  REGRESSION' if worse else ''
+                    lines.append(f'{scenario:<20} {size:>8} {key:<15} {before:>10} -> {after:<10} {change}{flag}')
+                regressed = regressed or bool(worse)
+    return lines, regressed
@@ -0,0 +1,59 @@
+"""
+Cursors for delta sync (DeploymentViewSet.changes).
+
+A cursor is a position in the (updated_date, id) order of a project's
+deployments, written as "<microseconds since the epoch>-<id>". Every write
+path moves Deployment.updated_date on, including changes to custom values
+alone (see signals.py), and deletes leave a Tombstone.
+
+updated_date is set when a row is written, not when it is committed, so a
+transaction still running can later commit rows dated before a cursor that
+has already been handed out. Cursors are therefore never placed after the
+start of the oldest transaction that is writing to the database (from
+pg_stat_activity). Clients may get a row again on their next sync, but
+never miss one. While a long transaction holds the cursor back, a sync
+returns at most one page of the rows changed since, rather than the same
+page over and over.
+"""
+import datetime
+
+from django.db import connection
+from django.utils import timezone
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+# Allows for the app servers' and the database's clocks differing slightly
+CLOCK_MARGIN = datetime.timedelta(seconds=1)
+
+
+def encode_cursor(moment, last_id=0):
+    return f'{(moment - EPOCH) // MICROSECOND}-{last_id}'
+
+
+def decode_cursor(cursor):
+    """(moment, last_id) of a cursor; raises ValueError if it is malformed"""
+    micros, _, last_id = str(cursor).partition('-')
+    return EPOCH + int(micros) * MICROSECOND, int(last_id or 0)
+
+
+def stable_time():
+    """A time before which every write that will ever commit has committed"""
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT min(xact_start) FROM pg_stat_activity "
+            "WHERE backend_xid IS NOT NULL AND pid <> pg_backend_pid() AND datname = current_database()"
+        )
+        oldest = cursor.fetchone()[0]
+    return min(now, oldest or now) - CLOCK_MARGIN
+
+
+def next_cursor(rows, has_more, stable):
+    """
+    (cursor, has_more): where the next page or sync starts after `rows`.
+    A page reaching past `stable` ends the sync, as the cursor cannot move
+    past its rows; the rest follows once the writes before it commit.
+    """
+    if has_more and rows[-1].updated_date <= stable:
+        return encode_cursor(rows[-1].updated_date, rows[-1].id), True
+    return encode_cursor(stable), False
@@ -0,0 +1,244 @@
+"""
+Filtering and sorting deployments on custom field values, pushed down to
+SQL against Deployment.custom_values.
+
+Query parameters look like `cf.<field id>=value`, `cf.<field id>__lt=value`
+and `ordering=cf.<field id>` (`-cf.<field id>` for descending). Values are
+compared according to the ProjectField's type:
+
+- number: numerically; stored values that are not numbers never match
+- date: as dates; stored values that are not ISO dates (YYYY-MM-DD) never
+  match, and sort last
+- checkbox: true / false
+- text, dropdown: as text
+
+Exact matches on text, dropdown, date and checkbox values are JSONB
+containment tests served by the GIN index on custom_values. Number and
+date fields marked `indexed` also get a partial expression index each for
+range comparisons and sorting. Indexes are built (and those no longer
+wanted dropped) by manage.py index_custom_fields, not while serving
+requests: every index slows down writes to deployments, so they are only
+made for the fields that need them.
+"""
+import datetime
+import decimal
+
+from django.db import connection
+from django.db.models import DateField, DecimalField, F, Func, Index, Q, TextField
+from rest_framework.exceptions import ValidationError
+
+from projects.models import ProjectField
+from .models import Deployment
+
+PARAM_PREFIX = 'cf.'
+
+LOOKUPS = {
+    'number': {'exact', 'lt', 'lte', 'gt', 'gte', 'in', 'isnull'},
+    'date': {'exact', 'lt', 'lte', 'gt', 'gte', 'in', 'isnull'},
+    'checkbox': {'exact', 'isnull'},
+    'dropdown': {'exact', 'in', 'isnull'},
+    'text': {'exact', 'icontains', 'in', 'isnull'},
+}
+
+NUMBER_PATTERN = r'^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$'
+DATE_PATTERN = r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$'
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+class CustomValueText(Func):
+    """
+    custom_values ->> '<field id>'. KeyTextTransform would read a numeric
+    key as an array index.
+    """
+    template = "(%(expressions)s ->> '%(field_id)d')"
+    output_field = TextField()
+
+    def __init__(self, field_id):
+        super().__init__(F('custom_values'), field_id=int(field_id))
+
+
+class NumericValue(Func):
+    """A text expression as numeric, or NULL when it is not a number"""
+    template = f"(CASE WHEN %(expressions)s ~ '{NUMBER_PATTERN}' THEN (%(expressions)s)::numeric END)"
+    output_field = DecimalField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        # The expression appears twice in the template
+        return sql, (*params, *params)
+
+
+class DateValue(Func):
+    """
+    A text expression as a date, or NULL when it is not an ISO date.
+    custom_value_date() (migration 0005) is the cast made IMMUTABLE, which
+    indexes need, and NULL for impossible dates such as 2024-02-30.
+    """
+    template = f"(CASE WHEN %(expressions)s ~ '{DATE_PATTERN}' THEN custom_value_date(%(expressions)s) END)"
+    output_field = DateField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        # The expression appears twice in the template
+        return sql, (*params, *params)
+
+
+def value_expression(field_id, field_type):
+    """SQL expression for one custom value, typed for comparison"""
+    text = CustomValueText(field_id)
+    if field_type == 'number':
+        return NumericValue(text)
+    if field_type == 'date':
+        return DateValue(text)
+    return text
+
+
+def parse_value(field, value):
+    """Convert a query parameter to the type values of `field` compare as"""
+    try:
+        if field.field_type == 'number':
+            return decimal.Decimal(value.strip())
+        if field.field_type == 'date':
+            return datetime.date.fromisoformat(value.strip()).isoformat()
+    except (ValueError, decimal.InvalidOperation):
+        raise ValidationError({f'{PARAM_PREFIX}{field.id}': f"'{value}' is not a valid {field.field_type}"})
+    if field.field_type == 'checkbox':
+        return parse_bool(field, value)
+    return value
+
+
+def parse_bool(field, value):
+    value = str(value).lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValidationError({f'{PARAM_PREFIX}{field.id}': f"'{value}' is not true or false"})
+
+
+def parse_param(name):
+    """'cf.12__lt' -> (12, 'lt'), or None for other parameters"""
+    if not name.startswith(PARAM_PREFIX):
+        return None
+    field_id, _, lookup = name[len(PARAM_PREFIX):].partition('__')
+    if not field_id.isdigit():
+        raise ValidationError({name: "Expected cf.<field id>"})
+    return int(field_id), lookup or 'exact'
+
+
+def parse_ordering(params):
+    """The (field id, descending) requested by `ordering=[-]cf.<id>`, or None"""
+    ordering = params.get('ordering')
+    if not ordering:
+        return None
+    descending = ordering.startswith('-')
+    parsed = parse_param(ordering.lstrip('-'))
+    if parsed is None or parsed[1] != 'exact':
+        raise ValidationError({'ordering': "Expected cf.<field id> or -cf.<field id>"})
+    return parsed[0], descending
+
+
+def custom_field_condition(field, lookup, value):
+    key = str(field.id)
+    if lookup not in LOOKUPS.get(field.field_type, LOOKUPS['text']):
+        raise ValidationError({f'{PARAM_PREFIX}{key}__{lookup}': f"Unsupported for {field.field_type} fields"})
+
+    if lookup == 'isnull':
+        has_value = Q(custom_values__has_key=key)
+        return ~has_value if parse_bool(field, value) else has_value
+
+    if lookup == 'in':
+        values = [parse_value(field, item) for item in value.split(',')]
+        return Q(custom_values__has_key=key) & Q(**{f'cf_{key}__in': values})
+
+    value = parse_value(field, value)
+    if field.field_type == 'checkbox':
+        checked = Q(custom_values__contains={key: 'true'})
+        return checked if value else ~checked
+    if lookup == 'exact' and field.field_type != 'number':
+        return Q(custom_values__contains={key: value})
+    # The has_key test lets Postgres use the field's partial index
+    return Q(custom_values__has_key=key) & Q(**{f'cf_{key}__{lookup}': value})
+
+
+def filter_custom_fields(queryset, params):
+    """Apply the cf.* filters and cf ordering in `params` to a Deployment queryset"""
+    filters = []
+    for name, value in params.items():
+        parsed = parse_param(name)
+        if parsed:
+            filters.append((*parsed, str(value)))
+    ordering = parse_ordering(params)
+    if not filters and not ordering:
+        return queryset
+
+    field_ids = {field_id for field_id, _, _ in filters}
+    if ordering:
+        field_ids.add(ordering[0])
+    fields = ProjectField.objects.in_bulk(field_ids)
+    missing = field_ids - set(fields)
+    if missing:
+        raise ValidationError({'cf': f"Unknown field ids: {', '.join(map(str, sorted(missing)))}"})
+
+    queryset = queryset.alias(**{
+        f'cf_{field.id}': value_expression(field.id, field.field_type) for field in fields.values()
+    })
+    for field_id, lookup, value in filters:
+        queryset = queryset.filter(custom_field_condition(fields[field_id], lookup, value))
+
+    if ordering:
+        field_id, descending = ordering
+        if descending:
+            queryset = queryset.order_by(F(f'cf_{field_id}').desc(nulls_last=True), '-id')
+        else:
+            queryset = queryset.order_by(F(f'cf_{field_id}').asc(nulls_last=True), 'id')
+    return queryset
+
+
+def custom_field_index(field_id, field_type):
+    """Partial expression index for range filters and sorting on one field"""
+    key = str(field_id)
+    return Index(
+        value_expression(field_id, field_type),
+        name=f'deployment_cf_{field_id}_{field_type[:3]}',
+        condition=Q(custom_values__has_key=key),
+    )
+
+
+def sync_custom_field_indexes():
+    """
+    Build the indexes of the indexed number and date fields and drop those
+    of fields deleted, changed type or no longer indexed. Runs CONCURRENTLY
+    when called outside a transaction. Returns (created, dropped) names.
+    """
+    concurrently = not connection.in_atomic_block
+    wanted = {
+        index.name: index for index in (
+            custom_field_index(field_id, field_type)
+            for field_id, field_type in ProjectField.objects.filter(
+                indexed=True, field_type__in=['number', 'date']
+            ).values_list('id', 'field_type')
+        )
+    }
+    with connection.cursor() as cursor:
+        # Invalid indexes are left behind by a CONCURRENTLY build that failed
+        cursor.execute(
+            "SELECT index_class.relname, pg_index.indisvalid FROM pg_index "
+            "JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid "
+            "WHERE pg_index.indrelid = %s::regclass AND index_class.relname LIKE 'deployment\\_cf\\_%%'",
+            [Deployment._meta.db_table]
+        )
+        existing = dict(cursor.fetchall())
+
+    created, dropped = [], []
+    with connection.schema_editor(atomic=False) as editor:
+        for name, valid in existing.items():
+            if name not in wanted or not valid:
+                editor.remove_index(Deployment, Index(fields=['id'], name=name), concurrently=concurrently)
+                dropped.append(name)
+        for name, index in wanted.items():
+            if not existing.get(name):
+                editor.add_index(Deployment, index, concurrently=concurrently)
+                created.append(name)
+    return created, dropped
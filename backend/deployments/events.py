@@ -0,0 +1,184 @@
+"""
+Change events for open project pages, streamed by project_events (views.py)
+as server-sent events.
+
+Writes publish compact events once their transaction commits:
+
+    {"type": "updated", "ids": [12, 13], "fields": ["status"],
+     "status": 3, "updated_date": "2026-01-05T10:00:00Z"}
+
+`type` is created, updated or deleted. `fields` lists the columns that
+changed ("custom_fields" for custom values) and is null when any may have.
+`status` and `technician` are included when the event carries their new
+value. Batches of many deployments are split into events of at most
+EVENT_IDS_PER_MESSAGE IDs.
+
+Every server process has one broker that hands events to the streams it
+serves, so a stream costs no database work. With DEPLOYMENT_EVENTS_BACKEND
+= 'local' events only reach streams in the process that made the change.
+With 'postgres' they go out through NOTIFY and each process LISTENs on a
+single connection of its own, so changes made by any server process or the
+import workers reach every stream.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads are limited to 8000 bytes
+EVENT_IDS_PER_MESSAGE = 500
+
+
+class EventBroker:
+    """Fans events out to the asyncio queues of the streams of each project"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)  # project id -> {(loop, queue)}
+
+    def subscribe(self, project_id):
+        """A queue receiving the project's events; call from the stream's event loop"""
+        queue = asyncio.Queue(maxsize=settings.EVENT_STREAM_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers[project_id].add((asyncio.get_running_loop(), queue))
+        if settings.DEPLOYMENT_EVENTS_BACKEND == 'postgres':
+            listener.start()
+        return queue
+
+    def unsubscribe(self, project_id, queue):
+        with self.lock:
+            subscribers = self.subscribers.get(project_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self.subscribers.pop(project_id, None)
+
+    def dispatch(self, project_id, event):
+        """Hand an event to the project's streams; safe to call from any thread"""
+        with self.lock:
+            subscribers = list(self.subscribers.get(project_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(deliver, queue, event)
+            except RuntimeError:
+                # The stream's loop has closed
+                pass
+
+
+def deliver(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # The client fell behind; it has to reload the list anyway
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({'type': 'reload'})
+
+
+broker = EventBroker()
+
+
+class NotifyListener:
+    """Feeds the broker from Postgres notifications, on a thread of its own"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='deployment-events', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception:
+                logger.exception("Lost the deployment events connection, reconnecting")
+                time.sleep(1)
+
+    def listen(self):
+        wrapper = connections.create_connection('default')
+        try:
+            wrapper.ensure_connection()
+            raw = wrapper.connection
+            raw.autocommit = True
+            with raw.cursor() as cursor:
+                cursor.execute(f'LISTEN {settings.DEPLOYMENT_EVENTS_CHANNEL}')
+            while True:
+                if select.select([raw], [], [], 60) == ([], [], []):
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    message = json.loads(raw.notifies.pop(0).payload)
+                    broker.dispatch(message['project'], message['event'])
+        finally:
+            wrapper.close()
+
+
+listener = NotifyListener()
+
+
+def send(project_id, event):
+    if settings.DEPLOYMENT_EVENTS_BACKEND == 'postgres':
+        payload = json.dumps({'project': project_id, 'event': event}, default=str)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [settings.DEPLOYMENT_EVENTS_CHANNEL, payload])
+    else:
+        broker.dispatch(project_id, event)
+
+
+def publish(project_id, ids, event_type='updated', fields=None, **values):
+    """
+    Publish an event about the deployments `ids` of a project once the
+    current transaction commits. `values` are the new status and/or
+    technician where they are known.
+    """
+    ids = sorted(ids)
+    if not ids:
+        return
+    # In the format the API uses for dates
+    updated_date = (values.pop('updated_date', None) or timezone.now()).isoformat()
+    if updated_date.endswith('+00:00'):
+        updated_date = updated_date[:-6] + 'Z'
+
+    def send_events():
+        for start in range(0, len(ids), EVENT_IDS_PER_MESSAGE):
+            send(project_id, {
+                'type': event_type,
+                'ids': ids[start:start + EVENT_IDS_PER_MESSAGE],
+                'fields': fields,
+                **values,
+                'updated_date': updated_date,
+            })
+
+    transaction.on_commit(send_events)
+
+
+# Column names that differ from the API's field names
+EVENT_FIELD_NAMES = {
+    'custom_values': 'custom_fields',
+    'status_id': 'status',
+    'technician_id': 'technician',
+    'department_id': 'department',
+}
+
+
+def event_fields(names):
+    """Deployment column names as event field names"""
+    fields = []
+    for name in names:
+        name = EVENT_FIELD_NAMES.get(name, name)
+        if name not in ('updated_date', 'status_changed_date') and name not in fields:
+            fields.append(name)
+    return fields
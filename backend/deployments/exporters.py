@@ -0,0 +1,82 @@
+import tempfile
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+from openpyxl import Workbook
+
+from . import reference
+from .models import Deployment, DeploymentField
+
+
+# Spreadsheet header -> function reading the value from a Deployment
+COMMON_COLUMNS = [
+    ('ID', lambda d: d.deployment_id),
+    ('Status', lambda d: reference.statuses.name_of(d.status_id)),
+    ('Assigned To', lambda d: d.assigned_to),
+    ('Position', lambda d: d.position),
+    ('Department', lambda d: reference.departments.name_of(d.department_id) or ''),
+    ('Location', lambda d: d.location),
+    ('Current Model', lambda d: d.current_model),
+    ('Current SN', lambda d: d.current_sn),
+    ('New Model', lambda d: d.new_model),
+    ('New SN', lambda d: d.new_sn),
+    ('Technician', lambda d: reference.technicians.name_of(d.technician_id) or ''),
+    ('Technician Notes', lambda d: d.technician_notes),
+    ('Deployment Date', lambda d: d.deployment_date),
+    ('Created Date', lambda d: naive_datetime(d.created_date)),
+    ('Updated Date', lambda d: naive_datetime(d.updated_date)),
+]
+
+
+def naive_datetime(value):
+    # Excel has no notion of time zones, so write local wall-clock time
+    if value is not None and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+def export_queryset(project):
+    """Deployments of a project with their custom values preloaded"""
+    return (
+        Deployment.objects.filter(project=project)
+        .prefetch_related(Prefetch(
+            'fields',
+            queryset=DeploymentField.objects.only('deployment_id', 'field_id', 'value')
+        ))
+        .order_by('id')
+    )
+
+
+def write_deployments_workbook(project, file_obj, chunk_size=None):
+    """
+    Write all deployments of a project to `file_obj` as XLSX. Rows are
+    fetched `chunk_size` at a time and appended to a write-only workbook,
+    so memory use does not grow with the number of deployments.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    project_fields = list(project.fields.order_by('order', 'id').values_list('id', 'name'))
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([header for header, _ in COMMON_COLUMNS] + [name for _, name in project_fields])
+
+    for deployment in export_queryset(project).iterator(chunk_size=chunk_size):
+        custom_values = {
+            field_value.field_id: field_value.value
+            for field_value in deployment.fields.all()
+        }
+        sheet.append(
+            [getter(deployment) for _, getter in COMMON_COLUMNS] +
+            [custom_values.get(field_id, '') for field_id, _ in project_fields]
+        )
+
+    workbook.save(file_obj)
+
+
+def export_to_tempfile(project):
+    """Render the export into a temporary file, rewound for streaming"""
+    file_obj = tempfile.TemporaryFile()
+    write_deployments_workbook(project, file_obj)
+    file_obj.seek(0)
+    return file_obj
@@ -0,0 +1,200 @@
+"""
+Status history of deployments and the daily rollups reports are read from.
+
+Every path that creates deployments or changes their status (Deployment.save,
+the bulk endpoints, the importers) hands the changes to
+record_status_changes(). It appends DeploymentStatusEvent rows and adds
+them to DeploymentStatusDaily in the same transaction: per project, day,
+status and technician, the deployments that entered and left the status
+and the time spent in it. Each batch is one INSERT of events plus one
+INSERT ... ON CONFLICT DO UPDATE that increments the rollup rows.
+
+The reports below (burn-down, throughput, time in status) only read the
+rollups, so their cost depends on the number of days and statuses, not on
+the number of deployments or changes.
+"""
+import datetime
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import reference
+from .models import DeploymentStatusDaily, DeploymentStatusEvent
+
+StatusChange = namedtuple(
+    'StatusChange',
+    # since: when the deployment entered from_status (None for new deployments)
+    ['deployment_id', 'project_id', 'from_status_id', 'to_status_id', 'technician_id', 'since', 'at']
+)
+
+
+def record_status_changes(changes):
+    """Append status events and add them to the daily rollups"""
+    events = [
+        DeploymentStatusEvent(
+            deployment_id=change.deployment_id,
+            project_id=change.project_id,
+            from_status_id=change.from_status_id,
+            to_status_id=change.to_status_id,
+            technician_id=change.technician_id,
+            changed_at=change.at,
+            seconds_in_previous=(
+                max(int((change.at - change.since).total_seconds()), 0) if change.since else None
+            ),
+        )
+        for change in changes
+    ]
+    if not events:
+        return
+    DeploymentStatusEvent.objects.bulk_create(events, batch_size=settings.IMPORT_BATCH_SIZE)
+
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for event in events:
+        day = timezone.localdate(event.changed_at)
+        deltas[(event.project_id, day, event.to_status_id, event.technician_id)][0] += 1
+        if event.from_status_id is not None:
+            delta = deltas[(event.project_id, day, event.from_status_id, event.technician_id)]
+            delta[1] += 1
+            delta[3] += event.seconds_in_previous or 0
+    add_to_rollups(deltas)
+
+
+def record_created(deployments):
+    """Record the status new deployments were created in (after bulk_create)"""
+    record_status_changes([
+        StatusChange(
+            deployment_id=deployment.id,
+            project_id=deployment.project_id,
+            from_status_id=None,
+            to_status_id=deployment.status_id,
+            technician_id=deployment.technician_id,
+            since=None,
+            at=deployment.created_date,
+        )
+        for deployment in deployments
+    ])
+
+
+def record_removal(project_id, status_id, technician_id):
+    """A deployment deleted while in `status_id` no longer counts towards it"""
+    add_to_rollups({(project_id, timezone.localdate(), status_id, technician_id): [0, 0, 1, 0]})
+
+
+def add_to_rollups(deltas):
+    """
+    Add {(project_id, day, status_id, technician_id): [entered, exited,
+    removed, seconds]} to the rollup rows, creating missing ones
+    """
+    table = DeploymentStatusDaily._meta.db_table
+    # A fixed order, so concurrent writers lock rows in the same order
+    rows = sorted(deltas.items(), key=lambda item: (item[0][0], item[0][1], item[0][2], item[0][3] or 0))
+    for start in range(0, len(rows), settings.IMPORT_BATCH_SIZE):
+        batch = rows[start:start + settings.IMPORT_BATCH_SIZE]
+        values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(batch))
+        params = [value for key, delta in batch for value in (*key, *delta)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} AS rollup
+                    (project_id, day, status_id, technician_id, entered, exited, removed, seconds_in_status)
+                VALUES {values}
+                ON CONFLICT (project_id, day, status_id, COALESCE(technician_id, 0)) DO UPDATE SET
+                    entered = rollup.entered + EXCLUDED.entered,
+                    exited = rollup.exited + EXCLUDED.exited,
+                    removed = rollup.removed + EXCLUDED.removed,
+                    seconds_in_status = rollup.seconds_in_status + EXCLUDED.seconds_in_status
+                """,
+                params
+            )
+
+
+def days_between(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+def burndown(project, start, end, completed_status_ids):
+    """
+    Per day from `start` to `end`: deployments in the project, how many were
+    in a completed status and how many remain (of expected_count, if set)
+    """
+    completed = set(completed_status_ids)
+    per_day = defaultdict(lambda: [0, 0])
+    rows = (
+        DeploymentStatusDaily.objects.filter(project=project, day__lte=end)
+        .values('day', 'status_id')
+        .annotate(entered=Sum('entered'), exited=Sum('exited'), removed=Sum('removed'))
+        .order_by()
+    )
+    for row in rows:
+        change = row['entered'] - row['exited'] - row['removed']
+        # Days before the range only count towards its first day
+        day = max(row['day'], start)
+        per_day[day][0] += change
+        if row['status_id'] in completed:
+            per_day[day][1] += change
+
+    days = []
+    total = done = 0
+    for day in days_between(start, end):
+        total += per_day[day][0]
+        done += per_day[day][1]
+        days.append({
+            'date': day,
+            'total': total,
+            'completed': done,
+            'remaining': max((project.expected_count or total) - done, 0),
+        })
+    return days
+
+
+def throughput(project, start, end, status_ids):
+    """Deployments each technician moved into one of `status_ids`, per day and in total"""
+    rows = (
+        DeploymentStatusDaily.objects.filter(
+            project=project, status_id__in=status_ids, day__range=(start, end), entered__gt=0
+        )
+        .values('technician_id', 'day')
+        .annotate(count=Sum('entered'))
+        .order_by('technician_id', 'day')
+    )
+    technicians = {}
+    for row in rows:
+        technician_id = row['technician_id']
+        entry = technicians.setdefault(technician_id, {
+            'id': technician_id,
+            'name': reference.technicians.name_of(technician_id),
+            'total': 0,
+            'per_day': [],
+        })
+        entry['total'] += row['count']
+        entry['per_day'].append({'date': row['day'], 'count': row['count']})
+    return sorted(technicians.values(), key=lambda entry: -entry['total'])
+
+
+def time_in_status(project, start, end, technician_id=None):
+    """Average time deployments spent in each status before leaving it"""
+    rows = DeploymentStatusDaily.objects.filter(project=project, day__range=(start, end), exited__gt=0)
+    if technician_id:
+        rows = rows.filter(technician_id=technician_id)
+    rows = (
+        rows.values('status_id')
+        .annotate(exited=Sum('exited'), seconds=Sum('seconds_in_status'))
+        .order_by()
+    )
+    by_status = {row['status_id']: row for row in rows}
+    return [
+        {
+            'id': status.id,
+            'name': status.name,
+            'exits': by_status[status.id]['exited'],
+            'average_seconds': round(by_status[status.id]['seconds'] / by_status[status.id]['exited']),
+        }
+        for status in reference.statuses.all()
+        if status.id in by_status
+    ]
@@ -0,0 +1,439 @@
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+
+from projects.analysis import parse_date, parse_number
+from projects.models import ProjectField
+from projects.stats import invalidate_project_stats
+from . import events, history, reference
+from .custom_filters import CustomValueText
+from .models import Deployment, DeploymentField
+from .sequence import claim_deployment_ids, reserve_deployment_ids
+
+
+# Common Deployment columns and the spreadsheet headers they may appear under
+COMMON_FIELD_MAP = {
+    'assigned_to': ['assigned_to', 'assignee', 'user', 'employee'],
+    'position': ['position', 'job_title', 'title', 'role'],
+    'location': ['location', 'site', 'building', 'office'],
+    'current_model': ['current_model', 'old_model', 'existing_model'],
+    'current_sn': ['current_sn', 'old_sn', 'existing_sn', 'current_serial'],
+    'new_model': ['new_model', 'target_model', 'model'],
+    'new_sn': ['new_sn', 'target_sn', 'serial_number', 'serial'],
+}
+
+# Headers recognised when importing a sheet into a project (ProjectViewSet)
+PROJECT_FIELD_MAP = {
+    'assigned_to': ['Assigned To', 'Assignee', 'User', 'Employee'],
+    'position': ['Position', 'Title', 'Role', 'Job Title'],
+    'location': ['Location', 'Office', 'Site', 'Building'],
+    'current_model': ['Current Model', 'Old Model', 'Existing Model'],
+    'current_sn': ['Current SN', 'Old SN', 'Existing SN'],
+    'new_model': ['New Model', 'Model', 'Target Model'],
+    'new_sn': ['New SN', 'SN', 'Serial Number'],
+}
+
+
+# Natural keys an upsert import can match rows on, besides `cf.<field id>`
+UPSERT_KEYS = ['deployment_id', 'new_sn', 'current_sn']
+# Headers the deployment ID may appear under when it is the upsert key
+DEPLOYMENT_ID_HEADERS = ['deployment_id', 'deployment id', 'id']
+
+
+class ImportFailed(Exception):
+    """The import cannot start at all (as opposed to a single bad row)"""
+
+
+def get_default_status():
+    default_status = reference.default_status()
+    if not default_status:
+        raise ImportFailed("No deployment status defined. Please create at least one status.")
+    return default_status
+
+
+def convert_field_value(field, cell_value):
+    """Convert a spreadsheet cell to the stored value for a ProjectField"""
+    if field.field_type == 'number':
+        number = parse_number(cell_value)
+        return cell_value if number is None else number
+    if field.field_type == 'date':
+        # Dates written as text are stored the same way as real ones
+        date = parse_date(cell_value)
+        return str(cell_value) if date is None else date.strftime('%Y-%m-%d')
+    if field.field_type == 'checkbox':
+        # Stored the way the deployment form writes it
+        return 'true' if str(cell_value).strip().lower() in ('1', 'true', 'yes', 'y', 'x') else 'false'
+    return str(cell_value)
+
+
+def is_blank(value):
+    return value is None or (pd.api.types.is_scalar(value) and pd.isna(value))
+
+
+def upsert_key_field(project, key):
+    """
+    Check an upsert key. Returns the ProjectField for a `cf.<field id>` key
+    and None for a Deployment column; raises ImportFailed for anything else.
+    """
+    if key in UPSERT_KEYS:
+        return None
+    if str(key).startswith('cf.'):
+        try:
+            return project.fields.get(pk=int(key[3:]))
+        except (ValueError, ProjectField.DoesNotExist):
+            pass
+    raise ImportFailed(
+        f"Unknown upsert key '{key}'. Use {', '.join(UPSERT_KEYS)} or cf.<field id>"
+    )
+
+
+class DeploymentImporter:
+    """
+    Builds Deployments and their DeploymentFields in memory and writes them
+    with batched bulk_create. Callers feed rows through add_row() and call
+    finish(); rows that fail validation are reported in `errors` and skipped
+    without aborting the rest of the import.
+
+    Each batch is written atomically. Run the whole import inside a
+    transaction to make it all-or-nothing. `progress`, if given, is called
+    with the importer after every batch.
+    """
+
+    def __init__(self, project, default_status, columns, column_to_field=None,
+                 header_map=None,
+                 error_format="Row {row}: {error}", batch_size=None, progress=None):
+        self.project = project
+        self.default_status = default_status
+        self.column_to_field = column_to_field or {}
+        self.error_format = error_format
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.progress = progress
+
+        # Resolve which spreadsheet column feeds each common field once,
+        # instead of probing the headers again for every row
+        header_map = COMMON_FIELD_MAP if header_map is None else header_map
+        self.common_columns = {}
+        for field_name, possible_headers in header_map.items():
+            for header in possible_headers:
+                if header in columns:
+                    self.common_columns[field_name] = header
+                    break
+
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+        self._pending = []
+        # Deployments written by the current batch, for the change events
+        self._created_ids = []
+        self._updated_ids = []
+
+    @property
+    def processed(self):
+        return self.created + self.updated + self.unchanged + len(self.errors)
+
+    def counts(self):
+        return {"inserted": self.created, "updated": self.updated, "unchanged": self.unchanged}
+
+    def message(self):
+        return f"Successfully imported {self.created} deployments"
+
+    def deployment_id_for(self, row_number, row):
+        # Rows without an ID get the next ones in the project's sequence when inserted
+        return None
+
+    def build_deployment(self, row_number, row):
+        deployment = Deployment(
+            project=self.project,
+            deployment_id=self.deployment_id_for(row_number, row),
+            status=self.default_status,
+        )
+        for field_name, column in self.common_columns.items():
+            value = row.get(column)
+            if not is_blank(value):
+                setattr(deployment, field_name, str(value))
+
+        # Catch values that would be rejected by the database (e.g. too long)
+        # here, so one bad row cannot fail a whole batch
+        exclude = ['project', 'status', 'department', 'technician']
+        if deployment.deployment_id is None:
+            exclude.append('deployment_id')
+        deployment.clean_fields(exclude=exclude)
+        return deployment
+
+    def build_fields(self, row):
+        values = []
+        for column, field in self.column_to_field.items():
+            cell_value = row.get(column)
+            if not is_blank(cell_value):
+                values.append((field, convert_field_value(field, cell_value)))
+        return values
+
+    def add_row(self, row_number, row):
+        """Queue one spreadsheet row (a column -> value mapping) for insertion"""
+        try:
+            deployment = self.build_deployment(row_number, row)
+            field_values = self.build_fields(row)
+            deployment.custom_values = {str(field.id): str(value) for field, value in field_values}
+        except ValidationError as e:
+            self.errors.append(self.error_format.format(row=row_number, error='; '.join(e.messages)))
+            return
+        except Exception as e:
+            self.errors.append(self.error_format.format(row=row_number, error=str(e)))
+            return
+
+        self._pending.append((row_number, deployment, field_values))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def insert(self, pending):
+        """Insert (row_number, deployment, field_values) with one INSERT per table"""
+        claim_deployment_ids(self.project.id, [
+            deployment.deployment_id for _, deployment, _ in pending if deployment.deployment_id
+        ])
+        unnumbered = [deployment for _, deployment, _ in pending if not deployment.deployment_id]
+        for deployment, deployment_id in zip(
+            unnumbered, reserve_deployment_ids(self.project.id, len(unnumbered))
+        ):
+            deployment.deployment_id = deployment_id
+
+        deployments = Deployment.objects.bulk_create(
+            [deployment for _, deployment, _ in pending],
+            batch_size=self.batch_size
+        )
+
+        fields = [
+            DeploymentField(deployment=deployment, field=field, value=value)
+            for deployment, (_, _, field_values) in zip(deployments, pending)
+            for field, value in field_values
+        ]
+        DeploymentField.objects.bulk_create(fields, batch_size=self.batch_size)
+        history.record_created(deployments)
+        self.created += len(deployments)
+        self._created_ids.extend(deployment.id for deployment in deployments)
+
+    def write(self, pending):
+        self.insert(pending)
+
+    def flush(self):
+        """Write the queued rows as one batch"""
+        if self._pending:
+            with transaction.atomic():
+                self.write(self._pending)
+            self._pending = []
+
+            # bulk_create sends no post_save signals
+            project_id = self.project.id
+            transaction.on_commit(lambda: invalidate_project_stats(project_id))
+            events.publish(project_id, self._created_ids, 'created')
+            events.publish(project_id, self._updated_ids)
+            self._created_ids, self._updated_ids = [], []
+
+        if self.progress:
+            self.progress(self)
+
+    def import_rows(self, rows):
+        """Queue (row_number, row) pairs, e.g. from SpreadsheetReader.rows()"""
+        for row_number, row in rows:
+            self.add_row(row_number, row)
+
+    def finish(self):
+        self.flush()
+        return self
+
+
+class UpsertImporter(DeploymentImporter):
+    """
+    Imports a sheet that may repeat rows imported before. Each row is
+    matched to a deployment of the project on `key` (a Deployment column
+    or `cf.<field id>`): new rows are inserted, matched rows updated with
+    the non-blank cells of the sheet, and rows that would not change
+    anything are left alone. Updates are written per batch with
+    INSERT ... ON CONFLICT DO UPDATE on the deployment ID, and the custom
+    values likewise on (deployment, field).
+
+    A key repeated within the sheet is reported as an error on the later
+    row. Where several deployments share a key, the oldest is updated.
+    """
+
+    def __init__(self, project, default_status, columns, key, **kwargs):
+        super().__init__(project, default_status, columns, **kwargs)
+        self.key = key
+        self.key_field = upsert_key_field(project, key)
+
+        if key == 'deployment_id':
+            headers = {str(column).strip().lower(): column for column in columns}
+            self.key_column = next(
+                (headers[header] for header in DEPLOYMENT_ID_HEADERS if header in headers), None
+            )
+        elif self.key_field is not None:
+            self.key_column = next(
+                (column for column, field in self.column_to_field.items() if field.id == self.key_field.id),
+                None
+            )
+        else:
+            self.key_column = self.common_columns.get(key)
+        if self.key_column is None:
+            raise ImportFailed(f"The sheet has no column for the upsert key '{key}'")
+
+        # Every key already in the project, read once rather than per batch
+        expression = CustomValueText(self.key_field.id) if self.key_field else F(key)
+        existing = (
+            Deployment.objects.filter(project=project)
+            .annotate(natural_key=expression)
+            .exclude(natural_key__isnull=True).exclude(natural_key='')
+            .order_by('-id')
+            .values_list('natural_key', 'id')
+        )
+        self.existing_ids = dict(existing.iterator(chunk_size=10000))
+        self.seen_keys = set()
+
+    def message(self):
+        return (f"Imported {self.created} new deployments, updated {self.updated}, "
+                f"{self.unchanged} unchanged")
+
+    def deployment_id_for(self, row_number, row):
+        if self.key == 'deployment_id' and not is_blank(row.get(self.key_column)):
+            return str(row[self.key_column]).strip()
+        return super().deployment_id_for(row_number, row)
+
+    def row_key(self, deployment):
+        if self.key_field is not None:
+            value = deployment.custom_values.get(str(self.key_field.id))
+        else:
+            value = getattr(deployment, self.key)
+        return value or None
+
+    def write(self, pending):
+        inserts, matches = [], []
+        for row_number, deployment, field_values in pending:
+            key = self.row_key(deployment)
+            if key is not None:
+                if key in self.seen_keys:
+                    self.errors.append(self.error_format.format(
+                        row=row_number, error=f"'{key}' appears more than once in the sheet"
+                    ))
+                    continue
+                self.seen_keys.add(key)
+            existing_id = self.existing_ids.get(key)
+            if existing_id is None:
+                inserts.append((row_number, deployment, field_values))
+            else:
+                matches.append((existing_id, row_number, deployment, field_values))
+
+        columns = list(self.common_columns)
+        current = {
+            row['id']: row for row in
+            Deployment.objects.select_for_update()
+            .filter(pk__in=[existing_id for existing_id, *_ in matches])
+            .values('id', 'deployment_id', 'custom_values', *columns)
+        }
+
+        changed = []
+        for existing_id, row_number, deployment, field_values in matches:
+            old = current.get(existing_id)
+            if old is None:
+                # Deleted since the import started
+                inserts.append((row_number, deployment, field_values))
+                continue
+            # Blank cells keep the stored value
+            for name in columns:
+                if getattr(deployment, name) in ('', None):
+                    setattr(deployment, name, old[name])
+            custom_values = {**old['custom_values'], **deployment.custom_values}
+            if custom_values == old['custom_values'] and all(
+                getattr(deployment, name) == old[name] for name in columns
+            ):
+                self.unchanged += 1
+                continue
+            deployment.deployment_id = old['deployment_id']
+            deployment.custom_values = custom_values
+            changed.append((existing_id, deployment, field_values))
+
+        if changed:
+            Deployment.objects.bulk_create(
+                [deployment for _, deployment, _ in changed],
+                update_conflicts=True,
+                unique_fields=['project', 'deployment_id'],
+                update_fields=[*columns, 'custom_values', 'updated_date'],
+                batch_size=self.batch_size
+            )
+            DeploymentField.objects.bulk_create(
+                [
+                    DeploymentField(deployment_id=existing_id, field=field, value=value)
+                    for existing_id, _, field_values in changed
+                    for field, value in field_values
+                ],
+                update_conflicts=True,
+                unique_fields=['deployment', 'field'],
+                update_fields=['value'],
+                batch_size=self.batch_size
+            )
+            self.updated += len(changed)
+            self._updated_ids.extend(existing_id for existing_id, _, _ in changed)
+
+        if inserts:
+            self.insert(inserts)
+            for _, deployment, _ in inserts:
+                key = self.row_key(deployment)
+                if key is not None:
+                    self.existing_ids[key] = deployment.id
+
+
+def make_importer(project, columns, upsert_key=None, **kwargs):
+    """A DeploymentImporter, or an UpsertImporter matching rows on `upsert_key`"""
+    if upsert_key:
+        return UpsertImporter(project, get_default_status(), columns, upsert_key, **kwargs)
+    return DeploymentImporter(project, get_default_status(), columns, **kwargs)
+
+
+def import_deployments(project, reader, column_map, batch_size=None, progress=None, upsert_key=None):
+    """
+    Import a sheet for DeploymentViewSet.import_excel. `column_map` maps
+    ProjectField ids to the spreadsheet columns holding their values.
+    Errors refer to rows by their line in the sheet. Returns the importer.
+    """
+    project_fields = {str(field.id): field for field in project.fields.all()}
+
+    # Map Excel column names to the project fields they feed
+    column_to_field = {
+        col_name: project_fields[str(field_id)]
+        for field_id, col_name in column_map.items()
+        if str(field_id) in project_fields
+    }
+
+    importer = make_importer(
+        project, reader.columns, upsert_key,
+        column_to_field=column_to_field,
+        batch_size=batch_size,
+        progress=progress
+    )
+    importer.import_rows(reader.rows())
+    return importer.finish()
+
+
+def import_project_sheet(project, reader, batch_size=None, progress=None, upsert_key=None):
+    """
+    Import a sheet for ProjectViewSet.import_excel. Columns are matched to
+    project fields by name, ignoring case. Errors refer to data rows,
+    counting from 1. Returns the importer.
+    """
+    fields_by_name = {field.name.lower(): field for field in project.fields.all()}
+    column_to_field = {
+        column: fields_by_name[str(column).lower()]
+        for column in reader.columns
+        if str(column).lower() in fields_by_name
+    }
+
+    importer = make_importer(
+        project, reader.columns, upsert_key,
+        column_to_field=column_to_field,
+        header_map=PROJECT_FIELD_MAP,
+        error_format="Error in row {row}: {error}",
+        batch_size=batch_size,
+        progress=progress
+    )
+    importer.import_rows((line_number - 1, row) for line_number, row in reader.rows())
+    return importer.finish()
@@ -0,0 +1,250 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from backend.spreadsheets import SpreadsheetReader
+from backend.staging import UploadNotFound, get_upload
+from projects.models import Project
+from .importers import ImportFailed, import_deployments, import_project_sheet, upsert_key_field
+from .models import ImportJob
+from .serializers import ImportJobSerializer
+
+
+def wants_background(request, default):
+    """Read the optional `background` flag sent with an upload"""
+    value = request.data.get('background', request.query_params.get('background'))
+    if value is None or value == '':
+        return default
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def requested_upsert_key(request, project):
+    """
+    The natural key sent with mode=upsert, checked against the project
+    (default deployment_id); None for a plain import. Raises ImportFailed.
+    """
+    mode = request.data.get('mode') or 'insert'
+    if mode == 'insert':
+        return None
+    if mode != 'upsert':
+        raise ImportFailed("mode must be 'insert' or 'upsert'")
+    key = request.data.get('key') or 'deployment_id'
+    upsert_key_field(project, key)
+    return key
+
+
+def enqueue_import(project, kind, file_obj, options=None, user=None):
+    """
+    Store the uploaded file and queue it for the import worker. Without a
+    file, the staged upload in options['upload_id'] is imported; the job
+    still keeps a copy of it in case the upload expires before it runs.
+    """
+    if file_obj is None:
+        with get_upload(options['upload_id']).open_source() as source:
+            return enqueue_import(project, kind, source, options, user)
+    return ImportJob.objects.create(
+        project=project,
+        kind=kind,
+        file=file_obj,
+        options=options or {},
+        created_by=user if user and user.is_authenticated else None
+    )
+
+
+def import_job_info(job, request):
+    """The queued job and the URL to poll for its progress"""
+    serializer = ImportJobSerializer(job, context={'request': request})
+    return {
+        "job": serializer.data,
+        "status_url": reverse('importjob-detail', args=[job.id], request=request)
+    }
+
+
+def import_job_accepted(job, request):
+    """202 response pointing the client at the job's progress endpoint"""
+    return Response({
+        "message": "Import queued",
+        **import_job_info(job, request)
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+def fail_orphaned_jobs():
+    """
+    Fail running jobs without a heartbeat for IMPORT_JOB_TIMEOUT seconds:
+    their worker was killed, and the project's queue would otherwise wait
+    for them forever. Their import was rolled back with its connection.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.IMPORT_JOB_TIMEOUT)
+    stale = Q(heartbeat_date__lt=cutoff) | Q(heartbeat_date__isnull=True, started_date__lt=cutoff)
+    return ImportJob.objects.filter(stale, status='running').update(
+        status='failed',
+        message='The import worker stopped while running this job',
+        finished_date=timezone.now()
+    )
+
+
+def claim_next_job():
+    """
+    Take the oldest queued job off the queue. SKIP LOCKED lets several
+    workers poll the table without handing out a job twice. Jobs for a
+    project that already has an import running wait their turn: the
+    project row is locked while its job is claimed, so two workers cannot
+    each start an import for it.
+    """
+    fail_orphaned_jobs()
+    with transaction.atomic():
+        busy_projects = ImportJob.objects.filter(status='running').values('project_id')
+        queued = (
+            ImportJob.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(status='queued')
+            .exclude(project_id__in=busy_projects)
+            .order_by('created_date', 'id')
+        )
+        skipped = set()
+        while True:
+            job = queued.exclude(project_id__in=skipped).first()
+            if job is None:
+                return None
+            # Another worker claiming for the project holds the lock, or has
+            # started an import since busy_projects was read
+            project = Project.objects.select_for_update(skip_locked=True, no_key=True).filter(pk=job.project_id)
+            running = ImportJob.objects.filter(project_id=job.project_id, status='running')
+            if project.exists() and not running.exists():
+                break
+            skipped.add(job.project_id)
+        job.status = 'running'
+        job.started_date = job.heartbeat_date = timezone.now()
+        job.save(update_fields=['status', 'started_date', 'heartbeat_date'])
+    return job
+
+
+class Heartbeat:
+    """
+    Moves a job's heartbeat_date on every IMPORT_JOB_HEARTBEAT seconds and
+    writes the progress it is given, on a thread with its own connection:
+    the import runs in one transaction, which other clients cannot see into
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.progress = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f'import-job-{job_id}', daemon=True)
+
+    def report(self, **progress):
+        """Write these job fields with the next heartbeat, which is sent right away"""
+        with self.lock:
+            self.progress = progress
+        self.wake.set()
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                self.wake.wait(settings.IMPORT_JOB_HEARTBEAT)
+                self.wake.clear()
+                with self.lock:
+                    progress, self.progress = self.progress, {}
+                ImportJob.objects.filter(pk=self.job_id, status='running').update(
+                    heartbeat_date=timezone.now(), **progress
+                )
+        finally:
+            # The thread's own connection
+            connection.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.wake.set()
+        self.thread.join()
+
+
+def open_reader(file_obj, options):
+    """The staged rows of options['upload_id'] while available, else file_obj parsed"""
+    if options.get('upload_id'):
+        try:
+            return get_upload(options['upload_id']).reader()
+        except UploadNotFound:
+            if file_obj is None:
+                raise ImportFailed("Upload not found or expired")
+    return SpreadsheetReader(file_obj)
+
+
+def run_import(project, kind, file_obj, options, progress=None):
+    """
+    Run the importer behind either upload endpoint and return it. Rows are
+    inserted while the file is still being read. With options['upsert_key']
+    rows matching an existing deployment update it instead.
+    """
+    reader = open_reader(file_obj, options)
+    batch_size = options.get('batch_size')
+    upsert_key = options.get('upsert_key')
+    try:
+        if kind == 'deployments':
+            return import_deployments(
+                project, reader, options.get('column_map', {}), batch_size, progress, upsert_key
+            )
+        return import_project_sheet(project, reader, batch_size, progress, upsert_key)
+    finally:
+        reader.close()
+
+
+def process_import_job(job_id):
+    """
+    Import the file of a claimed job, all or nothing like the inline
+    import, recording progress after each batch
+    """
+    job = ImportJob.objects.select_related('project').get(pk=job_id)
+    started = time.monotonic()
+
+    def progress_of(importer):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        return {
+            'rows_processed': importer.processed,
+            'rows_failed': len(importer.errors),
+            'rows_per_second': importer.processed / elapsed,
+        }
+
+    try:
+        with Heartbeat(job.id) as heartbeat, job.file.open('rb') as file_obj:
+            with transaction.atomic():
+                importer = run_import(
+                    job.project, job.kind, file_obj, job.options,
+                    lambda importer: heartbeat.report(**progress_of(importer))
+                )
+    except ImportFailed as e:
+        job.status, job.message = 'failed', str(e)
+    except Exception as e:
+        job.status, job.message = 'failed', f"Error processing Excel file: {str(e)}"
+    else:
+        job.status = 'completed'
+        job.message = importer.message()
+        job.errors = importer.errors
+
+    # The upload is not needed once it has been imported
+    job.file.delete(save=False)
+
+    if job.status == 'completed':
+        for name, value in progress_of(importer).items():
+            setattr(job, name, value)
+    else:
+        # How far it got before the import was rolled back
+        job.refresh_from_db(fields=['rows_processed', 'rows_failed', 'rows_per_second'])
+    job.finished_date = timezone.now()
+    job.save(update_fields=[
+        'status', 'message', 'errors', 'file', 'finished_date',
+        'rows_processed', 'rows_failed', 'rows_per_second'
+    ])
+    return job
@@ -0,0 +1,20 @@
+# backend/deployments/management/commands/index_custom_fields.py
+from django.core.management.base import BaseCommand
+from deployments.custom_filters import sync_custom_field_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds the indexes of custom fields marked indexed and drops those no longer needed '
+        '(run after changing which fields are indexed)'
+    )
+
+    def handle(self, *args, **options):
+        # Outside a transaction, so indexes are built CONCURRENTLY without
+        # blocking writes to deployments
+        created, dropped = sync_custom_field_indexes()
+        for name in created:
+            self.stdout.write(f'Created {name}')
+        for name in dropped:
+            self.stdout.write(f'Dropped {name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} indexes created, {len(dropped)} dropped'))
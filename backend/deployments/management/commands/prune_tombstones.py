@@ -0,0 +1,16 @@
+# backend/deployments/management/commands/prune_tombstones.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from deployments.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = 'Removes deletion records older than TOMBSTONE_RETENTION_DAYS (run e.g. daily)'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+        count, _ = Tombstone.objects.filter(deleted_date__lt=cutoff).delete()
+        self.stdout.write(f'Removed {count} tombstones older than {cutoff:%Y-%m-%d %H:%M}')
@@ -0,0 +1,89 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+)
+from django.utils import timezone
+
+from deployments.benchmarks import SCENARIOS, compare, run_benchmarks
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Time the import, export, analysis and list endpoints on synthetic data in a test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000',
+                            help='Comma-separated deployment counts to benchmark at')
+        parser.add_argument('--fields', type=int, default=5, help='Custom fields per project')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per measurement')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help='Only run this scenario (may be repeated)')
+        parser.add_argument('--output', default='benchmarks.json',
+                            help='Where to write the results as JSON')
+        parser.add_argument('--compare', metavar='BASELINE',
+                            help='Results file from an earlier run to compare against')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative slowdown or memory growth reported as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError('--sizes must be a comma-separated list of integers')
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        # Run against a fresh test database so real data is never touched
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = run_benchmarks(
+                sizes, fields=options['fields'], repeat=options['repeat'],
+                scenarios=options['scenario'], log=self.stdout.write
+            )
+            database = f'{connection.vendor} {connection.pg_version}'
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        output = {
+            'meta': {
+                'commit': git_commit(),
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': database,
+                'fields': options['fields'],
+                'repeat': options['repeat'],
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(output, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if baseline:
+            lines, regressed = compare(baseline['results'], results, options['threshold'])
+            self.stdout.write(f"Compared with {options['compare']} ({baseline['meta'].get('commit')}):")
+            for line in lines or ['No changes']:
+                self.stdout.write(line)
+            if regressed and options['fail_on_regression']:
+                raise CommandError('Benchmarks regressed')
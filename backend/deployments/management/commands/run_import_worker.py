@@ -0,0 +1,109 @@
+# backend/deployments/management/commands/run_import_worker.py
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from deployments import worker
+from deployments.jobs import claim_next_job, fail_orphaned_jobs
+from deployments.models import ImportJob
+
+
+def start_pool(processes):
+    # Spawned processes start with a fresh interpreter and their own
+    # database connections instead of inheriting ours
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=worker.setup
+    )
+
+
+class Command(BaseCommand):
+    help = 'Processes queued spreadsheet imports with a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.IMPORT_WORKER_PROCESSES,
+                            help='Number of imports to run in parallel')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait before checking an empty queue again')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of waiting for new jobs')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        poll_interval = options['poll_interval']
+        self.stdout.write(f'Import worker started with {processes} processes')
+        orphaned = fail_orphaned_jobs()
+        if orphaned:
+            self.stderr.write(f'Failed {orphaned} import jobs left running by a stopped worker')
+
+        pool = start_pool(processes)
+        running = {}
+
+        try:
+            while True:
+                # Fill free slots from the queue
+                while len(running) < processes:
+                    job = claim_next_job()
+                    if job is None:
+                        break
+                    try:
+                        future = pool.submit(worker.run_job, job.id)
+                    except BrokenProcessPool:
+                        # The job never reached a process: put it back on the queue
+                        ImportJob.objects.filter(pk=job.id, status='running').update(
+                            status='queued', started_date=None, heartbeat_date=None
+                        )
+                        pool = self.restart_pool(pool, running, processes)
+                        continue
+                    self.stdout.write(f'Started import job {job.id} ({job.file.name})')
+                    running[future] = job.id
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.finish(future, running.pop(future))
+                if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                    pool = self.restart_pool(pool, running, processes)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping import worker...')
+        finally:
+            pool.shutdown(wait=True)
+
+    def finish(self, future, job_id):
+        try:
+            job_status, rows_processed, rows_failed = future.result()
+            self.stdout.write(self.style.SUCCESS(
+                f'Import job {job_id} {job_status}: '
+                f'{rows_processed} rows processed, {rows_failed} failed'
+            ))
+        except Exception as e:
+            # The worker process died; don't leave the job "running"
+            ImportJob.objects.filter(pk=job_id, status='running').update(
+                status='failed',
+                message=f'Import worker crashed: {e}',
+                finished_date=timezone.now()
+            )
+            self.stderr.write(f'Import job {job_id} crashed: {e}')
+
+    def restart_pool(self, pool, running, processes):
+        """
+        A process that died (killed for memory, a crash in a parser) breaks
+        the whole pool: the jobs still in it fail too, and a new pool
+        takes over the queue
+        """
+        self.stderr.write('Import worker process died, restarting the pool')
+        pool.shutdown(wait=False)
+        done, _ = wait(running)
+        for future in done:
+            self.finish(future, running.pop(future))
+        return start_pool(processes)
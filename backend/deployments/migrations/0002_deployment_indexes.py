@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:13
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicates(apps, schema_editor):
+    """Make existing rows satisfy the new unique constraints"""
+    Deployment = apps.get_model('deployments', 'Deployment')
+    DeploymentField = apps.get_model('deployments', 'DeploymentField')
+
+    # Keep the most recent value when a deployment has a field twice
+    duplicates = (
+        DeploymentField.objects.values('deployment_id', 'field_id')
+        .annotate(count=Count('id'), keep=Max('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        DeploymentField.objects.filter(
+            deployment_id=row['deployment_id'], field_id=row['field_id']
+        ).exclude(id=row['keep']).delete()
+
+    # Older imports reused deployment IDs within a project; suffix the
+    # later copies with their primary key
+    duplicates = (
+        Deployment.objects.values('project_id', 'deployment_id')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        copies = Deployment.objects.filter(
+            project_id=row['project_id'], deployment_id=row['deployment_id']
+        ).order_by('id')[1:]
+        for deployment in copies:
+            suffix = f"-{deployment.id}"
+            deployment.deployment_id = deployment.deployment_id[:20 - len(suffix)] + suffix
+            deployment.save(update_fields=['deployment_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='deployment',
+            index=models.Index(fields=['project', 'status'], name='deployment_project_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deployment',
+            index=models.Index(fields=['project', 'technician'], name='deployment_project_tech_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deployment',
+            index=models.Index(fields=['project', 'department'], name='deployment_project_dept_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='deployment',
+            constraint=models.UniqueConstraint(fields=('project', 'deployment_id'), name='unique_project_deployment_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='deploymentfield',
+            constraint=models.UniqueConstraint(fields=('deployment', 'field'), name='unique_deployment_field'),
+        ),
+    ]
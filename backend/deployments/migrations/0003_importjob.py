@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('deployments', '0002_deployment_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('deployments', 'Deployment import'), ('project', 'Project import')], max_length=20)),
+                ('file', models.FileField(upload_to='imports/')),
+                ('options', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('rows_failed', models.IntegerField(default=0)),
+                ('rows_per_second', models.FloatField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('message', models.TextField(blank=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('started_date', models.DateTimeField(blank=True, null=True)),
+                ('finished_date', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='projects.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_date'], name='importjob_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:25
+
+from itertools import groupby
+from operator import itemgetter
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+def copy_custom_values(apps, schema_editor):
+    """Fill custom_values from the existing DeploymentField rows"""
+    Deployment = apps.get_model('deployments', 'Deployment')
+    DeploymentField = apps.get_model('deployments', 'DeploymentField')
+
+    rows = (
+        DeploymentField.objects.order_by('deployment_id')
+        .values_list('deployment_id', 'field_id', 'value')
+        .iterator(chunk_size=2000)
+    )
+    batch = []
+    for deployment_id, values in groupby(rows, key=itemgetter(0)):
+        batch.append(Deployment(
+            id=deployment_id,
+            custom_values={str(field_id): value for _, field_id, value in values}
+        ))
+        if len(batch) >= 1000:
+            Deployment.objects.bulk_update(batch, ['custom_values'])
+            batch = []
+    Deployment.objects.bulk_update(batch, ['custom_values'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0003_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deployment',
+            name='custom_values',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(copy_custom_values, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='deployment',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['custom_values'], name='deployment_custom_values_gin'),
+        ),
+    ]
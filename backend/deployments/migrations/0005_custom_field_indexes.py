@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# text::date is only STABLE (it reads DateStyle), which indexes do not
+# accept; for the ISO dates it is given it is immutable. Impossible dates
+# such as 2024-02-30 give NULL instead of failing the write.
+CREATE_DATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION custom_value_date(value text) RETURNS date AS $$
+BEGIN
+    RETURN value::date;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE
+"""
+
+# The expressions custom_filters.value_expression() produces for number and
+# date fields
+NUMBER_PATTERN = r'^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$'
+DATE_PATTERN = r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$'
+EXPRESSIONS = {
+    'number': (
+        "(CASE WHEN (\"custom_values\" ->> '{key}') ~ '" + NUMBER_PATTERN + "' "
+        "THEN ((\"custom_values\" ->> '{key}'))::numeric END)"
+    ),
+    'date': (
+        "(CASE WHEN (\"custom_values\" ->> '{key}') ~ '" + DATE_PATTERN + "' "
+        "THEN custom_value_date((\"custom_values\" ->> '{key}')) END)"
+    ),
+}
+
+
+def create_indexes(apps, schema_editor):
+    """Index the number and date fields that already exist"""
+    ProjectField = apps.get_model('projects', 'ProjectField')
+    for field_id, field_type in ProjectField.objects.filter(
+        field_type__in=['number', 'date']
+    ).values_list('id', 'field_type'):
+        key = int(field_id)
+        # Not str.format(): the patterns hold braces
+        expression = EXPRESSIONS[field_type].replace('{key}', str(key))
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "deployment_cf_{key}_{field_type[:3]}" ON "deployments_deployment" '
+            f'(({expression})) WHERE "custom_values" ? \'{key}\''
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        ('deployments', '0004_deployment_custom_values'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_DATE_FUNCTION, 'DROP FUNCTION IF EXISTS custom_value_date(text)'),
+        migrations.RunPython(create_indexes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:32
+
+import deployments.models
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, transaction
+
+
+# deployments.search.trigram_index() when this migration was written
+TRIGRAM_INDEX_NAME = 'deployment_search_trgm'
+TRIGRAM_INDEX_SQL = (
+    f'CREATE INDEX "{TRIGRAM_INDEX_NAME}" ON "deployments_deployment" USING gin '
+    """((lower(COALESCE("current_sn", '') || ' ' || COALESCE("new_sn", '') || ' ' || """
+    """COALESCE("current_model", '') || ' ' || COALESCE("new_model", '') || ' ' || """
+    """COALESCE("assigned_to", ''))) gin_trgm_ops)"""
+)
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+    Fuzzy matching needs the pg_trgm extension. Install it if the server
+    has it and the user may; otherwise search works without fuzziness.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        try:
+            with transaction.atomic():
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception:
+            return
+    schema_editor.execute(TRIGRAM_INDEX_SQL)
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(TRIGRAM_INDEX_NAME)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0005_custom_field_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deployment',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector(deployments.models.Words('current_sn'), deployments.models.Words('new_sn'), config='simple', weight='A'), '||', django.contrib.postgres.search.SearchVector(deployments.models.Words('assigned_to'), config='simple', weight='B'), django.contrib.postgres.search.SearchConfig('simple')), '||', django.contrib.postgres.search.SearchVector(deployments.models.Words('current_model'), deployments.models.Words('new_model'), config='simple', weight='C'), django.contrib.postgres.search.SearchConfig('simple')), '||', deployments.models.CustomValuesVector('custom_values'), django.contrib.postgres.search.SearchConfig('simple')), name='deployment_search_gin'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:03
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0006_deployment_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('deployment', 'Deployment'), ('field', 'Project field')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_date', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='deployment',
+            index=models.Index(fields=['project', 'updated_date', 'id'], name='deployment_project_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['project_id', 'deleted_date'], name='tombstone_project_date_idx'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.comparison
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_project_last_deployment_number'),
+        ('deployments', '0007_deployment_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deployment',
+            name='status_changed_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DeploymentStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('seconds_in_previous', models.PositiveIntegerField(null=True)),
+                ('deployment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='deployments.deployment')),
+                ('from_status', models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='deployments.deploymentstatus')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.project')),
+                ('technician', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='deployments.technician')),
+                ('to_status', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='deployments.deploymentstatus')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['deployment', 'changed_at'], name='status_event_deployment_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DeploymentStatusDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('entered', models.PositiveIntegerField(default=0)),
+                ('exited', models.PositiveIntegerField(default=0)),
+                ('removed', models.PositiveIntegerField(default=0)),
+                ('seconds_in_status', models.BigIntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.project')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='deployments.deploymentstatus')),
+                ('technician', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='deployments.technician')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'day'], name='status_daily_project_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='deploymentstatusdaily',
+            constraint=models.UniqueConstraint(models.F('project'), models.F('day'), models.F('status'), django.db.models.functions.comparison.Coalesce('technician', 0), name='unique_status_daily'),
+        ),
+        # Existing deployments get one event, entering their current status
+        # when they were created; their earlier changes were never recorded
+        migrations.RunSQL(
+            """
+            INSERT INTO deployments_deploymentstatusevent
+                (deployment_id, project_id, from_status_id, to_status_id, technician_id, changed_at)
+            SELECT id, project_id, NULL, status_id, technician_id, created_date
+            FROM deployments_deployment
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            [(
+                """
+                INSERT INTO deployments_deploymentstatusdaily
+                    (project_id, day, status_id, technician_id, entered, exited, removed, seconds_in_status)
+                SELECT project_id, (created_date AT TIME ZONE %s)::date, status_id, technician_id,
+                       count(*), 0, 0, 0
+                FROM deployments_deployment
+                GROUP BY 1, 2, 3, 4
+                """,
+                [settings.TIME_ZONE],
+            )],
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0008_status_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
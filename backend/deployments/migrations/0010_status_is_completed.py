@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0009_importjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deploymentstatus',
+            name='is_completed',
+            field=models.BooleanField(default=False),
+        ),
+        # Completion used to be counted by this status name
+        migrations.RunSQL(
+            "UPDATE deployments_deploymentstatus SET is_completed = true WHERE name = 'Completed'",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+# Date fields used to be indexed (and compared) as text, which misorders
+# values that are not ISO dates. Databases that ran 0005 before it compared
+# dates get the function and the date indexes rebuilt on the typed
+# expression; on others this repeats what 0005 did.
+CREATE_DATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION custom_value_date(value text) RETURNS date AS $$
+BEGIN
+    RETURN value::date;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE
+"""
+
+# custom_filters.value_expression() for a date field
+DATE_PATTERN = r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$'
+DATE_EXPRESSION = (
+    "(CASE WHEN (\"custom_values\" ->> '{key}') ~ '" + DATE_PATTERN + "' "
+    "THEN custom_value_date((\"custom_values\" ->> '{key}')) END)"
+)
+
+
+def rebuild_date_indexes(apps, schema_editor):
+    ProjectField = apps.get_model('projects', 'ProjectField')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes "
+            "WHERE tablename = 'deployments_deployment' AND indexname LIKE 'deployment\\_cf\\_%\\_dat'"
+        )
+        for (name,) in cursor.fetchall():
+            schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+    for field_id in ProjectField.objects.filter(field_type='date', indexed=True).values_list('id', flat=True):
+        key = int(field_id)
+        # Not str.format(): the patterns hold braces
+        expression = DATE_EXPRESSION.replace('{key}', str(key))
+        schema_editor.execute(
+            f'CREATE INDEX "deployment_cf_{key}_dat" ON "deployments_deployment" '
+            f'(({expression})) WHERE "custom_values" ? \'{key}\''
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_projectfield_indexed'),
+        ('deployments', '0010_status_is_completed'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_DATE_FUNCTION, migrations.RunSQL.noop),
+        migrations.RunPython(rebuild_date_indexes, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,64 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorCombinable, SearchVectorField
+from django.db.models.functions import Coalesce
 from projects.models import Project, ProjectField
 
+class JSONBMerge(models.Func):
+    """`column || value`: add or replace keys inside the UPDATE itself"""
+    arg_joiner = ' || '
+    template = '(%(expressions)s)'
+    output_field = models.JSONField()
+
+    def __init__(self, column, values):
+        super().__init__(models.F(column), models.Value(values, output_field=models.JSONField()))
+
+
+class JSONBRemoveKey(models.Func):
+    """`column - key`: drop one key"""
+    arg_joiner = ' - '
+    template = '(%(expressions)s)'
+    output_field = models.JSONField()
+
+    def __init__(self, column, key):
+        super().__init__(models.F(column), models.Value(str(key)))
+
+
+class Words(models.Func):
+    """Runs of punctuation replaced by a space, so 'SN-001' indexes as 'sn' and '001'"""
+    template = "regexp_replace(%(expressions)s, '[^[:alnum:]]+', ' ', 'g')"
+    output_field = models.TextField()
+
+
+class CustomValuesVector(SearchVectorCombinable, models.Func):
+    """The words of every string in a JSONB column, as a tsvector"""
+    template = "setweight(jsonb_to_tsvector('simple'::regconfig, %(expressions)s, '[\"string\"]'::jsonb), 'D')"
+    output_field = SearchVectorField()
+    config = None
+
+
+def search_document():
+    """
+    What /deployments/search/ matches against: serial numbers rank above
+    the assignee, then models, then custom text values. Uses the 'simple'
+    configuration (no stemming or stop words) since these are codes and
+    names. The GIN index on Deployment is built on this exact expression.
+    """
+    return (
+        SearchVector(Words('current_sn'), Words('new_sn'), config='simple', weight='A')
+        + SearchVector(Words('assigned_to'), config='simple', weight='B')
+        + SearchVector(Words('current_model'), Words('new_model'), config='simple', weight='C')
+        + CustomValuesVector('custom_values')
+    )
+
+
 class DeploymentStatus(models.Model):
     name = models.CharField(max_length=50)
     order = models.IntegerField(default=0)
+    # Deployments in a completed status count towards their project's progress
+    is_completed = models.BooleanField(default=False)
     
     def __str__(self):
         return self.name
@@ -51,11 +106,75 @@ class Deployment(models.Model):
     created_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
     deployment_date = models.DateField(null=True, blank=True)
+    # When the deployment entered its current status; null until it first
+    # changes, i.e. the status it was created in
+    status_changed_date = models.DateTimeField(null=True, blank=True)
     
-    # Custom fields will be stored in DeploymentField
+    # Custom fields are stored in DeploymentField. custom_values holds a
+    # copy keyed by ProjectField id (as a string) so a deployment can be
+    # read, or filtered on a custom value, without joining that table.
+    # Every write path updates both.
+    custom_values = models.JSONField(default=dict, blank=True)
     
     def __str__(self):
         return f"{self.project.name} - {self.deployment_id}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored status, so save() can tell when it changes
+        instance._stored_status_id = instance.__dict__.get('status_id')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """Saves the deployment, recording its status history (history.py)"""
+        from .history import StatusChange, record_status_changes
+        
+        update_fields = kwargs.get('update_fields')
+        stored_status_id = getattr(self, '_stored_status_id', None)
+        adding = self._state.adding
+        status_changed = (
+            not adding and stored_status_id is not None and stored_status_id != self.status_id
+            and (update_fields is None or {'status', 'status_id'} & set(update_fields))
+        )
+        if status_changed:
+            since = self.status_changed_date or self.created_date
+            self.status_changed_date = timezone.now()
+            if update_fields is not None:
+                kwargs['update_fields'] = [*update_fields, 'status_changed_date']
+        
+        if not (adding or status_changed):
+            super().save(*args, **kwargs)
+            return
+        
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            record_status_changes([StatusChange(
+                deployment_id=self.id,
+                project_id=self.project_id,
+                from_status_id=stored_status_id if status_changed else None,
+                to_status_id=self.status_id,
+                technician_id=self.technician_id,
+                since=since if status_changed else None,
+                at=self.status_changed_date if status_changed else self.created_date,
+            )])
+        self._stored_status_id = self.status_id
+    
+    class Meta:
+        # Lists are always scoped to a project and usually filtered further
+        # by status, technician or department
+        indexes = [
+            models.Index(fields=['project', 'status'], name='deployment_project_status_idx'),
+            models.Index(fields=['project', 'technician'], name='deployment_project_tech_idx'),
+            models.Index(fields=['project', 'department'], name='deployment_project_dept_idx'),
+            GinIndex(fields=['custom_values'], name='deployment_custom_values_gin'),
+            GinIndex(search_document(), name='deployment_search_gin'),
+            # Delta sync (DeploymentViewSet.changes) reads in this order
+            models.Index(fields=['project', 'updated_date', 'id'], name='deployment_project_changes_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'deployment_id'], name='unique_project_deployment_id'),
+        ]
 
 class DeploymentField(models.Model):
     deployment = models.ForeignKey(Deployment, on_delete=models.CASCADE, related_name='fields')
@@ -63,4 +182,129 @@ class DeploymentField(models.Model):
     value = models.TextField(blank=True)
     
     def __str__(self):
-        return f"{self.deployment.deployment_id} - {self.field.name}"
\ No newline at end of file
+        return f"{self.deployment.deployment_id} - {self.field.name}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['deployment', 'field'], name='unique_deployment_field'),
+        ]
+
+class ImportJob(models.Model):
+    """A spreadsheet upload waiting for, or processed by, the import worker"""
+    KINDS = [
+        ('deployments', 'Deployment import'),
+        ('project', 'Project import'),
+    ]
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='import_jobs')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    file = models.FileField(upload_to='imports/')
+    options = models.JSONField(default=dict, blank=True)  # e.g. column_map, batch_size
+    status = models.CharField(max_length=20, choices=STATUSES, default='queued')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    # Progress
+    rows_processed = models.IntegerField(default=0)
+    rows_failed = models.IntegerField(default=0)
+    rows_per_second = models.FloatField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+    
+    # Tracking
+    created_date = models.DateTimeField(auto_now_add=True)
+    started_date = models.DateTimeField(null=True, blank=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+    # Moved on by the worker while the job runs; see jobs.fail_orphaned_jobs
+    heartbeat_date = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.project.name} - {self.get_kind_display()} #{self.id}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_date'], name='importjob_queue_idx'),
+        ]
+
+
+class Tombstone(models.Model):
+    """
+    Records a deleted deployment or project field, so clients syncing with
+    DeploymentViewSet.changes can drop it. project_id is a plain column
+    because tombstones are written while a project may be being deleted.
+    Old ones are removed by `manage.py prune_tombstones`.
+    """
+    KINDS = [
+        ('deployment', 'Deployment'),
+        ('field', 'Project field'),
+    ]
+    
+    project_id = models.BigIntegerField()
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.BigIntegerField()
+    deleted_date = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id} (project {self.project_id})"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['project_id', 'deleted_date'], name='tombstone_project_date_idx'),
+        ]
+
+
+class DeploymentStatusEvent(models.Model):
+    """
+    One status change of a deployment, including the status it was created
+    in (with no from_status). Rows are only ever added; see history.py.
+    """
+    deployment = models.ForeignKey(Deployment, on_delete=models.CASCADE, related_name='status_events')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='+')
+    from_status = models.ForeignKey(DeploymentStatus, on_delete=models.PROTECT, null=True, related_name='+')
+    to_status = models.ForeignKey(DeploymentStatus, on_delete=models.PROTECT, related_name='+')
+    # Who the deployment was assigned to at the time
+    technician = models.ForeignKey(Technician, on_delete=models.SET_NULL, null=True, related_name='+')
+    changed_at = models.DateTimeField(default=timezone.now)
+    # Time spent in from_status
+    seconds_in_previous = models.PositiveIntegerField(null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['deployment', 'changed_at'], name='status_event_deployment_idx'),
+        ]
+
+
+class DeploymentStatusDaily(models.Model):
+    """
+    Per project, day, status and technician: how many deployments entered
+    and left the status, how many were deleted while in it, and the time
+    spent in it by those that left. Kept up to date by history.py as status
+    events are written; the reports read only this table.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    status = models.ForeignKey(DeploymentStatus, on_delete=models.PROTECT, related_name='+')
+    # Not a constraint: the figures stay when a technician is deleted
+    technician = models.ForeignKey(
+        Technician, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+'
+    )
+    entered = models.PositiveIntegerField(default=0)
+    exited = models.PositiveIntegerField(default=0)
+    removed = models.PositiveIntegerField(default=0)
+    seconds_in_status = models.BigIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            # Matched by the ON CONFLICT clause in history.add_to_rollups
+            models.UniqueConstraint(
+                'project', 'day', 'status', Coalesce('technician', 0), name='unique_status_daily'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['project', 'day'], name='status_daily_project_day_idx'),
+        ]
@@ -0,0 +1,98 @@
+"""
+Cached copies of the small lookup tables (statuses, technicians, departments).
+
+Each table is kept in the shared Django cache under a versioned key and in
+a per-process copy. Saving or deleting a row bumps the version (see
+signals.py), which makes every process reload the table on its next use.
+Processes re-check the version at most every REFERENCE_CACHE_LOCAL_TTL
+seconds, so a warm lookup costs no database query and usually no cache
+round trip either.
+"""
+import copy
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Department, DeploymentStatus, Technician
+
+
+class ReferenceTable:
+
+    def __init__(self, name, model, ordering):
+        self.name = name
+        self.model = model
+        self.ordering = ordering
+        self.version_key = f'reference:{name}:version'
+        self._local = None  # (version, checked_at, rows, rows_by_id)
+
+    def version(self):
+        """Changes whenever a row is saved or deleted"""
+        version = cache.get(self.version_key)
+        if version is None:
+            # Start from a fresh value so a lost key can never bring back
+            # a version some process still holds
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def _load(self):
+        now = time.monotonic()
+        local = self._local
+        if local and now - local[1] < settings.REFERENCE_CACHE_LOCAL_TTL:
+            return local
+
+        version = self.version()
+        if local and local[0] == version:
+            self._local = (version, now, local[2], local[3])
+            return self._local
+
+        data_key = f'reference:{self.name}:{version}'
+        rows = cache.get(data_key)
+        if rows is None:
+            rows = list(self.model.objects.order_by(*self.ordering))
+            cache.set(data_key, rows, settings.REFERENCE_CACHE_TIMEOUT)
+
+        self._local = (version, now, rows, {row.pk: row for row in rows})
+        return self._local
+
+    def all(self):
+        """All rows in table order. Treat them as read-only."""
+        return self._load()[2]
+
+    def get(self, pk):
+        """A copy of the row with this primary key, or None"""
+        try:
+            row = self._load()[3].get(int(pk))
+        except (TypeError, ValueError):
+            return None
+        return copy.copy(row) if row is not None else None
+
+    def name_of(self, pk):
+        row = self._load()[3].get(pk) if pk is not None else None
+        return row.name if row is not None else None
+
+    def invalidate(self):
+        self._local = None
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, time.time_ns(), None)
+
+
+statuses = ReferenceTable('statuses', DeploymentStatus, ('order', 'id'))
+technicians = ReferenceTable('technicians', Technician, ('id',))
+departments = ReferenceTable('departments', Department, ('id',))
+
+TABLES = {table.model: table for table in [statuses, technicians, departments]}
+
+
+def completed_status_ids():
+    """IDs of the statuses that count as done"""
+    return [row.id for row in statuses.all() if row.is_completed]
+
+
+def default_status():
+    """The status new deployments start in (the first by order), or None"""
+    rows = statuses.all()
+    return copy.copy(rows[0]) if rows else None
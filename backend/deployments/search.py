@@ -0,0 +1,88 @@
+"""
+Search across every project by serial number, model, assignee or custom
+text value, for DeploymentViewSet.search.
+
+Matching is full text over search_document() (see models.py), which the
+deployment_search_gin index covers; every query word is a prefix, so
+"sn12" finds "SN123456". Where the pg_trgm extension is available the
+deployment_search_trgm index also allows fuzzy matches on serials, models
+and assignees ("SN12345" finds "SN12354"). Results are ranked with serial
+number hits first.
+
+Migration 0006 creates that index when it can install pg_trgm. On servers
+that get the extension later, create it by hand (CREATE EXTENSION pg_trgm,
+then the CREATE INDEX of trigram_index()); running processes start using
+it within TRIGRAM_CHECK_INTERVAL seconds.
+"""
+import re
+import time
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Func, Q, TextField
+
+from .models import search_document
+
+TRIGRAM_INDEX_NAME = 'deployment_search_trgm'
+
+
+class SearchText(Func):
+    """The searchable columns as one lower-cased string, for trigram matching"""
+    template = "lower(COALESCE(%(expressions)s, ''))"
+    arg_joiner = ", '') || ' ' || COALESCE("
+    output_field = TextField()
+
+    def __init__(self):
+        super().__init__(F('current_sn'), F('new_sn'), F('current_model'), F('new_model'), F('assigned_to'))
+
+
+def trigram_index():
+    return GinIndex(OpClass(SearchText(), name='gin_trgm_ops'), name=TRIGRAM_INDEX_NAME)
+
+
+_trigram_checked = None  # (available, checked_at)
+
+
+def trigram_available():
+    """
+    Whether the fuzzy-match index exists (it needs pg_trgm). Re-checked
+    every TRIGRAM_CHECK_INTERVAL seconds.
+    """
+    global _trigram_checked
+    now = time.monotonic()
+    if _trigram_checked is None or now - _trigram_checked[1] >= settings.TRIGRAM_CHECK_INTERVAL:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", [TRIGRAM_INDEX_NAME])
+            _trigram_checked = (cursor.fetchone() is not None, now)
+    return _trigram_checked[0]
+
+
+def search_query(text):
+    """A prefix match on every word of `text`, or None if it has no words"""
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config='simple')
+
+
+def search_deployments(queryset, text, rank=True):
+    """Deployments in `queryset` matching `text`, best matches first if `rank`"""
+    query = search_query(text)
+    if query is None:
+        return queryset.none()
+
+    queryset = queryset.alias(document=search_document())
+    condition = Q(document=query)
+    score = SearchRank(F('document'), query)
+
+    if trigram_available():
+        queryset = queryset.alias(search_text=SearchText())
+        condition |= Q(search_text__trigram_word_similar=text.lower())
+        score = score + TrigramWordSimilarity(text.lower(), 'search_text')
+
+    queryset = queryset.filter(condition)
+    if rank:
+        queryset = queryset.alias(rank=score).order_by('-rank', 'id')
+    return queryset
@@ -0,0 +1,53 @@
+"""
+Deployment IDs numbered per project: DEP-0001, DEP-0002, ...
+
+Project.last_deployment_number holds the last number handed out. A block
+of IDs for a whole import batch is reserved with one UPDATE ... RETURNING.
+The row lock it takes makes a concurrent import into the same project wait
+for the first transaction to finish, so blocks never overlap. Numbers
+reserved by a transaction that rolls back are handed out again. The unique
+(project, deployment_id) constraint backs this up.
+
+IDs of the same form chosen by hand (in the deployment form or an upsert
+sheet) move the sequence past them, so it never hands them out again.
+"""
+import re
+
+from django.db import connection
+
+from projects.models import Project
+
+DEPLOYMENT_ID_PATTERN = re.compile(r'DEP-([0-9]{1,15})')
+
+
+def format_deployment_id(number):
+    return f'DEP-{number:04d}'
+
+
+def reserve_deployment_ids(project_id, count):
+    """`count` new consecutive deployment IDs for the project"""
+    if count <= 0:
+        return []
+    table = connection.ops.quote_name(Project._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET last_deployment_number = last_deployment_number + %s "
+            f"WHERE id = %s RETURNING last_deployment_number",
+            [count, project_id]
+        )
+        last = cursor.fetchone()[0]
+    return [format_deployment_id(number) for number in range(last - count + 1, last + 1)]
+
+
+def claim_deployment_ids(project_id, deployment_ids):
+    """Move the sequence past any DEP-<number> among IDs chosen by hand"""
+    numbers = [
+        int(match.group(1))
+        for match in map(DEPLOYMENT_ID_PATTERN.fullmatch, deployment_ids)
+        if match
+    ]
+    if numbers:
+        highest = max(numbers)
+        Project.objects.filter(pk=project_id, last_deployment_number__lt=highest).update(
+            last_deployment_number=highest
+        )
@@ -1,5 +1,8 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Deployment, DeploymentField, DeploymentStatus, Technician, Department
+from . import reference
+from .models import Deployment, DeploymentField, DeploymentStatus, Technician, Department, ImportJob, JSONBMerge
+from .sequence import reserve_deployment_ids
 
 class TechnicianSerializer(serializers.ModelSerializer):
     class Meta:
@@ -14,7 +17,7 @@ class DepartmentSerializer(serializers.ModelSerializer):
 class DeploymentStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = DeploymentStatus
-        fields = ['id', 'name', 'order']
+        fields = ['id', 'name', 'order', 'is_completed']
 
 class DeploymentFieldSerializer(serializers.ModelSerializer):
     field_name = serializers.CharField(source='field.name', read_only=True)
@@ -26,9 +29,9 @@ class DeploymentFieldSerializer(serializers.ModelSerializer):
 
 class DeploymentSerializer(serializers.ModelSerializer):
     fields = DeploymentFieldSerializer(many=True, read_only=True)
-    status_name = serializers.CharField(source='status.name', read_only=True)
-    department_name = serializers.CharField(source='department.name', read_only=True, allow_null=True)
-    technician_name = serializers.CharField(source='technician.name', read_only=True, allow_null=True)
+    status_name = serializers.SerializerMethodField()
+    department_name = serializers.SerializerMethodField()
+    technician_name = serializers.SerializerMethodField()
     project_name = serializers.CharField(source='project.name', read_only=True)
     
     class Meta:
@@ -41,8 +44,28 @@ class DeploymentSerializer(serializers.ModelSerializer):
             'created_date', 'updated_date', 'deployment_date', 'fields'
         ]
         read_only_fields = ['created_date', 'updated_date']
+    
+    # Names of lookup rows come from the reference cache rather than joins
+    def get_status_name(self, obj):
+        return reference.statuses.name_of(obj.status_id)
+    
+    def get_department_name(self, obj):
+        return reference.departments.name_of(obj.department_id)
+    
+    def get_technician_name(self, obj):
+        return reference.technicians.name_of(obj.technician_id)
+
+class DeploymentCompactSerializer(DeploymentSerializer):
+    """
+    Custom values straight from Deployment.custom_values ({field id: value})
+    instead of the nested DeploymentField rows, so no join is needed
+    """
+    class Meta(DeploymentSerializer.Meta):
+        fields = [name for name in DeploymentSerializer.Meta.fields if name != 'fields'] + ['custom_values']
 
 class DeploymentCreateSerializer(serializers.ModelSerializer):
+    # The next ID in the project's sequence is used when none is given
+    deployment_id = serializers.CharField(max_length=20, required=False)
     custom_fields = serializers.DictField(required=False)
     
     class Meta:
@@ -54,19 +77,33 @@ class DeploymentCreateSerializer(serializers.ModelSerializer):
             'technician', 'technician_notes', 'deployment_date',
             'custom_fields'
         ]
+        # Not the validator DRF derives from the unique constraint, which
+        # would make deployment_id required
+        validators = []
+    
+    def validate(self, attrs):
+        deployment_id = attrs.get('deployment_id')
+        if deployment_id and Deployment.objects.filter(
+            project=attrs['project'], deployment_id=deployment_id
+        ).exists():
+            raise serializers.ValidationError("A deployment with this ID already exists in the project.")
+        return attrs
     
     def create(self, validated_data):
         custom_fields = validated_data.pop('custom_fields', {})
-        deployment = Deployment.objects.create(**validated_data)
+        values = {str(field_id): str(value) for field_id, value in custom_fields.items()}
+        project_id = validated_data['project'].id
         
-        # Create deployment fields
-        if custom_fields:
-            for field_id, value in custom_fields.items():
-                DeploymentField.objects.create(
-                    deployment=deployment,
-                    field_id=field_id,
-                    value=str(value)
-                )
+        with transaction.atomic():
+            if not validated_data.get('deployment_id'):
+                validated_data['deployment_id'] = reserve_deployment_ids(project_id, 1)[0]
+            deployment = Deployment.objects.create(custom_values=values, **validated_data)
+            
+            # Create deployment fields
+            DeploymentField.objects.bulk_create([
+                DeploymentField(deployment=deployment, field_id=field_id, value=value)
+                for field_id, value in values.items()
+            ])
         
         return deployment
 
@@ -84,22 +121,41 @@ class DeploymentUpdateSerializer(serializers.ModelSerializer):
     
     def update(self, instance, validated_data):
         custom_fields = validated_data.pop('custom_fields', {})
+        values = {str(field_id): str(value) for field_id, value in custom_fields.items()}
         
-        # Update the deployment instance
+        # Update the deployment instance. Only write the columns that
+        # changed, and merge custom_values in SQL, so concurrent updates to
+        # other fields of the same deployment are not overwritten
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        update_fields = [*validated_data, 'updated_date']
+        if values:
+            instance.custom_values = JSONBMerge('custom_values', values)
+            update_fields.append('custom_values')
+        instance.save(update_fields=update_fields)
         
-        # Update custom fields
-        if custom_fields:
-            for field_id, value in custom_fields.items():
-                deployment_field, created = DeploymentField.objects.get_or_create(
-                    deployment=instance,
-                    field_id=field_id,
-                    defaults={'value': str(value)}
-                )
-                if not created:
-                    deployment_field.value = str(value)
-                    deployment_field.save()
+        # Upsert custom fields in one statement; the unique (deployment, field)
+        # constraint makes this safe against concurrent updates
+        if values:
+            DeploymentField.objects.bulk_create(
+                [
+                    DeploymentField(deployment=instance, field_id=field_id, value=value)
+                    for field_id, value in values.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['deployment', 'field'],
+                update_fields=['value']
+            )
+            instance.refresh_from_db(fields=['custom_values'])
         
-        return instance
\ No newline at end of file
+        return instance
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'project', 'kind', 'status', 'rows_processed', 'rows_failed',
+            'rows_per_second', 'errors', 'message',
+            'created_date', 'started_date', 'finished_date'
+        ]
+        read_only_fields = fields
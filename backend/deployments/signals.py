@@ -0,0 +1,108 @@
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.db.models.sql import UpdateQuery
+from django.dispatch import receiver
+from django.utils import timezone
+
+from projects.models import Project, ProjectField
+from . import events, history
+from .models import Department, Deployment, DeploymentField, DeploymentStatus, JSONBMerge, JSONBRemoveKey, Technician, Tombstone
+from .reference import TABLES
+from .sequence import claim_deployment_ids
+
+
+def deleted_with_project(origin):
+    """Whether a delete() cascaded from deleting a project"""
+    return isinstance(origin, Project) or getattr(origin, 'model', None) is Project
+
+
+@receiver([post_save, post_delete], sender=DeploymentStatus)
+@receiver([post_save, post_delete], sender=Technician)
+@receiver([post_save, post_delete], sender=Department)
+def reference_data_changed(sender, **kwargs):
+    table = TABLES[sender]
+    # Drop the cached copy now for this process, and again once committed
+    # so no process can re-cache rows read before the commit
+    table.invalidate()
+    transaction.on_commit(table.invalidate)
+
+
+@receiver(post_delete, sender=ProjectField)
+def project_field_deleted(sender, instance, origin=None, **kwargs):
+    # Its DeploymentField rows go by cascade; drop the copies in custom_values.
+    # An index of the field stays until manage.py index_custom_fields runs
+    field_id = instance.id
+    if not deleted_with_project(origin):
+        Tombstone.objects.create(project_id=instance.project_id, kind='field', object_id=field_id)
+    Deployment.objects.filter(
+        project_id=instance.project_id, custom_values__has_key=str(field_id)
+    ).update(
+        custom_values=JSONBRemoveKey('custom_values', field_id)
+    )
+
+
+@receiver(post_save, sender=Deployment)
+def deployment_saved(sender, instance, created, **kwargs):
+    # IDs chosen by hand (the form, the admin) move the project's sequence
+    # past them; bulk imports claim theirs per batch
+    if created:
+        claim_deployment_ids(instance.project_id, [instance.deployment_id])
+
+    update_fields = kwargs.get('update_fields')
+    events.publish(
+        instance.project_id, [instance.id], 'created' if created else 'updated',
+        fields=events.event_fields(update_fields) if update_fields else None,
+        status=instance.status_id,
+        technician=instance.technician_id,
+        updated_date=instance.updated_date,
+    )
+
+
+@receiver(post_delete, sender=Deployment)
+def deployment_deleted(sender, instance, origin=None, **kwargs):
+    # Nobody follows the changes of a project that is gone
+    if not deleted_with_project(origin):
+        Tombstone.objects.create(project_id=instance.project_id, kind='deployment', object_id=instance.id)
+        history.record_removal(instance.project_id, instance.status_id, instance.technician_id)
+        events.publish(instance.project_id, [instance.id], 'deleted')
+
+
+def update_custom_values(deployment_id, custom_values, now):
+    """
+    Set a deployment's custom_values to an expression on it and move its
+    updated_date on. Returns its project_id, read by the same UPDATE so a
+    value saved or deleted costs no query for its deployment.
+    """
+    query = UpdateQuery(Deployment)
+    query.add_update_values({'updated_date': now, 'custom_values': custom_values})
+    query.add_q(Q(pk=deployment_id))
+    sql, params = query.get_compiler(connection=connection).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING project_id', params)
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+@receiver(post_save, sender=DeploymentField)
+def deployment_field_saved(sender, instance, **kwargs):
+    # A custom value changed on its own (the serializer and the importers
+    # bulk_create theirs) is a change to the deployment and its copy
+    now = timezone.now()
+    project_id = update_custom_values(
+        instance.deployment_id, JSONBMerge('custom_values', {str(instance.field_id): instance.value}), now
+    )
+    events.publish(project_id, [instance.deployment_id], fields=['custom_fields'], updated_date=now)
+
+
+@receiver(post_delete, sender=DeploymentField)
+def deployment_field_deleted(sender, instance, origin=None, **kwargs):
+    # Only values deleted on their own; when their deployment or field is
+    # deleted the copy goes with it (see project_field_deleted)
+    if not (isinstance(origin, DeploymentField) or getattr(origin, 'model', None) is DeploymentField):
+        return
+    now = timezone.now()
+    project_id = update_custom_values(
+        instance.deployment_id, JSONBRemoveKey('custom_values', instance.field_id), now
+    )
+    events.publish(project_id, [instance.deployment_id], fields=['custom_fields'], updated_date=now)
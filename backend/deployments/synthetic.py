@@ -0,0 +1,162 @@
+"""
+Synthetic projects, deployments and spreadsheets for load testing and the
+benchmarks (see the create_initial_data and run_benchmarks commands).
+
+Everything is derived from a seeded random.Random, so the same arguments
+always produce the same data.
+"""
+import csv
+import datetime
+import random
+
+from django.db import transaction
+from openpyxl import Workbook
+
+from projects.models import Project, ProjectField
+from .history import record_created
+from .models import Department, Deployment, DeploymentField, DeploymentStatus, Technician
+from .sequence import reserve_deployment_ids
+
+# Custom field types cycle through this list
+FIELD_TYPES = ['text', 'number', 'date', 'dropdown', 'checkbox']
+DROPDOWN_OPTIONS = ['HQ', 'North', 'South', 'East', 'West']
+MODELS = ['Latitude 5440', 'Latitude 7450', 'OptiPlex 7010', 'ThinkPad T14', 'EliteBook 840']
+FIRST_NAMES = ['Ann', 'Bob', 'Cara', 'Dev', 'Eli', 'Fay', 'Gus', 'Hana', 'Ivan', 'Jo']
+LAST_NAMES = ['Smith', 'Jones', 'Garcia', 'Chen', 'Patel', 'Kim', 'Nguyen', 'Brown']
+POSITIONS = ['Analyst', 'Engineer', 'Manager', 'Director', 'Technician', 'Clerk']
+
+# Spreadsheet headers for the common deployment columns, as recognised by
+# import_project_sheet
+SHEET_COLUMNS = {
+    'assigned_to': 'Assigned To',
+    'position': 'Position',
+    'location': 'Location',
+    'current_model': 'Current Model',
+    'current_sn': 'Current SN',
+    'new_model': 'New Model',
+    'new_sn': 'New SN',
+}
+
+
+def field_specs(count):
+    """(name, field_type, options) for `count` custom fields"""
+    specs = []
+    for i in range(count):
+        field_type = FIELD_TYPES[i % len(FIELD_TYPES)]
+        options = DROPDOWN_OPTIONS if field_type == 'dropdown' else None
+        specs.append((f'{field_type.title()} {i + 1}', field_type, options))
+    return specs
+
+
+def custom_value(rng, field_type, options):
+    if field_type == 'number':
+        return str(round(rng.uniform(0, 5000), 2))
+    if field_type == 'date':
+        return (datetime.date(2025, 1, 1) + datetime.timedelta(days=rng.randrange(730))).isoformat()
+    if field_type == 'dropdown':
+        return rng.choice(options)
+    if field_type == 'checkbox':
+        return rng.choice(['true', 'false'])
+    return f'Note {rng.randrange(100000)}'
+
+
+def deployment_values(rng, serial):
+    """Common column values for one synthetic deployment"""
+    return {
+        'assigned_to': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+        'position': rng.choice(POSITIONS),
+        'location': f'Building {rng.randrange(1, 20)}, Room {rng.randrange(100, 500)}',
+        'current_model': rng.choice(MODELS),
+        'current_sn': f'OLD{serial:08d}',
+        'new_model': rng.choice(MODELS),
+        'new_sn': f'SN{serial:08d}',
+    }
+
+
+def generate_project(name, user, deployments, fields, seed=0, batch_size=1000):
+    """
+    Create a project with `fields` custom fields and `deployments`
+    deployments spread over the existing statuses, technicians and
+    departments. Returns the project.
+    """
+    rng = random.Random(seed)
+    statuses = list(DeploymentStatus.objects.order_by('order'))
+    technicians = [None] + list(Technician.objects.all())
+    departments = [None] + list(Department.objects.all())
+
+    with transaction.atomic():
+        project = Project.objects.create(
+            name=name, description='Synthetic data', expected_count=deployments, created_by=user
+        )
+        project_fields = [
+            ProjectField.objects.create(
+                project=project, name=field_name, field_type=field_type, options=options, order=i
+            )
+            for i, (field_name, field_type, options) in enumerate(field_specs(fields))
+        ]
+
+        for start in range(0, deployments, batch_size):
+            batch = []
+            end = min(start + batch_size, deployments)
+            deployment_ids = reserve_deployment_ids(project.id, end - start)
+            for n, deployment_id in zip(range(start, end), deployment_ids):
+                values = {
+                    str(field.id): custom_value(rng, field.field_type, field.options)
+                    for field in project_fields
+                }
+                batch.append(Deployment(
+                    project=project,
+                    deployment_id=deployment_id,
+                    status=rng.choice(statuses),
+                    technician=rng.choice(technicians),
+                    department=rng.choice(departments),
+                    custom_values=values,
+                    **deployment_values(rng, project.id * 10_000_000 + n),
+                ))
+            Deployment.objects.bulk_create(batch)
+            DeploymentField.objects.bulk_create([
+                DeploymentField(deployment=deployment, field_id=int(field_id), value=value)
+                for deployment in batch
+                for field_id, value in deployment.custom_values.items()
+            ])
+            record_created(batch)
+
+    return project
+
+
+def fixture_rows(rows, fields, seed=0):
+    """Header and data rows for a spreadsheet of new deployments"""
+    rng = random.Random(seed)
+    specs = field_specs(fields)
+    header = list(SHEET_COLUMNS.values()) + [name for name, _, _ in specs]
+
+    def data():
+        for n in range(rows):
+            common = deployment_values(rng, n)
+            yield [common[column] for column in SHEET_COLUMNS] + [
+                custom_value(rng, field_type, options) for _, field_type, options in specs
+            ]
+
+    return header, data()
+
+
+def write_fixture(path, rows, fields, seed=0):
+    """
+    Write a .xlsx or .csv (chosen by the suffix of `path`) of `rows`
+    deployments. `path` may also be a binary file object, written as .xlsx.
+    """
+    header, data = fixture_rows(rows, fields, seed)
+    if str(path).endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(data)
+        return path
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Deployments')
+    sheet.append(header)
+    for row in data:
+        sheet.append(row)
+    workbook.save(path)
+    return path
@@ -1,3 +1,1248 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from openpyxl import load_workbook
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from backend.profiling import request_log
+from backend.spreadsheets import SpreadsheetReader
+from projects.models import Project, ProjectField
+from . import events, history, reference
+from .benchmarks import SCENARIOS, compare, run_benchmarks
+from .changes import encode_cursor
+from .custom_filters import filter_custom_fields, sync_custom_field_indexes
+from .jobs import Heartbeat, claim_next_job, process_import_job
+from .search import search_deployments, trigram_available
+from .sequence import claim_deployment_ids, reserve_deployment_ids
+from .synthetic import generate_project, write_fixture
+from .models import (
+    Deployment, DeploymentField, DeploymentStatus, DeploymentStatusDaily, DeploymentStatusEvent, Technician,
+    Department, ImportJob, Tombstone,
+)
+
+
+def reset_reference_cache():
+    """Test transactions roll back without signals, so start each test cold"""
+    cache.clear()
+    for table in reference.TABLES.values():
+        table.invalidate()
+
+
+def crash_import_worker(job_id):
+    """Stands in for worker.run_job: the process dies like one killed for memory"""
+    os._exit(1)
+
+
+def excel_upload(rows, name='deployments.xlsx'):
+    buffer = io.BytesIO()
+    pd.DataFrame(rows).to_excel(buffer, index=False)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class DeploymentTestMixin:
+    """Shared fixtures: one project with custom fields and a few deployments"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        cls.pending = DeploymentStatus.objects.create(name='Pending', order=1)
+        cls.completed = DeploymentStatus.objects.create(name='Completed', order=2, is_completed=True)
+        cls.technician = Technician.objects.create(username='tech', name='Tech One')
+        cls.department = Department.objects.create(name='IT', division='Technology')
+        cls.project = Project.objects.create(name='Refresh', created_by=cls.user)
+        cls.project_fields = [
+            ProjectField.objects.create(project=cls.project, name=f'Field {i}', field_type='text', order=i)
+            for i in range(3)
+        ]
+        cls.deployments = [cls.create_deployment(i) for i in range(5)]
+
+    @classmethod
+    def create_deployment(cls, i, project=None):
+        deployment = Deployment.objects.create(
+            project=project or cls.project,
+            deployment_id=f'DEP-{i:04d}',
+            status=cls.pending,
+            department=cls.department,
+            technician=cls.technician,
+            new_sn=f'SN{i:06d}',
+            custom_values={str(field.id): f'value {i}' for field in cls.project_fields},
+        )
+        for field in cls.project_fields:
+            DeploymentField.objects.create(deployment=deployment, field=field, value=f'value {i}')
+        return deployment
+
+    def setUp(self):
+        reset_reference_cache()
+        self.client.force_authenticate(self.user)
+
+
+class DeploymentQueryBudgetTests(DeploymentTestMixin, APITestCase):
+    """
+    Fail when an endpoint starts issuing queries per deployment or per
+    custom field again. Budgets assume a warm reference cache.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for table in reference.TABLES.values():
+            table.all()
+
+    def test_list_query_budget(self):
+        # ETag aggregate + deployments + prefetched custom fields
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/deployments/deployments/', {'project': self.project.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_list_query_budget_does_not_grow_with_rows(self):
+        for i in range(5, 25):
+            self.create_deployment(i)
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/deployments/deployments/', {'project': self.project.id})
+        self.assertEqual(len(response.data['results']), 25)
+        self.assertEqual(response.data['results'][0]['fields'][0]['field_name'], 'Field 0')
+
+    def test_retrieve_query_budget(self):
+        deployment = self.deployments[0]
+        # ETag lookup + deployment + prefetched custom fields
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/deployments/deployments/{deployment.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status_name'], 'Pending')
+        self.assertEqual(response.data['project_name'], 'Refresh')
+
+    def test_update_status_query_budget(self):
+        deployment = self.deployments[0]
+        # deployment, custom fields, UPDATE, status event, rollup
+        with self.assertNumQueries(5):
+            response = self.client.post(
+                f'/api/deployments/deployments/{deployment.id}/update_status/',
+                {'status': self.completed.id}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status_name'], 'Completed')
+
+    def test_assign_technician_query_budget(self):
+        deployment = self.deployments[0]
+        other = Technician.objects.create(username='tech2', name='Tech Two')
+        reference.technicians.all()
+        # deployment, custom fields, UPDATE
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                f'/api/deployments/deployments/{deployment.id}/assign_technician/',
+                {'technician': other.id}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['technician_name'], 'Tech Two')
+
+
+class ConditionalGetTests(DeploymentTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        for table in reference.TABLES.values():
+            table.all()
+
+    def test_list_not_modified(self):
+        url = '/api/deployments/deployments/'
+        params = {'project': self.project.id}
+        response = self.client.get(url, params)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        # Only the aggregate runs when nothing changed
+        with self.assertNumQueries(1):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Different filters are a different representation
+        response = self.client.get(url, {'status': self.pending.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_etag_changes(self):
+        url = '/api/deployments/deployments/'
+        etag = self.client.get(url)['ETag']
+
+        self.deployments[0].delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # Renaming a status changes status_name without touching deployments
+        self.pending.name = 'Waiting'
+        self.pending.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # So does renaming a custom field of the project
+        field = self.project_fields[0]
+        field.name = 'Asset tag'
+        field.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        names = {f['field_name'] for f in response.data['results'][0]['fields']}
+        self.assertIn('Asset tag', names)
+
+    def test_detail_not_modified(self):
+        deployment = self.deployments[0]
+        url = f'/api/deployments/deployments/{deployment.id}/'
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        self.client.patch(url, {'location': 'Room 12'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['location'], 'Room 12')
+
+    def test_missing_detail_is_still_404(self):
+        response = self.client.get('/api/deployments/deployments/999999/')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/deployments/deployments/abc/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_project_detail_not_modified(self):
+        url = f'/api/projects/{self.project.id}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        ProjectField.objects.create(project=self.project, name='Extra', field_type='text', order=9)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['fields']), 4)
+
+
+class BulkUpdateTests(DeploymentTestMixin, APITestCase):
+
+    def test_bulk_update_status_by_ids(self):
+        ids = [d.id for d in self.deployments[:3]]
+        before = Deployment.objects.get(pk=ids[0]).updated_date
+        reference.statuses.all()
+        # savepoint, lock, UPDATE, status events, rollups, release --
+        # whatever the number of rows
+        with self.assertNumQueries(6), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/deployments/deployments/bulk_update_status/', {
+                'ids': ids + [999999], 'status': self.completed.id
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(
+            [(r['id'], r['updated']) for r in response.data['results']],
+            [(i, True) for i in ids] + [(999999, False)]
+        )
+        self.assertEqual(Deployment.objects.filter(status=self.completed).count(), 3)
+        self.assertGreater(Deployment.objects.get(pk=ids[0]).updated_date, before)
+
+    def test_bulk_assign_technician_by_filter(self):
+        other = Project.objects.create(name='Other', created_by=self.user)
+        self.create_deployment(99, project=other)
+        response = self.client.post('/api/deployments/deployments/bulk_assign_technician/', {
+            'filter': {'project': self.project.id}, 'technician': None
+        }, format='json')
+        self.assertEqual(response.data['updated'], 5)
+        self.assertFalse(Deployment.objects.filter(project=self.project, technician__isnull=False).exists())
+        self.assertTrue(Deployment.objects.filter(project=other, technician=self.technician).exists())
+
+    def test_bulk_update_filter_needs_a_project(self):
+        for filters in ({'project': ''}, {'foo': 1}, {'status': self.pending.id}):
+            response = self.client.post('/api/deployments/deployments/bulk_update_status/', {
+                'filter': filters, 'status': self.completed.id
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Deployment.objects.filter(status=self.completed).exists())
+
+        other = Project.objects.create(name='Other', created_by=self.user)
+        outside = self.create_deployment(99, project=other)
+        response = self.client.post('/api/deployments/deployments/bulk_update_status/', {
+            'ids': [self.deployments[0].id, outside.id, 999999],
+            'filter': {'project': self.project.id}, 'status': self.completed.id
+        }, format='json')
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(
+            [r.get('error') for r in response.data['results']],
+            [None, 'Deployment not matched by filter', 'Deployment not found']
+        )
+
+    def test_bulk_update_requires_a_selection(self):
+        response = self.client.post('/api/deployments/deployments/bulk_update_status/', {
+            'status': self.completed.id
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/deployments/deployments/bulk_update_status/', {
+            'ids': [self.deployments[0].id], 'status': 999999
+        }, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportTests(DeploymentTestMixin, APITestCase):
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_writes_every_deployment_with_custom_values(self):
+        response = self.client.get('/api/deployments/deployments/export_excel/', {'project': self.project.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        header, *rows = workbook.active.iter_rows(values_only=True)
+
+        self.assertEqual(header[:2], ('ID', 'Status'))
+        self.assertEqual(header[-3:], ('Field 0', 'Field 1', 'Field 2'))
+        self.assertEqual([row[0] for row in rows], [d.deployment_id for d in self.deployments])
+        self.assertEqual(rows[0][1], 'Pending')
+        self.assertEqual(rows[0][header.index('New SN')], 'SN000000')
+        self.assertEqual(rows[0][header.index('Technician')], 'Tech One')
+        self.assertEqual(rows[3][-3:], ('value 3',) * 3)
+
+
+class CustomValuesTests(DeploymentTestMixin, APITestCase):
+
+    def test_create_and_update_keep_custom_values_in_sync(self):
+        field_a, field_b = self.project_fields[:2]
+        response = self.client.post('/api/deployments/deployments/', {
+            'project': self.project.id, 'deployment_id': 'NEW-1', 'status': self.pending.id,
+            'custom_fields': {str(field_a.id): 'a'}
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        deployment = Deployment.objects.get(deployment_id='NEW-1')
+        self.assertEqual(deployment.custom_values, {str(field_a.id): 'a'})
+
+        self.client.patch(f'/api/deployments/deployments/{deployment.id}/', {
+            'custom_fields': {str(field_b.id): 'b'}
+        }, format='json')
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.custom_values, {str(field_a.id): 'a', str(field_b.id): 'b'})
+        self.assertEqual(
+            dict(deployment.fields.values_list('field_id', 'value')), {field_a.id: 'a', field_b.id: 'b'}
+        )
+
+    def test_import_fills_custom_values(self):
+        field = self.project_fields[0]
+        response = self.client.post('/api/deployments/deployments/import_excel/', {
+            'project': self.project.id, 'background': 'false',
+            'column_map': f'{{"{field.id}": "Tag"}}',
+            'file': excel_upload({'assigned_to': ['Ann'], 'Tag': ['T-1']}),
+        }, format='multipart')
+        self.assertEqual(response.data['total'], 1)
+        deployment = Deployment.objects.get(project=self.project, assigned_to='Ann')
+        self.assertEqual(deployment.custom_values, {str(field.id): 'T-1'})
+
+    def test_compact_retrieve_reads_one_row(self):
+        deployment = self.deployments[0]
+        reference.statuses.all()
+        reference.departments.all()
+        reference.technicians.all()
+        # ETag lookup + deployment
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/deployments/deployments/{deployment.id}/', {'compact': 'true'})
+        self.assertNotIn('fields', response.data)
+        self.assertEqual(response.data['custom_values'][str(self.project_fields[1].id)], 'value 0')
+
+    def test_values_written_directly_reach_custom_values(self):
+        # e.g. from the admin
+        deployment = self.deployments[0]
+        field_value = DeploymentField.objects.get(deployment=deployment, field=self.project_fields[0])
+        field_value.value = 'edited'
+        # The value and the deployment's copy, without loading the deployment
+        with self.assertNumQueries(2):
+            field_value.save()
+        deployment.fields.get(field=self.project_fields[1]).delete()
+        DeploymentField.objects.filter(deployment=deployment, field=self.project_fields[2]).delete()
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.custom_values, {str(self.project_fields[0].id): 'edited'})
+
+        # Deleting the deployment takes its values along
+        deployment.delete()
+        self.assertFalse(DeploymentField.objects.filter(deployment_id=self.deployments[0].id).exists())
+
+    def test_removing_a_project_field_drops_its_values(self):
+        field = self.project_fields[0]
+        self.client.delete(f'/api/projects/{self.project.id}/remove-field/{field.id}/')
+        for deployment in Deployment.objects.filter(project=self.project):
+            self.assertNotIn(str(field.id), deployment.custom_values)
+            self.assertEqual(len(deployment.custom_values), 2)
+
+
+class CustomFieldFilterTests(DeploymentTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cost = ProjectField.objects.create(project=cls.project, name='Cost', field_type='number')
+        cls.warranty = ProjectField.objects.create(project=cls.project, name='Warranty', field_type='date')
+        cls.loaner = ProjectField.objects.create(project=cls.project, name='Loaner', field_type='checkbox')
+        # Values imported before dates were normalized, and an impossible date
+        values = [('9', '2025-06-30', 'true'), ('10', '2026-01-01', 'false'), ('100.5', '2027-01-01', 'true'),
+                  ('n/a', '03/04/2024', None), (None, '2024-02-30', None)]
+        for deployment, (cost, warranty, loaner) in zip(cls.deployments, values):
+            for field, value in [(cls.cost, cost), (cls.warranty, warranty), (cls.loaner, loaner)]:
+                if value is not None:
+                    deployment.custom_values[str(field.id)] = value
+            deployment.save()
+
+    def list_ids(self, **params):
+        response = self.client.get('/api/deployments/deployments/', {'project': self.project.id, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['id'] for row in response.data['results']]
+
+    def test_typed_comparisons(self):
+        d = [deployment.id for deployment in self.deployments]
+        # Numeric, not text, order: 9 < 10 < 100.5
+        self.assertEqual(self.list_ids(**{f'cf.{self.cost.id}__lt': '10'}), [d[0]])
+        self.assertEqual(self.list_ids(**{f'cf.{self.cost.id}__gte': '10'}), [d[1], d[2]])
+        self.assertEqual(self.list_ids(**{f'cf.{self.cost.id}': '10.0'}), [d[1]])
+        self.assertEqual(self.list_ids(**{f'cf.{self.warranty.id}__lt': '2026-01-01'}), [d[0]])
+        self.assertEqual(self.list_ids(**{f'cf.{self.loaner.id}': 'true'}), [d[0], d[2]])
+        self.assertEqual(self.list_ids(**{f'cf.{self.cost.id}__isnull': 'true'}), [d[4]])
+        self.assertEqual(self.list_ids(**{f'cf.{self.cost.id}__in': '9,100.5'}), [d[0], d[2]])
+        self.assertEqual(self.list_ids(**{f'cf.{self.project_fields[0].id}': 'value 3'}), [d[3]])
+
+    def test_ordering(self):
+        d = [deployment.id for deployment in self.deployments]
+        self.assertEqual(self.list_ids(ordering=f'-cf.{self.cost.id}'), [d[2], d[1], d[0], d[4], d[3]])
+        # Dates that are not ISO dates sort last instead of as text
+        self.assertEqual(self.list_ids(ordering=f'cf.{self.warranty.id}'), [d[0], d[1], d[2], d[3], d[4]])
+        response = self.client.get('/api/deployments/deployments/', {
+            'project': self.project.id, 'ordering': f'cf.{self.cost.id}', 'page_size': 2
+        })
+        self.assertEqual([row['id'] for row in response.data['results']], [d[0], d[1]])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_invalid_values_are_rejected(self):
+        response = self.client.get('/api/deployments/deployments/', {f'cf.{self.cost.id}__lt': 'ten'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/deployments/deployments/', {f'cf.{self.loaner.id}__lt': 'true'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/deployments/deployments/', {'cf.999999': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DeploymentSearchTests(DeploymentTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other = Project.objects.create(name='Other', created_by=cls.user)
+        Deployment.objects.filter(pk=cls.deployments[1].pk).update(
+            assigned_to='Ann Example', new_model='Latitude 5440', current_sn='OLD-000001'
+        )
+        cls.other = Deployment.objects.create(
+            project=other, deployment_id='DEP-0001', status=cls.pending, assigned_to='SN000001 owner'
+        )
+
+    def search(self, q, **params):
+        response = self.client.get('/api/deployments/deployments/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['id'] for row in response.data['results']]
+
+    def test_prefix_match_across_projects_ranks_serials_first(self):
+        # deployments[1] has the serial, the other project's deployment only
+        # mentions it in the assignee
+        self.assertEqual(self.search('sn00000'), [d.id for d in self.deployments] + [self.other.id])
+        self.assertEqual(self.search('SN000001')[:2], [self.deployments[1].id, self.other.id])
+        self.assertEqual(self.search('sn000001', project=self.project.id), [self.deployments[1].id])
+
+    def test_models_assignees_and_custom_values(self):
+        self.assertEqual(self.search('ann exa'), [self.deployments[1].id])
+        self.assertEqual(self.search('latitude'), [self.deployments[1].id])
+        self.assertEqual(self.search('old-000001'), [self.deployments[1].id])
+        self.assertEqual(self.search('value 3'), [self.deployments[3].id])
+
+    def test_search_requires_text(self):
+        response = self.client.get('/api/deployments/deployments/search/', {'q': ' '})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_search_uses_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = search_deployments(Deployment.objects.all(), 'sn0001').explain()
+        self.assertIn('deployment_search_gin', plan)
+
+    def test_fuzzy_match(self):
+        if not trigram_available():
+            self.skipTest("pg_trgm is not installed")
+        self.assertIn(self.deployments[1].id, self.search('SN000010'))
+
+
+class SyntheticDataTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', is_staff=True)
+        DeploymentStatus.objects.create(name='Pending', order=1)
+
+    def test_generate_project(self):
+        project = generate_project('Synthetic', self.user, deployments=25, fields=6, batch_size=10)
+        self.assertEqual(project.fields.count(), 6)
+        self.assertEqual(project.deployments.count(), 25)
+        deployment = project.deployments.order_by('id').last()
+        self.assertEqual(deployment.deployment_id, 'DEP-0025')
+        self.assertEqual(
+            dict(deployment.fields.values_list('field_id', 'value')),
+            {int(field_id): value for field_id, value in deployment.custom_values.items()}
+        )
+
+    def test_fixture_matches_project_sheet_headers(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = write_fixture(f'{directory}/fixture.csv', 4, 3)
+        with open(path, 'rb') as f:
+            reader = SpreadsheetReader(f, name='fixture.csv')
+            self.assertEqual(reader.columns[:2], ['Assigned To', 'Position'])
+            self.assertEqual(reader.columns[-3:], ['Text 1', 'Number 2', 'Date 3'])
+            self.assertEqual(len(list(reader.rows())), 4)
+
+    def test_benchmarks_run(self):
+        results = run_benchmarks([3], fields=2, repeat=1)
+        self.assertEqual(set(results), set(SCENARIOS))
+        self.assertGreater(results['deployment_list']['3']['queries'], 0)
+
+        slower = {'deployment_list': {'3': dict(results['deployment_list']['3'], queries=99)}}
+        lines, regressed = compare(results, slower, threshold=0.2)
+        self.assertTrue(regressed)
+        self.assertIn('REGRESSION', lines[0])
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilingTests(DeploymentTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        request_log.clear()
+
+    def test_server_timing_and_per_view_stats(self):
+        response = self.client.get('/api/deployments/deployments/', {'project': self.project.id})
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[0-9.]+;desc="\d+ queries"')
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+        self.client.get('/api/deployments/deployments/export_excel/', {'project': self.project.id})
+
+        response = self.client.get('/api/profiling/')
+        views = {entry['view']: entry for entry in response.data['views']}
+        self.assertEqual(views['DeploymentViewSet.list']['count'], 1)
+        self.assertGreater(views['DeploymentViewSet.list']['queries_mean'], 0)
+        self.assertGreater(views['DeploymentViewSet.list']['serialize_ms_mean'], 0)
+        self.assertIn('DeploymentViewSet.export_excel', views)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_profiles(self):
+        self.client.get(f'/api/deployments/deployments/{self.deployments[0].id}/')
+        response = self.client.get('/api/profiling/')
+        profile = response.data['profiles'][0]
+        self.assertEqual(profile['view'], 'DeploymentViewSet.retrieve')
+        self.assertIn('cumulative', profile['report'])
+
+    def test_staff_only(self):
+        self.client.force_authenticate(User.objects.create_user(username='tech'))
+        self.assertEqual(self.client.get('/api/profiling/').status_code, 403)
+
+
+class ReferenceCacheTests(DeploymentTestMixin, APITestCase):
+
+    def test_lookup_lists_are_served_from_cache(self):
+        self.client.get('/api/deployments/statuses/')
+        self.client.get('/api/deployments/technicians/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/deployments/statuses/')
+            self.client.get('/api/deployments/technicians/')
+        self.assertEqual([s['name'] for s in response.data], ['Pending', 'Completed'])
+
+    def test_changes_invalidate_the_cache(self):
+        self.assertEqual(reference.default_status().name, 'Pending')
+        DeploymentStatus.objects.create(name='New', order=0)
+        self.assertEqual(reference.default_status().name, 'New')
+
+        self.technician.name = 'Renamed'
+        self.technician.save()
+        response = self.client.get(f'/api/deployments/technicians/{self.technician.id}/')
+        self.assertEqual(response.data['name'], 'Renamed')
+
+
+class DeploymentPaginationTests(DeploymentTestMixin, APITestCase):
+
+    def test_cursor_pages_cover_every_deployment_once(self):
+        url = '/api/deployments/deployments/'
+        params = {'project': self.project.id, 'page_size': 2}
+        seen = []
+        while url:
+            response = self.client.get(url, params)
+            seen.extend(row['id'] for row in response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual(seen, sorted(d.id for d in self.deployments))
+
+    def test_lookup_tables_are_unpaginated_by_default(self):
+        response = self.client.get('/api/deployments/technicians/')
+        self.assertEqual(response.data[0]['name'], 'Tech One')
+
+        response = self.client.get('/api/deployments/technicians/', {'page_size': 1})
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_technician_stats(self):
+        Deployment.objects.filter(pk=self.deployments[0].pk).update(status=self.completed)
+        response = self.client.get(f'/api/deployments/technicians/{self.technician.id}/stats/')
+        self.assertEqual(response.data['total'], 5)
+        self.assertEqual(
+            [(entry['name'], entry['count']) for entry in response.data['by_status']],
+            [('Pending', 4), ('Completed', 1)]
+        )
+
+
+class DeploymentIndexTests(TestCase):
+    """Check that the planner picks the composite indexes on a seeded dataset"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='admin')
+        statuses = [DeploymentStatus.objects.create(name=f'Status {i}', order=i) for i in range(4)]
+        technicians = [Technician.objects.create(username=f't{i}', name=f'Tech {i}') for i in range(10)]
+        departments = [Department.objects.create(name=f'Dept {i}') for i in range(10)]
+        projects = [Project.objects.create(name=f'Project {i}', created_by=user) for i in range(20)]
+        cls.field = ProjectField.objects.create(project=projects[0], name='Building', field_type='text')
+        cls.cost = ProjectField.objects.create(project=projects[0], name='Cost', field_type='number')
+        cls.warranty = ProjectField.objects.create(project=projects[0], name='Warranty', field_type='date')
+
+        deployments = Deployment.objects.bulk_create([
+            Deployment(
+                project=projects[i % 20],
+                deployment_id=f'DEP-{i:05d}',
+                status=statuses[i % 4],
+                technician=technicians[i % 10],
+                department=departments[i % 10],
+                custom_values={
+                    str(cls.field.id): f'B{i % 100}', str(cls.cost.id): str(i),
+                    str(cls.warranty.id): f'2026-01-{i % 28 + 1:02d}',
+                } if i % 20 == 0 else {},
+            )
+            for i in range(10000)
+        ])
+        DeploymentField.objects.bulk_create([
+            DeploymentField(deployment=deployment, field=cls.field, value='HQ')
+            for deployment in deployments
+        ])
+        with connection.cursor() as cursor:
+            # CREATE INDEX refuses to run with deferred FK checks pending
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        ProjectField.objects.filter(pk__in=[cls.cost.pk, cls.warranty.pk]).update(indexed=True)
+        sync_custom_field_indexes()
+        cls.project, cls.status = projects[3], statuses[1]
+        cls.technician, cls.department = technicians[3], departments[3]
+        cls.deployment = deployments[3]
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE deployments_deployment')
+            cursor.execute('ANALYZE deployments_deploymentfield')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_project_status_filter(self):
+        self.assertUsesIndex(
+            Deployment.objects.filter(project=self.project, status=self.status),
+            'deployment_project_status_idx'
+        )
+
+    def test_project_technician_filter(self):
+        self.assertUsesIndex(
+            Deployment.objects.filter(project=self.project, technician=self.technician),
+            'deployment_project_tech_idx'
+        )
+
+    def test_project_department_filter(self):
+        self.assertUsesIndex(
+            Deployment.objects.filter(project=self.project, department=self.department),
+            'deployment_project_dept_idx'
+        )
+
+    def test_deployment_id_lookup(self):
+        self.assertUsesIndex(
+            Deployment.objects.filter(project=self.project, deployment_id='DEP-00003'),
+            'unique_project_deployment_id'
+        )
+
+    def test_custom_value_lookup(self):
+        self.assertUsesIndex(
+            DeploymentField.objects.filter(deployment=self.deployment, field=self.field),
+            'unique_deployment_field'
+        )
+
+    def test_custom_value_equality(self):
+        # Containment has a fixed 1% selectivity estimate, which favours a
+        # sequential scan on a table this small; check the index can serve it
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertUsesIndex(
+            filter_custom_fields(Deployment.objects.all(), {f'cf.{self.field.id}': 'B40'}),
+            'deployment_custom_values_gin'
+        )
+
+    def test_custom_value_range(self):
+        self.assertUsesIndex(
+            filter_custom_fields(Deployment.objects.all(), {f'cf.{self.cost.id}__lt': '100'}),
+            f'deployment_cf_{self.cost.id}_num'
+        )
+
+    def test_custom_date_range(self):
+        self.assertUsesIndex(
+            filter_custom_fields(Deployment.objects.all(), {f'cf.{self.warranty.id}__gte': '2026-01-20'}),
+            f'deployment_cf_{self.warranty.id}_dat'
+        )
+
+
+class CustomFieldIndexCommandTests(DeploymentTestMixin, APITestCase):
+
+    def custom_field_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexname FROM pg_indexes WHERE indexname LIKE 'deployment\\_cf\\_%' ORDER BY 1"
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_indexes_follow_the_indexed_flag(self):
+        number = ProjectField.objects.create(project=self.project, name='Cost', field_type='number')
+        date = ProjectField.objects.create(project=self.project, name='Warranty', field_type='date', indexed=True)
+        with connection.cursor() as cursor:
+            # CREATE INDEX refuses to run with deferred FK checks pending
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        # Saving fields builds nothing by itself
+        self.assertEqual(self.custom_field_indexes(), [])
+
+        call_command('index_custom_fields', stdout=io.StringIO())
+        self.assertEqual(self.custom_field_indexes(), [f'deployment_cf_{date.id}_dat'])
+
+        number.indexed = True
+        number.save()
+        date.delete()
+        call_command('index_custom_fields', stdout=io.StringIO())
+        self.assertEqual(self.custom_field_indexes(), [f'deployment_cf_{number.id}_num'])
+
+
+class UpsertImportTests(DeploymentTestMixin, APITestCase):
+
+    def import_sheet(self, rows, **data):
+        data.setdefault('column_map', '{"%d": "Field 0"}' % self.project_fields[0].id)
+        data.update({'project': self.project.id, 'file': excel_upload(rows), 'background': 'false'})
+        return self.client.post('/api/deployments/deployments/import_excel/', data, format='multipart')
+
+    def test_upsert_on_serial_number(self):
+        rows = [
+            {'serial': 'SN000001', 'model': 'ThinkPad', 'Field 0': 'HQ'},
+            {'serial': 'SN000002', 'model': None, 'Field 0': 'value 2'},
+            {'serial': 'SN999999', 'model': 'ThinkPad', 'Field 0': 'Annex'},
+        ]
+        response = self.import_sheet(rows, mode='upsert', key='new_sn')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            [response.data[key] for key in ('inserted', 'updated', 'unchanged')], [1, 1, 1]
+        )
+
+        updated = Deployment.objects.get(pk=self.deployments[1].pk)
+        self.assertEqual(updated.new_model, 'ThinkPad')
+        self.assertEqual(updated.status, self.pending)
+        field_0, field_1 = str(self.project_fields[0].id), str(self.project_fields[1].id)
+        self.assertEqual(updated.custom_values[field_0], 'HQ')
+        self.assertEqual(updated.custom_values[field_1], 'value 1')
+        self.assertEqual(updated.fields.get(field=self.project_fields[0]).value, 'HQ')
+        self.assertEqual(updated.fields.count(), 3)
+        self.assertEqual(Deployment.objects.get(new_sn='SN999999').custom_values, {field_0: 'Annex'})
+
+        # Importing the same sheet again changes nothing
+        response = self.import_sheet(rows, mode='upsert', key='new_sn')
+        self.assertEqual(
+            [response.data[key] for key in ('inserted', 'updated', 'unchanged')], [0, 0, 3]
+        )
+        self.assertEqual(Deployment.objects.filter(project=self.project).count(), 6)
+
+    def test_upsert_on_deployment_id(self):
+        project = self.project
+        response = self.client.post(f'/api/projects/{project.id}/import_excel/', {
+            'file': excel_upload([
+                {'Deployment ID': 'DEP-0001', 'Assigned To': 'Ann'},
+                {'Deployment ID': 'DEP-0100', 'Assigned To': 'Bob'},
+                {'Deployment ID': None, 'Assigned To': 'Cy'},
+                {'Deployment ID': 'DEP-0001', 'Assigned To': 'Di'},
+            ]),
+            'background': 'false', 'mode': 'upsert',
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['inserted'], 2)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['errors'], ["Error in row 4: 'DEP-0001' appears more than once in the sheet"])
+        self.assertEqual(Deployment.objects.get(deployment_id='DEP-0001').assigned_to, 'Ann')
+        self.assertEqual(Deployment.objects.get(deployment_id='DEP-0100').assigned_to, 'Bob')
+        self.assertTrue(Deployment.objects.filter(project=project, assigned_to='Cy').exists())
+
+    def test_upsert_on_custom_field(self):
+        field = self.project_fields[0]
+        response = self.import_sheet(
+            [{'Field 0': 'value 3', 'model': 'EliteBook'}], mode='upsert', key=f'cf.{field.id}'
+        )
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(Deployment.objects.get(pk=self.deployments[3].pk).new_model, 'EliteBook')
+
+    def test_bad_upsert_key(self):
+        response = self.import_sheet([{'serial': 'A1'}], mode='upsert', key='assigned_to')
+        self.assertEqual(response.status_code, 400)
+        response = self.import_sheet([{'model': 'X'}], mode='upsert', key='new_sn')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('no column', response.data['error'])
+
+
+class DeploymentSequenceTests(DeploymentTestMixin, APITestCase):
+
+    def last_number(self):
+        return Project.objects.values_list('last_deployment_number', flat=True).get(pk=self.project.pk)
+
+    def test_blocks_are_contiguous_and_follow_existing_ids(self):
+        # The fixtures' DEP-0000 ... DEP-0004 were claimed as they were saved
+        self.assertEqual(self.last_number(), 4)
+        with self.assertNumQueries(1):
+            block = reserve_deployment_ids(self.project.id, 3)
+        self.assertEqual(block, ['DEP-0005', 'DEP-0006', 'DEP-0007'])
+        self.assertEqual(reserve_deployment_ids(self.project.id, 1), ['DEP-0008'])
+
+    def test_rolled_back_blocks_are_reused(self):
+        try:
+            with transaction.atomic():
+                reserve_deployment_ids(self.project.id, 100)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(reserve_deployment_ids(self.project.id, 1), ['DEP-0005'])
+
+    def test_hand_chosen_ids_move_the_sequence(self):
+        self.create_deployment(50)
+        claim_deployment_ids(self.project.id, ['DEP-0020', 'SPARE-99'])
+        self.assertEqual(self.last_number(), 50)
+        # A stale copy of the project does not write the counter back
+        self.project.save()
+        self.assertEqual(reserve_deployment_ids(self.project.id, 1), ['DEP-0051'])
+
+    def test_imports_never_reuse_ids(self):
+        rows = [{'Assigned To': f'User {i}'} for i in range(3)]
+        for _ in range(2):
+            response = self.client.post(f'/api/projects/{self.project.id}/import_excel/', {
+                'file': excel_upload(rows), 'background': 'false',
+            }, format='multipart')
+            self.assertEqual(response.status_code, 200, response.data)
+        response = self.client.post('/api/deployments/deployments/import_excel/', {
+            'project': self.project.id, 'column_map': '{}', 'background': 'false',
+            'file': excel_upload([{'assigned_to': row['Assigned To']} for row in rows]),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        imported = Deployment.objects.filter(project=self.project, assigned_to__startswith='User')
+        self.assertEqual(
+            sorted(imported.values_list('deployment_id', flat=True)),
+            [f'DEP-{n:04d}' for n in range(5, 14)]
+        )
+
+    def test_create_without_deployment_id(self):
+        response = self.client.post('/api/deployments/deployments/', {
+            'project': self.project.id, 'status': self.pending.id, 'assigned_to': 'Ann',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Deployment.objects.get(assigned_to='Ann').deployment_id, 'DEP-0005')
+
+        response = self.client.post('/api/deployments/deployments/', {
+            'project': self.project.id, 'status': self.pending.id, 'deployment_id': 'DEP-0005',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class DeploymentEventTests(DeploymentTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+        async def subscribe():
+            return events.broker.subscribe(self.project.id)
+        self.queue = self.loop.run_until_complete(subscribe())
+        self.addCleanup(events.broker.unsubscribe, self.project.id, self.queue)
+
+    def received(self):
+        # Run the loop so events handed over from this thread are delivered
+        self.loop.run_until_complete(asyncio.sleep(0))
+        received = []
+        while not self.queue.empty():
+            received.append(self.queue.get_nowait())
+        return received
+
+    def test_single_update(self):
+        deployment = self.deployments[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/deployments/deployments/{deployment.id}/update_status/', {'status': self.completed.id}
+            )
+        self.assertEqual(response.status_code, 200)
+        [event] = self.received()
+        self.assertEqual(
+            {key: event[key] for key in ('type', 'ids', 'fields', 'status', 'technician')},
+            {'type': 'updated', 'ids': [deployment.id], 'fields': ['status'],
+             'status': self.completed.id, 'technician': self.technician.id}
+        )
+        self.assertEqual(event['updated_date'], response.data['updated_date'])
+
+    def test_bulk_update_sends_one_event(self):
+        ids = [deployment.id for deployment in self.deployments]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/deployments/deployments/bulk_assign_technician/', {
+                'ids': ids, 'technician': None
+            }, format='json')
+        [event] = self.received()
+        self.assertEqual(event['ids'], ids)
+        self.assertEqual(event['fields'], ['technician'])
+        self.assertIsNone(event['technician'])
+
+    def test_imports_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/projects/{self.project.id}/import_excel/', {
+                'file': excel_upload([{'Assigned To': 'Ann'}, {'Assigned To': 'Bob'}]),
+                'background': 'false',
+            }, format='multipart')
+        [event] = self.received()
+        self.assertEqual(event['type'], 'created')
+        self.assertEqual(
+            event['ids'],
+            list(Deployment.objects.filter(assigned_to__in=['Ann', 'Bob']).order_by('id').values_list('id', flat=True))
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/deployments/deployments/{self.deployments[0].id}/')
+        self.assertEqual([event['type'] for event in self.received()], ['deleted'])
+
+    def test_slow_client_is_told_to_reload(self):
+        with override_settings(EVENT_STREAM_QUEUE_SIZE=2):
+            async def subscribe():
+                return events.broker.subscribe(self.project.id)
+            queue = self.loop.run_until_complete(subscribe())
+        for _ in range(3):
+            events.broker.dispatch(self.project.id, {'type': 'updated', 'ids': [1]})
+        self.loop.run_until_complete(asyncio.sleep(0))
+        events.broker.unsubscribe(self.project.id, queue)
+        self.assertEqual(queue.get_nowait(), {'type': 'reload'})
+        self.assertTrue(queue.empty())
+
+
+class DeploymentEventStreamTests(DeploymentTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.token = Token.objects.create(user=cls.user)
+
+    async def test_stream(self):
+        response = await self.async_client.get(
+            f'/api/deployments/events/{self.project.id}/', {'token': self.token.key}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertIn(b'event: ready', await anext(chunks))
+
+        events.broker.dispatch(self.project.id, {'type': 'deleted', 'ids': [7]})
+        self.assertEqual(await anext(chunks), b'event: deleted\ndata: {"type": "deleted", "ids": [7]}\n\n')
+        await chunks.aclose()
+
+    async def test_stream_needs_a_user_and_a_project(self):
+        response = await self.async_client.get(f'/api/deployments/events/{self.project.id}/')
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get('/api/deployments/events/999999/', {'token': self.token.key})
+        self.assertEqual(response.status_code, 404)
+
+    def test_wsgi_is_refused(self):
+        response = self.client.get(f'/api/deployments/events/{self.project.id}/', {'token': self.token.key})
+        self.assertEqual(response.status_code, 501)
+
+
+class DeltaSyncTests(DeploymentTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Older than the cursor margin, so only changes made by the test show up
+        Deployment.objects.update(updated_date=timezone.now() - timedelta(hours=1))
+        Project.objects.filter(pk=self.project.pk).update(updated_date=timezone.now() - timedelta(hours=1))
+
+    def sync(self, since=None, **params):
+        params = {'project': self.project.id, **params}
+        if since:
+            params['since'] = since
+        response = self.client.get('/api/deployments/deployments/changes/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_full_sync_in_pages(self):
+        first = self.sync(page_size=2)
+        self.assertTrue(first['reset'])
+        self.assertTrue(first['has_more'])
+        self.assertEqual(len(first['fields']), 3)
+
+        ids, data = [d['id'] for d in first['deployments']], first
+        while data['has_more']:
+            data = self.sync(data['cursor'], page_size=2)
+            self.assertFalse(data['reset'])
+            ids += [d['id'] for d in data['deployments']]
+        self.assertEqual(ids, [d.id for d in self.deployments])
+        self.assertEqual(self.sync(data['cursor'])['deployments'], [])
+
+    def test_changes_and_tombstones(self):
+        cursor = self.sync()['cursor']
+        edited, custom, deleted = self.deployments[:3]
+        self.client.patch(f'/api/deployments/deployments/{edited.id}/', {'location': 'Annex'}, format='json')
+        # A custom value changed on its own moves the deployment on too
+        field_value = custom.fields.get(field=self.project_fields[0])
+        field_value.value = 'changed'
+        field_value.save()
+        self.client.delete(f'/api/deployments/deployments/{deleted.id}/')
+        removed_field = self.project_fields[2].id
+        self.project_fields[2].delete()
+
+        data = self.sync(cursor)
+        self.assertFalse(data['reset'])
+        self.assertEqual(sorted(d['id'] for d in data['deployments']), [edited.id, custom.id])
+        self.assertEqual(data['deleted'], [deleted.id])
+        self.assertEqual(data['deleted_fields'], [removed_field])
+        self.assertEqual([field['id'] for field in data['fields']], [f.id for f in self.project_fields[:2]])
+
+    def test_open_transaction_does_not_repeat_pages(self):
+        cursor = self.sync()['cursor']
+        # Another connection in the middle of a write holds the cursor back
+        other = connections.create_connection('default')
+        try:
+            with other.cursor() as other_cursor:
+                other.set_autocommit(False)
+                other_cursor.execute('SELECT txid_current()')
+                Deployment.objects.update(updated_date=timezone.now() + timedelta(seconds=5))
+
+                data = self.sync(cursor, page_size=2)
+                self.assertFalse(data['has_more'])
+                self.assertEqual(len(data['deployments']), 2)
+                # Syncing again ends too, instead of asking for the page forever
+                self.assertFalse(self.sync(data['cursor'], page_size=2)['has_more'])
+        finally:
+            other.rollback()
+            other.close()
+
+    def test_expired_cursor_resets(self):
+        old = encode_cursor(timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS + 1))
+        data = self.sync(old)
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['deployments']), 5)
+
+    def test_bad_requests(self):
+        url = '/api/deployments/deployments/changes/'
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'project': self.project.id, 'since': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'project': 999999}).status_code, 404)
+
+    def test_deleting_a_project_leaves_no_tombstones(self):
+        self.project.delete()
+        self.assertFalse(Tombstone.objects.exists())
+
+
+class ImportJobTests(DeploymentTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, **data):
+        rows = [
+            {'assignee': 'Ann', 'serial': 'A1', 'Field 0': 'HQ'},
+            {'assignee': 'Bob', 'serial': 'B2', 'Field 0': 'Annex'},
+            {'assignee': 'x' * 200, 'serial': 'C3', 'Field 0': 'HQ'},
+        ]
+        data.update({
+            'project': self.project.id,
+            'file': excel_upload(rows),
+            'column_map': '{"%d": "Field 0"}' % self.project_fields[0].id,
+        })
+        return self.client.post('/api/deployments/deployments/import_excel/', data, format='multipart')
+
+    def test_upload_is_queued_and_processed_by_worker(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['job']['status'], 'queued')
+        self.assertFalse(Deployment.objects.filter(new_sn='A1').exists())
+
+        job = claim_next_job()
+        self.assertEqual(job.status, 'running')
+        self.assertIsNone(claim_next_job())
+        process_import_job(job.id)
+
+        response = self.client.get(response.data['status_url'])
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['rows_processed'], 3)
+        self.assertEqual(response.data['rows_failed'], 1)
+        self.assertEqual(len(response.data['errors']), 1)
+        self.assertEqual(
+            DeploymentField.objects.get(deployment__new_sn='B2').value, 'Annex'
+        )
+
+    def test_orphaned_job_is_failed(self):
+        self.upload()
+        crashed = claim_next_job()
+        self.upload()
+        # The project waits for its running import
+        self.assertIsNone(claim_next_job())
+
+        # ...until the worker running it has missed its heartbeats
+        ImportJob.objects.filter(pk=crashed.pk).update(
+            heartbeat_date=timezone.now() - timedelta(seconds=settings.IMPORT_JOB_TIMEOUT + 1)
+        )
+        job = claim_next_job()
+        self.assertNotEqual(job.id, crashed.id)
+        crashed.refresh_from_db()
+        self.assertEqual(crashed.status, 'failed')
+        self.assertIsNotNone(crashed.finished_date)
+
+    def test_failed_job_imports_nothing(self):
+        self.upload()
+        job = claim_next_job()
+        ImportJob.objects.filter(pk=job.pk).update(options={**job.options, 'batch_size': 1})
+        before = Deployment.objects.count()
+
+        # The second batch fails, after the first was written
+        with mock.patch.object(Heartbeat, 'report', side_effect=[None, RuntimeError('disk full')]):
+            job = process_import_job(job.id)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(Deployment.objects.count(), before)
+
+    def test_worker_survives_a_dead_process(self):
+        self.upload()
+        self.upload()
+        with mock.patch('deployments.worker.run_job', crash_import_worker):
+            call_command('run_import_worker', processes=1, once=True, poll_interval=0.1,
+                         stdout=io.StringIO(), stderr=io.StringIO())
+        # Each job broke the pool it ran in; the worker restarted it and went on
+        self.assertEqual(
+            list(ImportJob.objects.values_list('status', flat=True)), ['failed', 'failed']
+        )
+
+    def test_inline_import_keeps_response_shape(self):
+        response = self.upload(background='false')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 2)
+        self.assertTrue(response.data['errors'][0].startswith('Row 4:'))
+
+
+class StatusHistoryTests(DeploymentTestMixin, APITestCase):
+
+    def rollup(self, status, **filters):
+        return DeploymentStatusDaily.objects.get(
+            project=self.project, status=status, day=timezone.localdate(), **filters
+        )
+
+    def test_status_changes_are_recorded(self):
+        created = self.rollup(self.pending, technician=self.technician)
+        self.assertEqual((created.entered, created.exited), (5, 0))
+
+        deployment = self.deployments[0]
+        self.client.post(
+            f'/api/deployments/deployments/{deployment.id}/update_status/', {'status': self.completed.id}
+        )
+        event = DeploymentStatusEvent.objects.filter(deployment=deployment).latest('id')
+        self.assertEqual((event.from_status, event.to_status), (self.pending, self.completed))
+        self.assertEqual(event.technician, self.technician)
+        self.assertIsNotNone(Deployment.objects.get(pk=deployment.pk).status_changed_date)
+
+        # Rows already in the status are left out
+        ids = [d.id for d in self.deployments[:3]]
+        self.client.post('/api/deployments/deployments/bulk_update_status/', {
+            'ids': ids, 'status': self.completed.id
+        }, format='json')
+        self.assertEqual(DeploymentStatusEvent.objects.filter(to_status=self.completed).count(), 3)
+        self.assertEqual(self.rollup(self.pending).exited, 3)
+        self.assertEqual(self.rollup(self.completed).entered, 3)
+
+        # Saves that leave the status alone add nothing
+        deployment = Deployment.objects.get(pk=self.deployments[4].pk)
+        deployment.location = 'Annex'
+        deployment.save()
+        self.assertEqual(DeploymentStatusEvent.objects.count(), 8)
+
+        deployment.delete()
+        self.assertEqual(self.rollup(self.pending).removed, 1)
+
+    def test_imported_deployments_are_recorded(self):
+        response = self.client.post('/api/deployments/deployments/import_excel/', {
+            'project': self.project.id, 'background': 'false',
+            'file': excel_upload([{'serial': 'A1'}, {'serial': 'A2'}]),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.rollup(self.pending, technician=None).entered, 2)
+        self.assertEqual(
+            DeploymentStatusEvent.objects.filter(deployment__new_sn__in=['A1', 'A2'], from_status=None).count(), 2
+        )
+
+    def test_reports(self):
+        today = timezone.localdate()
+        history.add_to_rollups({(self.project.id, today - timedelta(days=2), self.pending.id, None): [2, 0, 0, 0]})
+        for deployment in self.deployments[:2]:
+            self.client.post(
+                f'/api/deployments/deployments/{deployment.id}/update_status/', {'status': self.completed.id}
+            )
+        url = f'/api/projects/{self.project.id}'
+        start = (today - timedelta(days=3)).isoformat()
+
+        # Only the rollups are read
+        with self.assertNumQueries(2):
+            response = self.client.get(f'{url}/burndown/', {'from': start})
+        self.assertEqual(
+            [(day['total'], day['completed'], day['remaining']) for day in response.data['days']],
+            [(0, 0, 0), (2, 0, 2), (2, 0, 2), (7, 2, 5)]
+        )
+
+        response = self.client.get(f'{url}/throughput/')
+        self.assertEqual(response.data['statuses'], [self.completed.id])
+        [technician] = response.data['technicians']
+        self.assertEqual((technician['name'], technician['total']), ('Tech One', 2))
+        self.assertEqual(technician['per_day'], [{'date': today, 'count': 2}])
+
+        response = self.client.get(f'{url}/time_in_status/', {'technician': self.technician.id})
+        [pending] = response.data['statuses']
+        self.assertEqual((pending['name'], pending['exits']), ('Pending', 2))
+
+        response = self.client.get(f'{url}/burndown/', {'from': today.isoformat(), 'to': start})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(f'{url}/throughput/', {'from': 'last week'})
+        self.assertEqual(response.status_code, 400)
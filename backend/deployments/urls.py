@@ -1,13 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DeploymentViewSet, DeploymentStatusViewSet, TechnicianViewSet, DepartmentViewSet
+from .views import project_events, DeploymentViewSet, DeploymentStatusViewSet, TechnicianViewSet, DepartmentViewSet, ImportJobViewSet
 
 router = DefaultRouter()
 router.register(r'deployments', DeploymentViewSet)
 router.register(r'statuses', DeploymentStatusViewSet)
 router.register(r'technicians', TechnicianViewSet)
 router.register(r'departments', DepartmentViewSet)
+router.register(r'import-jobs', ImportJobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    # Server-sent change events for a project's deployments (ASGI only)
+    path('events/<int:project_id>/', project_events, name='project-events'),
 ]
\ No newline at end of file
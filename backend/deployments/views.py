@@ -2,78 +2,265 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from .models import Deployment, DeploymentStatus, Technician, Department
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Prefetch, Q, Value, When
+from django.utils import timezone
+from backend.conditional import ConditionalGetMixin
+from backend.pagination import LookupPagination, OffsetPagination
+from backend.staging import UploadNotFound, get_upload
+from . import events, history, reference
+from .models import Deployment, DeploymentField, DeploymentStatus, Technician, Department, ImportJob, Tombstone
 from projects.models import Project, ProjectField
+from projects.serializers import ProjectFieldSerializer
+from projects.stats import invalidate_project_stats
+from .changes import decode_cursor, next_cursor, stable_time
+from .custom_filters import filter_custom_fields, parse_ordering
+from .importers import ImportFailed
+from .search import search_deployments
+from .jobs import enqueue_import, import_job_accepted, requested_upsert_key, run_import, wants_background
+from .exporters import export_to_tempfile
 from .serializers import (
-    DeploymentSerializer, DeploymentCreateSerializer, DeploymentUpdateSerializer,
-    DeploymentStatusSerializer, TechnicianSerializer, DepartmentSerializer
+    DeploymentSerializer, DeploymentCompactSerializer, DeploymentCreateSerializer, DeploymentUpdateSerializer,
+    DeploymentStatusSerializer, TechnicianSerializer, DepartmentSerializer, ImportJobSerializer
 )
-import pandas as pd
+import asyncio
+import json
 import os
+from datetime import timedelta
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.http import HttpResponse
-import uuid
-import datetime
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from accounts.authentication import CachedTokenAuthentication
 
-class DeploymentStatusViewSet(viewsets.ReadOnlyModelViewSet):
+class CachedReferenceMixin:
+    """
+    Serve list and retrieve for a small lookup table from the reference
+    cache instead of the database. Writes still go through the queryset.
+    """
+    reference_table = None
+    
+    def list(self, request, *args, **kwargs):
+        # Explicitly requested pages are read from the database
+        if self.paginator is not None and self.paginator.is_requested(request):
+            return super().list(request, *args, **kwargs)
+        
+        serializer = self.get_serializer(self.reference_table.all(), many=True)
+        return Response(serializer.data)
+    
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.reference_table.get(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        if instance is None:
+            raise Http404
+        self.check_object_permissions(request, instance)
+        
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+class DeploymentStatusViewSet(CachedReferenceMixin, viewsets.ReadOnlyModelViewSet):
     queryset = DeploymentStatus.objects.all().order_by('order')
     serializer_class = DeploymentStatusSerializer
+    pagination_class = None
+    reference_table = reference.statuses
 
-class TechnicianViewSet(viewsets.ModelViewSet):
+class TechnicianViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
     queryset = Technician.objects.all()
     serializer_class = TechnicianSerializer
+    pagination_class = LookupPagination
+    reference_table = reference.technicians
+    
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Deployments assigned to the technician, in total and per status"""
+        technician = self.get_object()
+        counts = dict(
+            Deployment.objects.filter(technician=technician)
+            .values_list('status_id')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        return Response({
+            'technician': technician.id,
+            'total': sum(counts.values()),
+            'by_status': [
+                {'id': status.id, 'name': status.name, 'count': counts[status.id]}
+                for status in reference.statuses.all()
+                if status.id in counts
+            ],
+        })
 
-class DepartmentViewSet(viewsets.ModelViewSet):
+class DepartmentViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
     queryset = Department.objects.all()
     serializer_class = DepartmentSerializer
+    pagination_class = LookupPagination
+    reference_table = reference.departments
 
-class DeploymentViewSet(viewsets.ModelViewSet):
+class DeploymentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Deployment.objects.all()
     serializer_class = DeploymentSerializer
+    # Responses include the project and its field names (see projects/signals.py)
+    etag_aggregates = {'project_updated': Max('project__updated_date')}
+    etag_detail_fields = ['updated_date', 'project__updated_date']
+    
+    def is_compact(self):
+        """`?compact=true` reads custom values from Deployment.custom_values"""
+        return str(self.request.query_params.get('compact', '')).lower() in ('1', 'true', 'yes')
+    
+    @property
+    def paginator(self):
+        # Cursor pages follow id order; search results and lists sorted on a
+        # custom field page by offset
+        if not hasattr(self, '_paginator') and (
+            self.action == 'search' or parse_ordering(self.request.query_params)
+        ):
+            self._paginator = OffsetPagination()
+        return super().paginator
     
     def get_serializer_class(self):
         if self.action == 'create':
             return DeploymentCreateSerializer
         elif self.action in ['update', 'partial_update']:
             return DeploymentUpdateSerializer
+        elif self.is_compact():
+            return DeploymentCompactSerializer
         return DeploymentSerializer
     
+    def get_etag_parts(self):
+        # Status, department and technician names come from the reference cache
+        return [reference.statuses.version(), reference.departments.version(), reference.technicians.version()]
+    
     def get_queryset(self):
-        queryset = Deployment.objects.all()
+        return self.apply_filters(self.serializable_queryset(), self.request.query_params)
+    
+    def serializable_queryset(self):
+        # Load everything DeploymentSerializer reads up front, so a page costs
+        # a fixed number of queries instead of several per deployment.
+        # Status, department and technician names come from the reference cache
+        queryset = Deployment.objects.select_related('project')
+        if not self.is_compact():
+            queryset = queryset.prefetch_related(
+                Prefetch('fields', queryset=DeploymentField.objects.select_related('field'))
+            )
+        return queryset
         
+    def apply_filters(self, queryset, params):
+        """Narrow deployments by the list filter params (see custom_filters.py for cf.*)"""
         # Filter by project if provided
-        project_id = self.request.query_params.get('project')
+        project_id = params.get('project')
         if project_id:
             queryset = queryset.filter(project_id=project_id)
         
         # Filter by status if provided
-        status_id = self.request.query_params.get('status')
+        status_id = params.get('status')
         if status_id:
             queryset = queryset.filter(status_id=status_id)
             
         # Filter by technician if provided
-        technician_id = self.request.query_params.get('technician')
+        technician_id = params.get('technician')
         if technician_id:
             queryset = queryset.filter(technician_id=technician_id)
             
         # Filter by department if provided
-        department_id = self.request.query_params.get('department')
+        department_id = params.get('department')
         if department_id:
             queryset = queryset.filter(department_id=department_id)
         
-        return queryset
+        # cf.<field id> filters and ordering on custom values
+        return filter_custom_fields(queryset, params)
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Search all projects by serial number, model, assignee or custom value"""
+        text = request.query_params.get('q', '').strip()
+        
+        if not text:
+            return Response({"error": "Search text (q) is required"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # The list filters still apply; an explicit ordering replaces ranking
+        queryset = search_deployments(
+            self.filter_queryset(self.get_queryset()), text,
+            rank='ordering' not in request.query_params
+        )
+        
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Delta sync: the deployments of ?project= changed after ?since=<cursor>
+        and the IDs of deployments and project fields deleted since then.
+        Without `since`, or with one older than the tombstones kept, the
+        whole project is sent with reset: true. While has_more is true, ask
+        again with the returned cursor; keep the last cursor for next time.
+        """
+        project_id = request.query_params.get('project')
+        if not project_id:
+            return Response({"error": "Project ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            project = Project.objects.get(pk=project_id)
+        except (Project.DoesNotExist, ValueError):
+            return Response({"error": "Project not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            since = decode_cursor(request.query_params['since']) if request.query_params.get('since') else None
+            page_size = min(int(request.query_params.get('page_size', settings.MAX_PAGE_SIZE)),
+                            settings.MAX_PAGE_SIZE)
+            if page_size < 1:
+                raise ValueError(page_size)
+        except ValueError:
+            return Response({"error": "Invalid since cursor or page_size"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Read first: changes committed after this are picked up next time
+        stable = stable_time()
+        oldest_tombstone = timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+        reset = since is None or since[0] < oldest_tombstone
+        
+        queryset = self.serializable_queryset().filter(project=project).order_by('updated_date', 'id')
+        tombstones = Tombstone.objects.filter(project_id=project.id)
+        if not reset:
+            moment, last_id = since
+            queryset = queryset.filter(Q(updated_date__gt=moment) | Q(updated_date=moment, id__gt=last_id))
+            tombstones = tombstones.filter(deleted_date__gt=moment)
+        else:
+            tombstones = tombstones.none()
+        
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        deleted = {'deployment': set(), 'field': set()}
+        for kind, object_id in tombstones.values_list('kind', 'object_id'):
+            deleted[kind].add(object_id)
+        
+        cursor, has_more = next_cursor(rows, has_more, stable)
+        result = {
+            "cursor": cursor,
+            "has_more": has_more,
+            "reset": reset,
+            "deployments": self.get_serializer(rows, many=True).data,
+            "deleted": sorted(deleted['deployment']),
+            "deleted_fields": sorted(deleted['field']),
+        }
+        # Adding or changing a field moves the project's updated_date on
+        if reset or project.updated_date > since[0]:
+            result["fields"] = ProjectFieldSerializer(project.fields.order_by('order', 'id'), many=True).data
+        return Response(result)
     
     @action(detail=False, methods=['post'])
     def import_excel(self, request):
         """Import deployments from Excel"""
         project_id = request.data.get('project')
         file_obj = request.FILES.get('file')
+        upload_id = request.data.get('upload_id')
         column_map = request.data.get('column_map', {})
+        batch_size = request.data.get('batch_size')
         
         if not project_id:
             return Response({"error": "Project ID is required"}, status=status.HTTP_400_BAD_REQUEST)
             
-        if not file_obj:
+        if not file_obj and not upload_id:
             return Response({"error": "Excel file is required"}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
@@ -81,111 +268,62 @@ class DeploymentViewSet(viewsets.ModelViewSet):
         except Project.DoesNotExist:
             return Response({"error": "Project not found"}, status=status.HTTP_404_NOT_FOUND)
         
+        # A file staged earlier (see projects/upload) is imported without parsing it again
+        if upload_id and not file_obj:
+            try:
+                upload_id = get_upload(upload_id).id
+            except UploadNotFound:
+                return Response({"error": "Upload not found or expired"}, status=status.HTTP_404_NOT_FOUND)
+        else:
+            upload_id = None
+        
         try:
-            # Read Excel file
-            df = pd.read_excel(file_obj)
-            
-            # Get the default status
+            batch_size = int(batch_size) if batch_size else None
+        except (TypeError, ValueError):
+            return Response({"error": "batch_size must be an integer"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        # Convert column map from JSON string if needed
+        if isinstance(column_map, str):
             try:
-                default_status = DeploymentStatus.objects.order_by('order').first()
-            except:
-                return Response({"error": "No deployment status defined. Please create at least one status."}, 
-                                status=status.HTTP_400_BAD_REQUEST)
-            
-            # Convert column map from JSON string if needed
-            if isinstance(column_map, str):
-                try:
-                    import json
-                    column_map = json.loads(column_map)
-                except:
-                    column_map = {}
-            
-            # Create deployments from Excel data
-            deployed_count = 0
-            errors = []
-            
-            # Get field objects for validation
-            project_fields = {str(field.id): field for field in project.fields.all()}
-            
-            # Create a reverse mapping from Excel column names to field IDs
-            column_to_field = {col_name: field_id for field_id, col_name in column_map.items()}
-            
-            for index, row in df.iterrows():
-                try:
-                    # Create deployment with basic data
-                    deployment_data = {
-                        'project': project,
-                        'deployment_id': f"DEP-{uuid.uuid4().hex[:6].upper()}",
-                        'status': default_status
-                    }
-                    
-                    # Map common fields if available in the Excel
-                    common_field_map = {
-                        'assigned_to': ['assigned_to', 'assignee', 'user', 'employee'],
-                        'position': ['position', 'job_title', 'title', 'role'],
-                        'location': ['location', 'site', 'building', 'office'],
-                        'current_model': ['current_model', 'old_model', 'existing_model'],
-                        'current_sn': ['current_sn', 'old_sn', 'existing_sn', 'current_serial'],
-                        'new_model': ['new_model', 'target_model', 'model'],
-                        'new_sn': ['new_sn', 'target_sn', 'serial_number', 'serial'],
-                    }
-                    
-                    # Try to map common fields from Excel columns
-                    for field_name, possible_headers in common_field_map.items():
-                        for header in possible_headers:
-                            if header in df.columns:
-                                value = row[header]
-                                if pd.notna(value):  # Check if value is not NaN
-                                    deployment_data[field_name] = str(value)
-                                break
-                    
-                    # Create the deployment
-                    deployment = Deployment.objects.create(**deployment_data)
-                    
-                    # Process custom fields based on column mapping
-                    for col_name, cell_value in row.items():
-                        if pd.notna(cell_value) and col_name in column_to_field:
-                            field_id = column_to_field[col_name]
-                            if field_id in project_fields:
-                                field = project_fields[field_id]
-                                
-                                # Convert value based on field type
-                                if field.field_type == 'number':
-                                    try:
-                                        value = float(cell_value)
-                                    except:
-                                        value = cell_value
-                                elif field.field_type == 'date':
-                                    try:
-                                        if isinstance(cell_value, datetime.datetime):
-                                            value = cell_value.strftime('%Y-%m-%d')
-                                        else:
-                                            value = str(cell_value)
-                                    except:
-                                        value = str(cell_value)
-                                else:
-                                    value = str(cell_value)
-                                
-                                # Create deployment field
-                                deployment.fields.create(
-                                    field=field,
-                                    value=value
-                                )
-                    
-                    deployed_count += 1
-                except Exception as e:
-                    errors.append(f"Row {index + 2}: {str(e)}")
+                column_map = json.loads(column_map)
+            except ValueError:
+                column_map = {}
+        
+        # mode=upsert updates the deployments already imported, matched on `key`
+        try:
+            upsert_key = requested_upsert_key(request, project)
+        except ImportFailed as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        options = {
+            'column_map': column_map, 'batch_size': batch_size, 'upload_id': upload_id,
+            'upsert_key': upsert_key
+        }
+        
+        # Hand the upload to the import worker unless the client wants to wait
+        if wants_background(request, settings.IMPORT_IN_BACKGROUND):
+            job = enqueue_import(project, 'deployments', file_obj, options, request.user)
+            return import_job_accepted(job, request)
+        
+        try:
+            # Rows are read lazily and written in batches, all or nothing
+            with transaction.atomic():
+                importer = run_import(project, 'deployments', file_obj, options)
             
             result = {
-                "message": f"Successfully imported {deployed_count} deployments",
-                "total": deployed_count
+                "message": importer.message(),
+                "total": importer.created,
+                **importer.counts()
             }
             
-            if errors:
-                result["errors"] = errors
+            if importer.errors:
+                result["errors"] = importer.errors
                 
             return Response(result)
             
+        except ImportFailed as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": f"Error processing Excel file: {str(e)}"}, 
                             status=status.HTTP_400_BAD_REQUEST)
@@ -203,45 +341,16 @@ class DeploymentViewSet(viewsets.ModelViewSet):
         except Project.DoesNotExist:
             return Response({"error": "Project not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        # Get deployments for this project
-        deployments = Deployment.objects.filter(project=project)
-        
-        # Create DataFrame with common fields
-        data = []
-        
-        for deployment in deployments:
-            row = {
-                'ID': deployment.deployment_id,
-                'Status': deployment.status.name,
-                'Assigned To': deployment.assigned_to,
-                'Position': deployment.position,
-                'Department': deployment.department.name if deployment.department else '',
-                'Location': deployment.location,
-                'Current Model': deployment.current_model,
-                'Current SN': deployment.current_sn,
-                'New Model': deployment.new_model,
-                'New SN': deployment.new_sn,
-                'Technician': deployment.technician.name if deployment.technician else '',
-                'Technician Notes': deployment.technician_notes,
-                'Deployment Date': deployment.deployment_date,
-                'Created Date': deployment.created_date,
-                'Updated Date': deployment.updated_date
-            }
-            
-            # Add custom fields
-            for field_value in deployment.fields.all():
-                row[field_value.field.name] = field_value.value
-            
-            data.append(row)
-        
-        # Create DataFrame
-        df = pd.DataFrame(data)
-        
-        # Create Excel file
-        response = HttpResponse(content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = f'attachment; filename="{project.name}_deployments.xlsx"'
-        
-        df.to_excel(response, index=False)
+        # Rows are written chunk by chunk to a temporary file, so memory stays
+        # flat regardless of project size. Nothing is sent until it is
+        # complete: openpyxl only assembles the XLSX archive on save, and
+        # buffers write-only sheets in temporary files until then anyway.
+        response = FileResponse(
+            export_to_tempfile(project),
+            as_attachment=True,
+            filename=f"{project.name}_deployments.xlsx",
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
         return response
     
     @action(detail=True, methods=['post'])
@@ -253,13 +362,12 @@ class DeploymentViewSet(viewsets.ModelViewSet):
         if not status_id:
             return Response({"error": "Status ID is required"}, status=status.HTTP_400_BAD_REQUEST)
         
-        try:
-            new_status = DeploymentStatus.objects.get(pk=status_id)
-        except DeploymentStatus.DoesNotExist:
+        new_status = reference.statuses.get(status_id)
+        if new_status is None:
             return Response({"error": "Status not found"}, status=status.HTTP_404_NOT_FOUND)
         
         deployment.status = new_status
-        deployment.save()
+        deployment.save(update_fields=['status', 'updated_date'])
         
         serializer = self.get_serializer(deployment)
         return Response(serializer.data)
@@ -271,16 +379,201 @@ class DeploymentViewSet(viewsets.ModelViewSet):
         technician_id = request.data.get('technician')
         
         if technician_id:
-            try:
-                technician = Technician.objects.get(pk=technician_id)
-                deployment.technician = technician
-            except Technician.DoesNotExist:
+            technician = reference.technicians.get(technician_id)
+            if technician is None:
                 return Response({"error": "Technician not found"}, status=status.HTTP_404_NOT_FOUND)
+            deployment.technician = technician
         else:
             # If technician_id is None, remove assignment
             deployment.technician = None
         
-        deployment.save()
+        deployment.save(update_fields=['technician', 'updated_date'])
         
         serializer = self.get_serializer(deployment)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+    
+    def bulk_update(self, request, changes):
+        """
+        Apply `changes` to the deployments named by `ids` and/or matched by
+        `filter` (same keys as the list filters) with a single UPDATE.
+        """
+        ids = request.data.get('ids')
+        filters = request.data.get('filter')
+        
+        if not ids and not filters:
+            return Response({"error": "Provide a list of ids or a filter"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = Deployment.objects.all()
+        if ids:
+            try:
+                ids = [int(deployment_id) for deployment_id in ids]
+            except (TypeError, ValueError):
+                return Response({"error": "ids must be a list of integers"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(id__in=ids)
+        if filters:
+            if not isinstance(filters, dict):
+                return Response({"error": "filter must be an object"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            # An unrecognised filter would match every deployment of every project
+            if not filters.get('project'):
+                return Response({"error": "filter must include a project"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            queryset = self.apply_filters(queryset, filters)
+        
+        with transaction.atomic():
+            # Lock the matched rows so the per-ID results describe what the
+            # UPDATE actually touched
+            rows = list(queryset.select_for_update().values_list(
+                'id', 'project_id', 'status_id', 'technician_id', 'status_changed_date', 'created_date'
+            ))
+            matched = {row[0]: row[1] for row in rows}
+            # .update() skips auto_now and signals, so set updated_date here
+            # and refresh the project stats, record the status history and
+            # send the change events ourselves
+            now = timezone.now()
+            values = dict(changes)
+            new_status_id = changes.get('status_id')
+            if new_status_id is not None:
+                values['status_changed_date'] = Case(
+                    When(status_id=new_status_id, then=F('status_changed_date')), default=Value(now)
+                )
+            Deployment.objects.filter(id__in=matched).update(updated_date=now, **values)
+            if new_status_id is not None:
+                history.record_status_changes([
+                    history.StatusChange(
+                        deployment_id, project_id, status_id, new_status_id, technician_id,
+                        status_changed_date or created_date, now
+                    )
+                    for deployment_id, project_id, status_id, technician_id, status_changed_date, created_date
+                    in rows if status_id != new_status_id
+                ])
+            project_ids = set(matched.values())
+            transaction.on_commit(lambda: invalidate_project_stats(*project_ids))
+            for project_id in project_ids:
+                events.publish(
+                    project_id,
+                    [deployment_id for deployment_id, owner in matched.items() if owner == project_id],
+                    fields=events.event_fields(changes),
+                    updated_date=now,
+                    **{events.EVENT_FIELD_NAMES[name]: value for name, value in changes.items()}
+                )
+        
+        results = [{"id": deployment_id, "updated": True} for deployment_id in sorted(matched)]
+        unmatched = [deployment_id for deployment_id in (ids or []) if deployment_id not in matched]
+        # IDs that exist but were left out by the filter
+        filtered_out = set(
+            Deployment.objects.filter(id__in=unmatched).values_list('id', flat=True)
+        ) if filters and unmatched else set()
+        for deployment_id in unmatched:
+            error = "Deployment not matched by filter" if deployment_id in filtered_out else "Deployment not found"
+            results.append({"id": deployment_id, "updated": False, "error": error})
+        
+        return Response({"updated": len(matched), "results": results})
+    
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request):
+        """Move many deployments to one status"""
+        status_id = request.data.get('status')
+        
+        if not status_id:
+            return Response({"error": "Status ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        new_status = reference.statuses.get(status_id)
+        if new_status is None:
+            return Response({"error": "Status not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        return self.bulk_update(request, {'status_id': new_status.id})
+    
+    @action(detail=False, methods=['post'])
+    def bulk_assign_technician(self, request):
+        """Assign (or with no technician, unassign) many deployments"""
+        technician_id = request.data.get('technician')
+        
+        if technician_id:
+            technician = reference.technicians.get(technician_id)
+            if technician is None:
+                return Response({"error": "Technician not found"}, status=status.HTTP_404_NOT_FOUND)
+            technician_id = technician.id
+        else:
+            technician_id = None
+        
+        return self.bulk_update(request, {'technician_id': technician_id})
+
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Progress of background spreadsheet imports"""
+    queryset = ImportJob.objects.all().order_by('-id')
+    serializer_class = ImportJobSerializer
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        
+        # Non-admin users only see their own uploads
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(created_by=self.request.user)
+        
+        project_id = self.request.query_params.get('project')
+        if project_id:
+            queryset = queryset.filter(project_id=project_id)
+        
+        return queryset
+
+
+def stream_user(request):
+    """
+    The user of an event stream request. Browsers' EventSource cannot set
+    headers, so the token may also come as ?token=. Falls back to the session.
+    """
+    key = request.GET.get('token')
+    header = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if not key and len(header) == 2 and header[0] == 'Token':
+        key = header[1]
+    if key:
+        try:
+            return CachedTokenAuthentication().authenticate_credentials(key)[0]
+        except AuthenticationFailed:
+            return None
+    return request.user if request.user.is_authenticated else None
+
+
+async def project_events(request, project_id):
+    """
+    Server-sent events for the deployments of a project (see events.py).
+    Sends `ready` once subscribed, after which clients should reload what
+    they show, then one message per change event. Streams close after
+    EVENT_STREAM_MAX_AGE seconds and the browser reconnects.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Event streams are only served by the ASGI application (backend.asgi)"},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+    
+    user = await sync_to_async(stream_user)(request)
+    if user is None:
+        return JsonResponse({"error": "Authentication credentials were not provided."},
+                            status=status.HTTP_401_UNAUTHORIZED)
+    if not await Project.objects.filter(pk=project_id).aexists():
+        return JsonResponse({"error": "Project not found"}, status=status.HTTP_404_NOT_FOUND)
+    
+    async def stream():
+        queue = events.broker.subscribe(project_id)
+        try:
+            yield f"retry: {settings.EVENT_STREAM_RETRY_MS}\nevent: ready\ndata: {{}}\n\n"
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + settings.EVENT_STREAM_MAX_AGE
+            while loop.time() < deadline:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.EVENT_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.broker.unsubscribe(project_id, queue)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,15 @@
+"""
+Entry points for import worker processes. This module must stay importable
+before Django is set up, so models are only imported inside the functions.
+"""
+
+
+def setup():
+    import django
+    django.setup()
+
+
+def run_job(job_id):
+    from .jobs import process_import_job
+    job = process_import_job(job_id)
+    return job.status, job.rows_processed, job.rows_failed
@@ -0,0 +1,224 @@
+"""
+Column type inference for uploaded spreadsheets, shared by analyze_excel
+and create_with_excel.
+
+profile_columns() reads the sheet once. It keeps a fixed-size random
+sample of the rows (reservoir sampling, so memory and inference time do not
+grow with the file) and, for each column, the distinct values while there
+are few enough of them to be dropdown options. The type of each column is
+then worked out on the sample with vectorized parsing attempts: booleans
+(yes/no, true/false), numbers (allowing thousands separators and a
+currency sign) and dates, including dates written as text.
+"""
+import datetime
+import math
+import numbers
+import random
+import re
+import warnings
+from collections import Counter
+
+import pandas as pd
+
+# Rows kept for type inference
+SAMPLE_ROWS = 5000
+# Rows read between updates of the per-column statistics
+CHUNK_ROWS = 1000
+# Share of the sampled values that must parse for a column to get a type
+TYPE_THRESHOLD = 0.95
+# A text column is offered as a dropdown when it has at most this many
+# distinct values, each repeated often enough
+MAX_DROPDOWN_OPTIONS = 10
+MAX_DROPDOWN_UNIQUE_RATIO = 0.2
+SAMPLE_SIZE = 5
+
+BOOLEAN_WORDS = {'true', 'false', 'yes', 'no', 'y', 'n'}
+# Tried in this order; the first is also the format values are stored in
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%m/%d/%Y', '%d/%m/%Y',
+    '%Y/%m/%d', '%d.%m.%Y', '%d-%b-%Y', '%b %d, %Y', '%d %B %Y', '%B %d, %Y',
+]
+# Stripped from numbers written as text, e.g. "$1,200"
+NUMBER_NOISE = re.compile(r'^[$€£]|,')
+
+
+def parse_number(value):
+    """`value` as a float, or None if it is not a number"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, numbers.Number):
+        return float(value)
+    try:
+        return float(NUMBER_NOISE.sub('', str(value).strip()))
+    except ValueError:
+        return None
+
+
+def parse_date(value):
+    """`value` as a date, or None if it is not one"""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    text = str(value).strip()
+    try:
+        # Much faster than strptime for the usual YYYY-MM-DD
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def is_blank(value):
+    return value is None or value == ''
+
+
+class Reservoir:
+    """
+    A uniform random sample of at most `size` items from a stream of
+    unknown length. Uses Algorithm L, which draws random numbers only for
+    the items it keeps, so skipped rows cost next to nothing.
+    """
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.items = []
+        self.seen = 0
+        self.weight = 1.0
+        self.next_index = None
+
+    def _uniform(self):
+        return self.rng.random() or 0.5
+
+    def _skip(self, index):
+        self.weight *= math.exp(math.log(self._uniform()) / self.size)
+        self.next_index = index + math.floor(math.log(self._uniform()) / math.log(1 - self.weight)) + 1
+
+    def extend(self, items):
+        start = self.seen
+        end = start + len(items)
+        for index in range(start, min(end, self.size)):
+            self.items.append(items[index - start])
+            if index == self.size - 1:
+                self._skip(index)
+        # Jump straight to the next item that replaces one in the sample
+        while self.next_index is not None and self.next_index < end:
+            self.items[self.rng.randrange(self.size)] = items[self.next_index - start]
+            self._skip(self.next_index)
+        self.seen = end
+
+
+class ColumnProfile:
+    """What is known about one column after reading the sheet"""
+
+    def __init__(self, name):
+        self.name = name
+        # Non-empty values, counted while the column is tracked
+        self.count = 0
+        self.samples = []
+        # Counts of each value, only kept while the column could still be a dropdown
+        self.value_counts = Counter()
+        self.field_type = 'text'
+        self.confidence = 1.0
+        self.options = None
+
+    def add(self, values):
+        """Record a batch of the column's values; blanks are skipped"""
+        values = [value for value in values if value is not None and value != '']
+        self.count += len(values)
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.extend(values[:SAMPLE_SIZE - len(self.samples)])
+        if self.value_counts is not None:
+            self.value_counts.update(values)
+            if len(self.value_counts) > MAX_DROPDOWN_OPTIONS:
+                self.value_counts = None
+
+    @property
+    def tracking(self):
+        """Whether add() still needs to see the column's values"""
+        return self.value_counts is not None or len(self.samples) < SAMPLE_SIZE
+
+    def infer(self, sample):
+        """Set field_type, confidence and options from the sampled values"""
+        if not len(sample):
+            return
+        self.field_type, self.confidence = infer_type(sample)
+
+        if (
+            self.field_type == 'text'
+            and self.value_counts is not None
+            and len(self.value_counts) / self.count < MAX_DROPDOWN_UNIQUE_RATIO
+        ):
+            self.field_type = 'dropdown'
+            self.confidence = round(1 - len(self.value_counts) / self.count, 3)
+            self.options = [str(value) for value, _ in self.value_counts.most_common()]
+        # Nothing else needs the counts
+        self.value_counts = None
+
+
+def infer_type(values):
+    """(field_type, confidence) for a Series of non-empty cell values"""
+    kinds = values.map(type)
+    is_bool = kinds.eq(bool)
+    is_number = values.map(lambda value: isinstance(value, numbers.Number)) & ~is_bool
+    is_date = values.map(lambda value: isinstance(value, datetime.date))
+
+    text = values[kinds.eq(str)].str.strip()
+    scores = {}
+
+    def accept(field_type, score):
+        scores[field_type] = float(score)
+        return score >= TYPE_THRESHOLD
+
+    if accept('checkbox', (is_bool.sum() + text.str.lower().isin(BOOLEAN_WORDS).sum()) / len(values)):
+        return 'checkbox', round(scores['checkbox'], 3)
+
+    numeric_text = pd.to_numeric(text.str.replace(NUMBER_NOISE, '', regex=True), errors='coerce')
+    if accept('number', (is_number.sum() + numeric_text.notna().sum()) / len(values)):
+        return 'number', round(scores['number'], 3)
+
+    dates = is_date.sum()
+    best = 0
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for date_format in DATE_FORMATS:
+            # Only formats that match some of the first values are tried on them all
+            if not pd.to_datetime(text.head(20), format=date_format, errors='coerce').notna().any():
+                continue
+            best = max(best, pd.to_datetime(text, format=date_format, errors='coerce').notna().sum())
+    if accept('date', (dates + best) / len(values)):
+        return 'date', round(scores['date'], 3)
+
+    return 'text', round(1 - max(scores.values()), 3)
+
+
+def profile_columns(reader, sample_rows=SAMPLE_ROWS, seed=0):
+    """
+    Profile every column of a SpreadsheetReader in a single pass. Returns
+    the profiles (in column order, with field_type, confidence and options
+    set) and the number of data rows.
+    """
+    columns = reader.columns
+    profiles = [ColumnProfile(name) for name in columns]
+    reservoir = Reservoir(sample_rows, random.Random(seed))
+    # Columns whose values are still needed
+    tracked = list(profiles)
+    row_count = 0
+    for chunk in reader.chunks(CHUNK_ROWS):
+        row_count += len(chunk)
+        rows = [row for _, row in chunk]
+        reservoir.extend(rows)
+        for profile in tracked:
+            profile.add([row[profile.name] for row in rows])
+        tracked = [profile for profile in tracked if profile.tracking]
+
+    for profile in profiles:
+        values = [row[profile.name] for row in reservoir.items]
+        profile.infer(pd.Series([value for value in values if not is_blank(value)], dtype=object))
+    return profiles, row_count
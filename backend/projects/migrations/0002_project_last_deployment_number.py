@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        ('deployments', '0006_deployment_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='last_deployment_number',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        # Start each project's sequence after the highest DEP-<number> it has
+        migrations.RunSQL(
+            """
+            UPDATE projects_project AS project
+            SET last_deployment_number = numbers.last
+            FROM (
+                SELECT project_id,
+                       max(substring(deployment_id FROM '^DEP-([0-9]{1,15})$')::bigint) AS last
+                FROM deployments_deployment
+                GROUP BY project_id
+            ) AS numbers
+            WHERE numbers.project_id = project.id AND numbers.last IS NOT NULL
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
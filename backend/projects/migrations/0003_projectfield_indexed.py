@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_project_last_deployment_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectfield',
+            name='indexed',
+            field=models.BooleanField(default=False),
+        ),
+        # Number and date fields were all indexed until indexing became opt-in
+        migrations.RunSQL(
+            "UPDATE projects_projectfield SET indexed = true WHERE field_type IN ('number', 'date')",
+            migrations.RunSQL.noop,
+        ),
+    ]
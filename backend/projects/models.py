@@ -8,7 +8,19 @@ class Project(models.Model):
     updated_date = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='projects')
     expected_count = models.IntegerField(default=0)
-    
+    # Number in the last deployment ID handed out (see deployments/sequence.py)
+    last_deployment_number = models.PositiveBigIntegerField(default=0)
+
+    def save(self, *args, **kwargs):
+        # The counter is only moved in SQL. Saving a project loaded before an
+        # import must not write back the old number
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'last_deployment_number'
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -27,6 +39,9 @@ class ProjectField(models.Model):
     is_required = models.BooleanField(default=False)
     order = models.IntegerField(default=0)
     options = models.JSONField(null=True, blank=True)  # For dropdown options
+    # Number and date fields only: range filters and sorting get an index,
+    # built by manage.py index_custom_fields
+    indexed = models.BooleanField(default=False)
     
     def __str__(self):
         return f"{self.project.name} - {self.name}"
\ No newline at end of file
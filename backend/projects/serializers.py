@@ -4,7 +4,7 @@ from .models import Project, ProjectField
 class ProjectFieldSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProjectField
-        fields = ['id', 'name', 'field_type', 'is_required', 'order', 'options']
+        fields = ['id', 'name', 'field_type', 'is_required', 'order', 'options', 'indexed']
 
 class ProjectSerializer(serializers.ModelSerializer):
     fields = ProjectFieldSerializer(many=True, read_only=True)
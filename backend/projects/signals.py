@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Project, ProjectField
+from .stats import invalidate_project_stats
+
+
+@receiver([post_save, post_delete], sender='deployments.Deployment')
+def deployment_changed(sender, instance, **kwargs):
+    # Wait for the commit so a concurrent request cannot re-cache old counts
+    transaction.on_commit(lambda: invalidate_project_stats(instance.project_id))
+
+
+@receiver(post_save, sender=Project)
+def project_changed(sender, instance, **kwargs):
+    # expected_count is part of the cached stats
+    transaction.on_commit(lambda: invalidate_project_stats(instance.id))
+
+
+@receiver([post_save, post_delete], sender=ProjectField)
+def project_field_changed(sender, instance, **kwargs):
+    # Fields are part of the project's (and its deployments') responses, so
+    # move updated_date on for the ETags in backend/conditional.py
+    Project.objects.filter(pk=instance.project_id).update(updated_date=timezone.now())
@@ -0,0 +1,119 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from deployments import reference
+from deployments.models import Deployment
+
+
+# by_status, by_technician and by_department are cached with IDs only and
+# named from the reference tables when read, so renames show at once
+GROUPS = [
+    ('by_status', 'status_id', reference.statuses),
+    ('by_technician', 'technician_id', reference.technicians),
+    ('by_department', 'department_id', reference.departments),
+]
+
+
+def stats_cache_key(project_id, statuses_version):
+    # Changing which statuses count as completed changes the status table's
+    # version, and so every project's key
+    return f'project-stats:{project_id}:{statuses_version}'
+
+
+def invalidate_project_stats(*project_ids):
+    version = reference.statuses.version()
+    cache.delete_many([stats_cache_key(project_id, version) for project_id in project_ids])
+
+
+def compute_project_stats(projects):
+    """
+    Progress figures for several projects from two GROUP BY queries over
+    Deployment: one by (project, status, technician, department) and one by
+    (project, deployment_date).
+    """
+    stats = {
+        project.id: {
+            'project': project.id,
+            'expected_count': project.expected_count,
+            'total': 0,
+            'completed': 0,
+            'completion_percentage': None,
+            'by_status': {},
+            'by_technician': {},
+            'by_department': {},
+            'per_day': [],
+        }
+        for project in projects
+    }
+
+    groups = (
+        Deployment.objects.filter(project_id__in=stats)
+        .values('project_id', 'status_id', 'technician_id', 'department_id')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    completed = set(reference.completed_status_ids())
+    for group in groups:
+        project_stats = stats[group['project_id']]
+        count = group['count']
+        project_stats['total'] += count
+        if group['status_id'] in completed:
+            project_stats['completed'] += count
+
+        for key, id_field, _ in GROUPS:
+            entry = project_stats[key].setdefault(group[id_field], {'id': group[id_field], 'count': 0})
+            entry['count'] += count
+
+    days = (
+        Deployment.objects.filter(project_id__in=stats, deployment_date__isnull=False)
+        .values('project_id', 'deployment_date')
+        .annotate(count=Count('id'))
+        .order_by('project_id', 'deployment_date')
+    )
+    for day in days:
+        stats[day['project_id']]['per_day'].append(
+            {'date': day['deployment_date'], 'count': day['count']}
+        )
+
+    for project_stats in stats.values():
+        for key, _, _ in GROUPS:
+            project_stats[key] = sorted(project_stats[key].values(), key=lambda e: -e['count'])
+        target = project_stats['expected_count'] or project_stats['total']
+        if target:
+            project_stats['completion_percentage'] = round(100 * project_stats['completed'] / target, 1)
+
+    return stats
+
+
+def with_names(project_stats):
+    """A copy of cached stats with the current name of each group"""
+    named = dict(project_stats)
+    for key, _, table in GROUPS:
+        named[key] = [{**entry, 'name': table.name_of(entry['id'])} for entry in project_stats[key]]
+    return named
+
+
+def get_project_stats(projects):
+    """Stats keyed by project id, served from the cache where possible"""
+    projects = list(projects)
+    version = reference.statuses.version()
+    keys = {project.id: stats_cache_key(project.id, version) for project in projects}
+    cached = cache.get_many(list(keys.values()))
+    stats = {}
+    missing = []
+    for project in projects:
+        if keys[project.id] in cached:
+            stats[project.id] = cached[keys[project.id]]
+        else:
+            missing.append(project)
+
+    if missing:
+        fresh = compute_project_stats(missing)
+        cache.set_many(
+            {keys[project_id]: value for project_id, value in fresh.items()},
+            settings.PROJECT_STATS_CACHE_TIMEOUT
+        )
+        stats.update(fresh)
+
+    return {project_id: with_names(project_stats) for project_id, project_stats in stats.items()}
@@ -1,3 +1,441 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import random
+import time
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from backend.spreadsheets import SpreadsheetReader
+from backend.staging import UploadNotFound, get_upload, stage_upload
+from deployments import reference
+from deployments.jobs import claim_next_job, process_import_job
+from deployments.models import Deployment, DeploymentStatus, Technician
+from deployments.tests import reset_reference_cache
+from .analysis import Reservoir, profile_columns
+from .models import Project, ProjectField
+
+
+SHEET = {
+    'Assigned To': ['Ann', 'Bob', 'Cy', 'Di', 'Ed', 'Flo'],
+    'Cost': [10, 12.5, None, 8, 9, 11],
+    'Warranty': [datetime.datetime(2026, 1, i) for i in range(1, 7)],
+    'Building': ['HQ'] * 6,
+}
+
+
+def excel_upload(data, name='sheet.xlsx'):
+    buffer = io.BytesIO()
+    pd.DataFrame(data).to_excel(buffer, index=False)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+def csv_upload(data, name='sheet.csv'):
+    return SimpleUploadedFile(name, pd.DataFrame(data).to_csv(index=False).encode())
+
+
+class SpreadsheetReaderTests(APITestCase):
+
+    def test_xlsx_rows_are_read_lazily_with_line_numbers(self):
+        reader = SpreadsheetReader(excel_upload(SHEET))
+        self.assertEqual(reader.columns, list(SHEET))
+
+        rows = list(reader.rows())
+        self.assertEqual(len(rows), 6)
+        line_number, row = rows[2]
+        self.assertEqual(line_number, 4)
+        self.assertIsNone(row['Cost'])
+        self.assertEqual(row['Warranty'], datetime.datetime(2026, 1, 3))
+
+    def test_csv_chunks(self):
+        reader = SpreadsheetReader(csv_upload(SHEET))
+        chunks = list(reader.chunks(4))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 2])
+        self.assertEqual(chunks[1][1][1]['Assigned To'], 'Flo')
+
+    def test_header_names(self):
+        data = {
+            ' Cost ': [1], 'Unnamed: 1': [2], datetime.datetime(2026, 1, 1): [3], 2026: [4],
+        }
+        reader = SpreadsheetReader(excel_upload(data))
+        self.assertEqual(reader.columns, [' Cost ', 'Unnamed: 1', '2026-01-01 00:00:00', '2026'])
+        self.assertEqual(list(reader.rows()), [(2, {
+            ' Cost ': 1, 'Unnamed: 1': 2, '2026-01-01 00:00:00': 3, '2026': 4
+        })])
+
+        reader = SpreadsheetReader(csv_upload({'Site': [1], '': [2], 'Site ': [3], 'Site.1': [4]}))
+        self.assertEqual(reader.columns, ['Site', 'Unnamed: 1', 'Site ', 'Site.1'])
+
+
+class StagingDirMixin:
+    """Stage uploads (and store import job files) in a temporary directory"""
+
+    def setUp(self):
+        super().setUp()
+        self.staging_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            UPLOAD_STAGING_DIR=self.staging_dir, MEDIA_ROOT=self.staging_dir
+        )
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        super().tearDown()
+
+
+class ProjectExcelTests(StagingDirMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', is_staff=True)
+        DeploymentStatus.objects.create(name='Pending', order=1)
+
+    def setUp(self):
+        super().setUp()
+        reset_reference_cache()
+        self.client.force_authenticate(self.user)
+
+    def test_analyze_excel(self):
+        response = self.client.post(
+            '/api/projects/analyze_excel/', {'file': excel_upload(SHEET)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['row_count'], 6)
+        types = {column['name']: column['field_type'] for column in response.data['columns']}
+        self.assertEqual(types, {
+            'Assigned To': 'text', 'Cost': 'number', 'Warranty': 'date', 'Building': 'dropdown'
+        })
+
+    def test_create_with_excel(self):
+        response = self.client.post('/api/projects/create_with_excel/', {
+            'name': 'Refresh', 'description': '', 'file': excel_upload(SHEET)
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        fields = ProjectField.objects.filter(project_id=response.data['project_id']).order_by('order')
+        self.assertEqual([(f.name, f.field_type, f.options) for f in fields], [
+            ('Assigned To', 'text', None), ('Cost', 'number', None), ('Warranty', 'date', None),
+            ('Building', 'dropdown', ['HQ'])
+        ])
+
+    def test_create_with_excel_is_batched(self):
+        wide = {f'Column {i}': [i, i + 1] for i in range(120)}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/projects/create_with_excel/', {
+                'name': 'Wide', 'file': excel_upload(wide)
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        project = Project.objects.get(pk=response.data['project_id'])
+        # No description sent
+        self.assertEqual(project.description, '')
+        self.assertEqual(project.fields.count(), 120)
+        field_inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "projects_projectfield"')]
+        self.assertEqual(len(field_inserts), 1)
+
+    def test_create_with_excel_builds_no_indexes(self):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/projects/create_with_excel/', {
+                'name': 'Refresh', 'file': excel_upload(SHEET)
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse([q for q in queries if 'CREATE INDEX' in q['sql']])
+
+    def test_create_with_excel_imports_rows(self):
+        response = self.client.post('/api/projects/create_with_excel/', {
+            'name': 'Refresh', 'file': excel_upload(SHEET), 'import_rows': 'true', 'background': 'false'
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_created'], 6)
+        deployment = Deployment.objects.get(project_id=response.data['project_id'], assigned_to='Flo')
+        self.assertEqual(
+            dict(deployment.fields.values_list('field__name', 'value'))['Warranty'], '2026-01-06'
+        )
+
+    def test_create_with_excel_queues_import(self):
+        response = self.client.post('/api/projects/create_with_excel/', {
+            'name': 'Refresh', 'file': csv_upload(SHEET), 'import_rows': 'true', 'background': 'true'
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['job']['status'], 'queued')
+
+        process_import_job(claim_next_job().id)
+        self.assertEqual(Deployment.objects.filter(project_id=response.data['project_id']).count(), 6)
+
+    def test_create_with_excel_is_all_or_nothing(self):
+        DeploymentStatus.objects.all().delete()
+        reset_reference_cache()
+        response = self.client.post('/api/projects/create_with_excel/', {
+            'name': 'Refresh', 'file': excel_upload(SHEET), 'import_rows': 'true', 'background': 'false'
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Project.objects.exists())
+        self.assertFalse(ProjectField.objects.exists())
+
+    def test_create_with_excel_queues_with_the_project(self):
+        request = {'name': 'Refresh', 'import_rows': 'true', 'background': 'true'}
+        with mock.patch('projects.views.enqueue_import') as enqueue, \
+                mock.patch('projects.views.ProjectField.objects.bulk_create', side_effect=ValueError):
+            response = self.client.post('/api/projects/create_with_excel/', {
+                **request, 'file': csv_upload(SHEET)
+            }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        enqueue.assert_not_called()
+
+        with mock.patch('projects.views.enqueue_import', side_effect=OSError('disk full')):
+            response = self.client.post('/api/projects/create_with_excel/', {
+                **request, 'file': csv_upload(SHEET)
+            }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Project.objects.exists())
+
+    def test_import_csv(self):
+        project = Project.objects.create(name='Refresh', created_by=self.user)
+        ProjectField.objects.create(project=project, name='building', field_type='text')
+
+        response = self.client.post(f'/api/projects/{project.id}/import_excel/', {
+            'file': csv_upload(SHEET), 'background': 'false'
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_created'], 6)
+        deployment = Deployment.objects.get(project=project, assigned_to='Flo')
+        self.assertEqual(deployment.deployment_id, 'DEP-0006')
+        self.assertEqual(deployment.fields.get().value, 'HQ')
+
+    def test_import_normalizes_text_values(self):
+        project = Project.objects.create(name='Refresh', created_by=self.user)
+        ProjectField.objects.create(project=project, name='Ordered', field_type='date')
+        ProjectField.objects.create(project=project, name='Price', field_type='number')
+
+        response = self.client.post(f'/api/projects/{project.id}/import_excel/', {
+            'file': csv_upload({'Ordered': ['03/15/2026'], 'Price': ['$1,200']}), 'background': 'false'
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        values = dict(Deployment.objects.get(project=project).fields.values_list('field__name', 'value'))
+        self.assertEqual(values, {'Ordered': '2026-03-15', 'Price': '1200.0'})
+
+
+class ColumnInferenceTests(APITestCase):
+
+    def profile(self, data, **kwargs):
+        profiles, row_count = profile_columns(SpreadsheetReader(csv_upload(data)), **kwargs)
+        return {profile.name: profile for profile in profiles}, row_count
+
+    def test_types_of_text_cells(self):
+        count = 40
+        profiles, _ = self.profile({
+            'Price': ['$1,200.50', '15', '7.25', '3,000'] * (count // 4),
+            'Ordered': ['03/15/2026', '12/01/2025', '01/31/2026', '07/04/2026'] * (count // 4),
+            'Imaged': ['Yes', 'no', 'YES', 'No'] * (count // 4),
+            'Site': ['North', 'South'] * (count // 2),
+            'Notes': [f'note {i}' for i in range(count)],
+        })
+        self.assertEqual(
+            {name: profile.field_type for name, profile in profiles.items()},
+            {'Price': 'number', 'Ordered': 'date', 'Imaged': 'checkbox', 'Site': 'dropdown', 'Notes': 'text'}
+        )
+        self.assertEqual(profiles['Price'].confidence, 1.0)
+        self.assertEqual(profiles['Notes'].confidence, 1.0)
+        self.assertEqual(profiles['Site'].options, ['North', 'South'])
+        self.assertIsNone(profiles['Notes'].options)
+
+    def test_mostly_numeric_column_stays_text(self):
+        profiles, _ = self.profile({'Cost': [str(i) for i in range(18)] + ['n/a', 'tbd']})
+        self.assertEqual(profiles['Cost'].field_type, 'text')
+        self.assertEqual(profiles['Cost'].confidence, 0.1)
+
+    def test_types_are_inferred_from_a_sample(self):
+        rows = 3000
+        profiles, row_count = self.profile({
+            'Serial': [f'SN{i}' for i in range(rows)], 'Cost': list(range(rows))
+        }, sample_rows=200)
+        self.assertEqual(row_count, rows)
+        self.assertEqual(profiles['Cost'].field_type, 'number')
+
+    def test_reservoir_is_uniform(self):
+        reservoir = Reservoir(100, random.Random(1))
+        for start in range(0, 10000, 300):
+            reservoir.extend(list(range(start, min(start + 300, 10000))))
+        self.assertEqual(len(reservoir.items), 100)
+        self.assertEqual(len(set(reservoir.items)), 100)
+        # Items from the whole stream, not just its start
+        self.assertGreater(sum(1 for i in reservoir.items if i >= 5000), 30)
+        self.assertGreater(sum(1 for i in reservoir.items if i < 5000), 30)
+
+
+class ProjectStatsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', is_staff=True)
+        cls.pending = DeploymentStatus.objects.create(name='Pending', order=1)
+        cls.completed = DeploymentStatus.objects.create(name='Completed', order=2, is_completed=True)
+        cls.project = Project.objects.create(name='Refresh', created_by=cls.user, expected_count=4)
+        cls.other = Project.objects.create(name='Other', created_by=cls.user)
+        for i, status in enumerate([cls.pending, cls.completed, cls.completed]):
+            Deployment.objects.create(
+                project=cls.project, deployment_id=f'DEP-{i}', status=status,
+                deployment_date=datetime.date(2026, 3, 1 + i // 2)
+            )
+        Deployment.objects.create(project=cls.other, deployment_id='DEP-0', status=cls.completed)
+
+    def setUp(self):
+        reset_reference_cache()
+        self.client.force_authenticate(self.user)
+
+    def test_project_stats(self):
+        reference.statuses.all()
+        # project + status/technician/department groups + per-day groups
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/projects/{self.project.id}/stats/')
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(response.data['completed'], 2)
+        self.assertEqual(response.data['completion_percentage'], 50.0)
+        self.assertEqual(
+            [(s['name'], s['count']) for s in response.data['by_status']],
+            [('Completed', 2), ('Pending', 1)]
+        )
+        self.assertEqual([d['count'] for d in response.data['per_day']], [2, 1])
+
+        # Served from the cache until a deployment in the project changes
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/projects/{self.project.id}/stats/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Deployment.objects.create(project=self.project, deployment_id='DEP-9', status=self.completed)
+        response = self.client.get(f'/api/projects/{self.project.id}/stats/')
+        self.assertEqual(response.data['completed'], 3)
+
+    def test_completion_follows_the_status_flag(self):
+        self.client.get(f'/api/projects/{self.project.id}/stats/')
+        self.completed.name = 'Done'
+        self.completed.save()
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.id}/stats/').data['completed'], 2)
+
+        self.pending.is_completed = True
+        self.pending.save()
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.id}/stats/').data['completed'], 3)
+
+    def test_cached_stats_show_current_names(self):
+        technician = Technician.objects.create(username='tech', name='Tech One')
+        Deployment.objects.filter(project=self.project).update(technician=technician)
+        url = f'/api/projects/{self.project.id}/stats/'
+        self.assertEqual(self.client.get(url).data['by_technician'][0]['name'], 'Tech One')
+
+        technician.name = 'Tech Two'
+        technician.save()
+        self.assertEqual(self.client.get(url).data['by_technician'][0]['name'], 'Tech Two')
+
+    def test_multi_project_stats(self):
+        response = self.client.get('/api/projects/stats/', {'ids': f'{self.project.id},{self.other.id}'})
+        self.assertEqual([s['total'] for s in response.data], [3, 1])
+        self.assertEqual(response.data[1]['completion_percentage'], 100.0)
+
+
+class UploadStagingTests(StagingDirMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', is_staff=True)
+        DeploymentStatus.objects.create(name='Pending', order=1)
+
+    def setUp(self):
+        super().setUp()
+        reset_reference_cache()
+        self.client.force_authenticate(self.user)
+
+    def stage(self, upload):
+        response = self.client.post('/api/projects/upload/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return response.data['upload_id']
+
+    def test_same_file_is_staged_once(self):
+        # The same bytes: xlsx files embed the time they were written
+        content = excel_upload(SHEET).read()
+        upload_id = self.stage(SimpleUploadedFile('sheet.xlsx', content))
+        self.assertEqual(self.stage(SimpleUploadedFile('sheet.xlsx', content)), upload_id)
+        self.assertNotEqual(self.stage(csv_upload(SHEET)), upload_id)
+
+        upload = get_upload(upload_id)
+        self.assertEqual(upload.columns, list(SHEET))
+        self.assertEqual(upload.row_count, 6)
+        rows = list(upload.reader().rows())
+        self.assertEqual(rows[0], (2, {
+            'Assigned To': 'Ann', 'Cost': 10, 'Warranty': datetime.datetime(2026, 1, 1), 'Building': 'HQ'
+        }))
+
+    def test_later_steps_skip_parsing(self):
+        response = self.client.post(
+            '/api/projects/analyze_excel/', {'file': excel_upload(SHEET)}, format='multipart'
+        )
+        upload_id = response.data['upload_id']
+
+        with mock.patch('backend.staging.SpreadsheetReader', side_effect=AssertionError), \
+                mock.patch('deployments.jobs.SpreadsheetReader', side_effect=AssertionError):
+            response = self.client.post(
+                '/api/projects/analyze_excel/', {'upload_id': upload_id}, format='multipart'
+            )
+            self.assertEqual(response.data['row_count'], 6)
+
+            response = self.client.post('/api/projects/create_with_excel/', {
+                'name': 'Refresh', 'description': '', 'upload_id': upload_id
+            }, format='multipart')
+            self.assertEqual(response.status_code, 201)
+            project_id = response.data['project_id']
+            self.assertEqual(ProjectField.objects.filter(project_id=project_id).count(), 4)
+
+            response = self.client.post(f'/api/projects/{project_id}/import_excel/', {
+                'upload_id': upload_id, 'background': 'false'
+            }, format='multipart')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['total_created'], 6)
+
+    def test_background_import_from_upload(self):
+        project = Project.objects.create(name='Refresh', created_by=self.user)
+        upload_id = self.stage(csv_upload(SHEET))
+
+        response = self.client.post(f'/api/projects/{project.id}/import_excel/', {
+            'upload_id': upload_id, 'background': 'true'
+        }, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        # The job has its own copy of the file, so it survives the upload expiring
+        shutil.rmtree(os.path.join(self.staging_dir, upload_id))
+
+        process_import_job(claim_next_job().id)
+        self.assertEqual(Deployment.objects.filter(project=project).count(), 6)
+
+    def test_unknown_upload(self):
+        for upload_id in ['0' * 64, '../etc']:
+            response = self.client.post(
+                '/api/projects/analyze_excel/', {'upload_id': upload_id}, format='multipart'
+            )
+            self.assertEqual(response.status_code, 404)
+        self.assertFalse(Project.objects.exists())
+
+    def test_date_headers_are_staged(self):
+        upload = stage_upload(excel_upload({datetime.datetime(2026, 1, 1): [1, 2]}))
+        self.assertEqual(get_upload(upload.id).columns, ['2026-01-01 00:00:00'])
+
+    def test_eviction(self):
+        old = stage_upload(excel_upload(SHEET))
+        stale = time.time() - 3600
+        os.utime(os.path.join(old.path, 'meta.json'), (stale, stale))
+
+        with override_settings(UPLOAD_STAGING_TTL=60):
+            recent = stage_upload(csv_upload(SHEET))
+        with self.assertRaises(UploadNotFound):
+            get_upload(old.id)
+
+        # Over the size limit, the least recently used upload goes first
+        with override_settings(UPLOAD_STAGING_MAX_BYTES=recent.size + 1):
+            newest = stage_upload(csv_upload({'Serial': ['A1', 'B2']}))
+        with self.assertRaises(UploadNotFound):
+            get_upload(recent.id)
+        self.assertEqual(get_upload(newest.id).row_count, 2)
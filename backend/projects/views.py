@@ -4,15 +4,57 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import Project, ProjectField
 from .serializers import ProjectSerializer, ProjectFieldSerializer
+from .analysis import profile_columns
+from .stats import get_project_stats
+import datetime
 import pandas as pd
 from django.http import HttpResponse
 from django.contrib.auth.models import User
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+from backend.conditional import ConditionalGetMixin
 from backend.permissions import IsAdminUser
+from backend.pagination import LookupPagination
+from backend.staging import UploadNotFound, get_upload, request_upload, stage_upload
+from deployments import history, reference
+from deployments.importers import ImportFailed
+from deployments.jobs import (
+    enqueue_import, import_job_accepted, import_job_info, requested_upsert_key, run_import, wants_background
+)
 
-class ProjectViewSet(viewsets.ModelViewSet):
+# Longest date range the history reports cover
+MAX_REPORT_DAYS = 731
+
+
+def report_range(request, project):
+    """
+    The (start, end) dates of a history report from ?from= and ?to=
+    (YYYY-MM-DD). By default from the project's creation, or the last
+    MAX_REPORT_DAYS days, to today. Raises ValueError if they are invalid.
+    """
+    try:
+        start, end = (
+            datetime.date.fromisoformat(value) if value else None
+            for value in (request.query_params.get('from'), request.query_params.get('to'))
+        )
+    except ValueError:
+        raise ValueError("from and to must be dates (YYYY-MM-DD)")
+    end = end or timezone.localdate()
+    if not start:
+        start = max(timezone.localdate(project.created_date), end - datetime.timedelta(days=MAX_REPORT_DAYS - 1))
+        start = min(start, end)
+    if start > end:
+        raise ValueError("from must not be after to")
+    if (end - start).days >= MAX_REPORT_DAYS:
+        raise ValueError(f"Reports cover at most {MAX_REPORT_DAYS} days")
+    return start, end
+
+
+class ProjectViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
+    pagination_class = LookupPagination
     
     def get_permissions(self):
         """
@@ -28,69 +70,180 @@ class ProjectViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def create_with_excel(self, request):
-        """Create a project with an Excel file"""
+        """
+        Create a project with a field for each column of an Excel file. With
+        import_rows=true the rows are imported as deployments too, from the
+        same parsed copy of the file. Nothing is saved unless it all succeeds.
+        """
         name = request.data.get('name')
-        description = request.data.get('description')
-        expected_count = request.data.get('expected_count', 0)
-        file_obj = request.FILES.get('file')
+        description = request.data.get('description') or ''
+        import_rows = str(request.data.get('import_rows', '')).lower() in ('1', 'true', 'yes')
         
         if not name:
             return Response({"error": "Project name is required"}, status=status.HTTP_400_BAD_REQUEST)
-            
-        # Create the project
-        project = Project.objects.create(
-            name=name,
-            description=description,
-            expected_count=expected_count,
-            created_by=request.user
-        )
         
-        if file_obj:
-            try:
-                # Read Excel file
-                df = pd.read_excel(file_obj)
-                
-                # Get column headers
-                columns = df.columns.tolist()
+        try:
+            expected_count = int(request.data.get('expected_count') or 0)
+        except (TypeError, ValueError):
+            return Response({"error": "expected_count must be an integer"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        # The sheet is sent as `file`, or as the upload_id from analyze_excel
+        try:
+            upload = request_upload(request)
+        except UploadNotFound:
+            return Response({"error": "Upload not found or expired"}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({"error": f"Excel processing error: {str(e)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        if import_rows and not upload:
+            return Response({"error": "An Excel file is required to import rows"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        result = {}
+        job = None
+        try:
+            with transaction.atomic():
+                project = Project.objects.create(
+                    name=name,
+                    description=description,
+                    expected_count=expected_count,
+                    created_by=request.user
+                )
                 
-                # Create project fields based on Excel columns
-                for idx, col_name in enumerate(columns):
-                    # Try to determine field type based on data
-                    col_data = df[col_name].dropna()
-                    if len(col_data) == 0:
-                        field_type = 'text'  # Default to text if no data
-                    elif pd.api.types.is_numeric_dtype(col_data):
-                        field_type = 'number'
-                    elif pd.api.types.is_datetime64_dtype(col_data):
-                        field_type = 'date'
-                    else:
-                        field_type = 'text'
+                if upload:
+                    # The same inference as analyze_excel, worked out once per upload
+                    profiles, _ = upload.cached('column_profiles', profile_columns)
+                    ProjectField.objects.bulk_create([
+                        ProjectField(
+                            project=project,
+                            name=profile.name,
+                            field_type=profile.field_type,
+                            is_required=False,
+                            order=idx,
+                            options=profile.options
+                        )
+                        for idx, profile in enumerate(profiles)
+                    ])
                     
-                    # Create the project field
-                    ProjectField.objects.create(
-                        project=project,
-                        name=col_name,
-                        field_type=field_type,
-                        is_required=False,
-                        order=idx
-                    )
-                
-                return Response({
-                    "message": "Project created successfully with Excel columns",
-                    "project_id": project.id,
-                    "columns": columns
-                }, status=status.HTTP_201_CREATED)
-                
-            except Exception as e:
-                # If Excel processing fails, delete the project and return error
-                project.delete()
-                return Response({"error": f"Excel processing error: {str(e)}"}, 
-                                status=status.HTTP_400_BAD_REQUEST)
+                    if import_rows and wants_background(request, settings.IMPORT_IN_BACKGROUND):
+                        # Committed with the project, so the worker only sees it once both are
+                        job = enqueue_import(project, 'project', None, {'upload_id': upload.id},
+                                             user=request.user)
+                    elif import_rows:
+                        importer = run_import(project, 'project', None, {'upload_id': upload.id})
+                        result["total_created"] = importer.created
+                        if importer.errors:
+                            result["errors"] = importer.errors
+        except Exception as e:
+            if job is not None:
+                # The job's row was rolled back, but not the copy of the file it stored
+                job.file.delete(save=False)
+            if isinstance(e, ImportFailed):
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"error": f"Excel processing error: {str(e)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        if job is not None:
+            result.update(import_job_info(job, request))
+        
+        if upload:
+            return Response({
+                "message": "Project created successfully with Excel columns",
+                "project_id": project.id,
+                "columns": upload.columns,
+                "upload_id": upload.id,
+                **result
+            }, status=status.HTTP_201_CREATED)
         
         # If no file, just return the created project
         serializer = ProjectSerializer(project)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Deployment counts and progress for one project"""
+        project = self.get_object()
+        return Response(get_project_stats([project])[project.id])
+    
+    @action(detail=False, methods=['get'], url_path='stats')
+    def multi_stats(self, request):
+        """Deployment counts and progress for several projects (?ids=1,2,3) or all of them"""
+        projects = self.get_queryset()
+        ids = request.query_params.get('ids')
+        if ids:
+            try:
+                projects = projects.filter(pk__in=[int(pk) for pk in ids.split(',') if pk])
+            except ValueError:
+                return Response({"error": "ids must be a comma-separated list of project IDs"},
+                                status=status.HTTP_400_BAD_REQUEST)
+        
+        projects = list(projects.order_by('id'))
+        stats = get_project_stats(projects)
+        return Response([stats[project.id] for project in projects])
+    
+    @action(detail=True, methods=['get'])
+    def burndown(self, request, pk=None):
+        """Per day: deployments in the project, completed and remaining (?from=&to=)"""
+        project = self.get_object()
+        try:
+            start, end = report_range(request, project)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'expected_count': project.expected_count,
+            'days': history.burndown(project, start, end, reference.completed_status_ids()),
+        })
+    
+    @action(detail=True, methods=['get'])
+    def throughput(self, request, pk=None):
+        """
+        Deployments each technician moved into a completed status per day
+        (?from=&to=); with ?status= into that status instead
+        """
+        project = self.get_object()
+        try:
+            start, end = report_range(request, project)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        status_id = request.query_params.get('status')
+        if status_id:
+            target = reference.statuses.get(status_id)
+            if target is None:
+                return Response({"error": "Status not found"}, status=status.HTTP_404_NOT_FOUND)
+            status_ids = [target.id]
+        else:
+            status_ids = reference.completed_status_ids()
+        
+        return Response({
+            'statuses': status_ids,
+            'from': start,
+            'to': end,
+            'technicians': history.throughput(project, start, end, status_ids),
+        })
+    
+    @action(detail=True, methods=['get'])
+    def time_in_status(self, request, pk=None):
+        """
+        Average time deployments spent in each status, of those that left it
+        between ?from= and ?to= (optionally only ?technician=)
+        """
+        project = self.get_object()
+        try:
+            start, end = report_range(request, project)
+            technician_id = int(request.query_params.get('technician') or 0) or None
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'from': start,
+            'to': end,
+            'statuses': history.time_in_status(project, start, end, technician_id),
+        })
+    
     @action(detail=True, methods=['post'])
     def add_field(self, request, pk=None):
         """Add a new field to the project"""
@@ -145,70 +298,61 @@ class ProjectViewSet(viewsets.ModelViewSet):
             return Response({"error": "Field not found"}, 
                             status=status.HTTP_404_NOT_FOUND)
     
-    @action(detail=True, methods=['post'])
-    def import_excel(self, request, pk=None):
-        """Import Excel data into an existing project"""
-        project = self.get_object()
+    @action(detail=False, methods=['post'])
+    def upload(self, request):
+        """Stage a spreadsheet for analyze_excel, create_with_excel and import_excel"""
         file_obj = request.FILES.get('file')
-    
-        if not file_obj:
-            return Response({"error": "Excel file is required"}, status=status.HTTP_400_BAD_REQUEST)
-    
-        try:
-            # Read Excel file
-            df = pd.read_excel(file_obj)
         
-            # Process data and create deployments
-            # You may want to adapt this based on your specific needs
+        if not file_obj:
+            return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
         
-            return Response({
-                "message": "Excel data imported successfully",
-                "rows_processed": len(df)
-            })
+        try:
+            upload = stage_upload(file_obj)
         except Exception as e:
-            return Response({"error": f"Error processing Excel file: {str(e)}"}, 
+            return Response({"error": f"Excel processing error: {str(e)}"},
                             status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            "upload_id": upload.id,
+            "name": upload.name,
+            "columns": upload.columns,
+            "row_count": upload.row_count
+        }, status=status.HTTP_201_CREATED)
     
     @action(detail=False, methods=['post'])
     def analyze_excel(self, request):
-        """Analyze Excel file and return column information without importing"""
-        file_obj = request.FILES.get('file')
+        """
+        Analyze Excel file and return column information without importing.
+        The file is staged, so later steps can send the returned upload_id
+        instead of uploading it again.
+        """
+        try:
+            upload = request_upload(request)
+        except UploadNotFound:
+            return Response({"error": "Upload not found or expired"}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({"error": f"Excel processing error: {str(e)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
         
-        if not file_obj:
+        if not upload:
             return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            df = pd.read_excel(file_obj)
-            columns = df.columns.tolist()
+            # Types are inferred from a sample of the staged rows
+            profiles, row_count = upload.cached('column_profiles', profile_columns)
             
-            # Analyze each column
-            column_info = []
-            for col_name in columns:
-                col_data = df[col_name].dropna()
-                
-                # Determine data type
-                if pd.api.types.is_numeric_dtype(col_data):
-                    field_type = 'number'
-                elif pd.api.types.is_datetime64_dtype(col_data):
-                    field_type = 'date'
-                else:
-                    field_type = 'text'
-                    
-                    # Check if it might be a dropdown
-                    unique_values = col_data.unique()
-                    if len(unique_values) <= 10 and len(unique_values) > 0 and len(col_data) > 0:
-                        if len(unique_values) / len(col_data) < 0.2:  # If less than 20% are unique
-                            field_type = 'dropdown'
-                
-                column_info.append({
-                    'name': col_name,
-                    'field_type': field_type,
-                    'sample_values': col_data.head(5).tolist() if len(col_data) > 0 else []
-                })
+            column_info = [{
+                'name': profile.name,
+                'field_type': profile.field_type,
+                'confidence': profile.confidence,
+                'options': profile.options,
+                'sample_values': profile.samples
+            } for profile in profiles]
             
             return Response({
                 "columns": column_info,
-                "row_count": len(df)
+                "row_count": row_count,
+                "upload_id": upload.id
             })
             
         except Exception as e:
@@ -242,103 +386,47 @@ class ProjectViewSet(viewsets.ModelViewSet):
         """Import Excel data into an existing project"""
         project = self.get_object()
         file_obj = request.FILES.get('file')
+        upload_id = request.data.get('upload_id')
     
-        if not file_obj:
+        if not file_obj and not upload_id:
             return Response({"error": "Excel file is required"}, status=status.HTTP_400_BAD_REQUEST)
-    
-        try:
-            # Read Excel file
-            df = pd.read_excel(file_obj)
-        
-            # Get the default deployment status
-            from deployments.models import DeploymentStatus, Deployment
         
+        options = {}
+        if upload_id and not file_obj:
             try:
-                default_status = DeploymentStatus.objects.order_by('order').first()
-                if not default_status:
-                    return Response({"error": "No deployment status found. Please create at least one status."},
-                                status=status.HTTP_400_BAD_REQUEST)
-            except Exception as e:
-                return Response({"error": f"Error getting default status: {str(e)}"},
-                          status=status.HTTP_400_BAD_REQUEST)
-        
-            # Create a mapping of column names to field ids
-            field_map = {}
-            for field in project.fields.all():
-                field_map[field.name] = field.id
-        
-            # Process each row in the Excel file
-            deployments_created = 0
-            errors = []
-        
-            for idx, row in df.iterrows():
-                try:
-                    # Basic deployment data
-                    deployment_data = {
-                        'project': project,
-                        'deployment_id': f"DEP-{idx+1:04d}",
-                        'status': default_status
-                    }
-                
-                    # Map common fields
-                    common_fields = {
-                        'assigned_to': ['Assigned To', 'Assignee', 'User', 'Employee'],
-                        'position': ['Position', 'Title', 'Role', 'Job Title'],
-                        'location': ['Location', 'Office', 'Site', 'Building'],
-                        'current_model': ['Current Model', 'Old Model', 'Existing Model'],
-                        'current_sn': ['Current SN', 'Old SN', 'Existing SN'],
-                        'new_model': ['New Model', 'Model', 'Target Model'],
-                        'new_sn': ['New SN', 'SN', 'Serial Number']
-                    }
-                
-                    # Try to map common fields
-                    for field, possible_names in common_fields.items():
-                        for name in possible_names:
-                            if name in df.columns and pd.notna(row[name]):
-                                deployment_data[field] = str(row[name])
-                                break
-                
-                    # Create the deployment
-                    deployment = Deployment.objects.create(**deployment_data)
-                
-                    # Process custom fields
-                    from deployments.models import DeploymentField
-                
-                    for column in df.columns:
-                        # Skip empty cells
-                        if pd.isna(row[column]):
-                            continue
-                        
-                        # Check if this column matches a project field
-                        field_id = None
-                        for field_name, field_id_value in field_map.items():
-                            if column.lower() == field_name.lower():
-                                field_id = field_id_value
-                                break
-                    
-                        if field_id:
-                            # Create deployment field
-                            DeploymentField.objects.create(
-                                deployment=deployment,
-                                field_id=field_id,
-                                value=str(row[column])
-                            )
-                
-                    deployments_created += 1
-                
-                except Exception as e:
-                    errors.append(f"Error in row {idx+1}: {str(e)}")
+                options['upload_id'] = get_upload(upload_id).id
+            except UploadNotFound:
+                return Response({"error": "Upload not found or expired"}, status=status.HTTP_404_NOT_FOUND)
+        
+        # mode=upsert updates the deployments already imported, matched on `key`
+        try:
+            options['upsert_key'] = requested_upsert_key(request, project)
+        except ImportFailed as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Hand the upload to the import worker unless the client wants to wait
+        if wants_background(request, settings.IMPORT_IN_BACKGROUND):
+            job = enqueue_import(project, 'project', file_obj, options, user=request.user)
+            return import_job_accepted(job, request)
+    
+        try:
+            # Columns matching a project field by name become custom values
+            with transaction.atomic():
+                importer = run_import(project, 'project', file_obj, options)
         
             result = {
-                "message": f"Successfully imported {deployments_created} deployments",
-                "total_created": deployments_created
+                "message": importer.message(),
+                "total_created": importer.created,
+                **importer.counts()
             }
         
-            if errors:
-                result["errors"] = errors
+            if importer.errors:
+                result["errors"] = importer.errors
             
             return Response(result)
         
+        except ImportFailed as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": f"Error processing Excel file: {str(e)}"},
-                        status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+                        status=status.HTTP_400_BAD_REQUEST)
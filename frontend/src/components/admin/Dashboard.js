@@ -18,21 +18,21 @@ const Dashboard = () => {
     // Fetch dashboard statistics
     const fetchStats = async () => {
       try {
-        // In a real application, you might have a dedicated endpoint for these stats
-        // For now, we'll just get the counts from the list endpoints
-        const [projects, deployments, users] = await Promise.all([
-          axios.get('http://localhost:8000/api/projects/'),
-          axios.get('http://localhost:8000/api/deployments/deployments/'),
-          axios.get('http://localhost:8000/api/accounts/users/')
+        // Counts come from the stats endpoints, not from loading the lists
+        const [projects, users] = await Promise.all([
+          axios.get('http://localhost:8000/api/projects/stats/'),
+          axios.get('http://localhost:8000/api/accounts/users/stats/')
         ]);
         
-        // Calculate pending deployments (this is a simplified example)
-        const pending = deployments.data.filter(d => d.status_name === 'Pending' || d.status_name === 'In Progress').length;
+        const deployments = projects.data.reduce((sum, project) => sum + project.total, 0);
+        const pending = projects.data.reduce((sum, project) => sum + project.by_status
+          .filter(status => status.name === 'Pending' || status.name === 'In Progress')
+          .reduce((count, status) => count + status.count, 0), 0);
         
         setStats({
           projects: projects.data.length,
-          deployments: deployments.data.length,
-          users: users.data.length,
+          deployments,
+          users: users.data.total,
           pendingDeployments: pending
         });
       } catch (error) {
@@ -2,11 +2,16 @@
 import React, { useState, useEffect } from 'react';
 import { Container, Row, Col, Card, Table, Button, Modal, Form, Alert, Spinner } from 'react-bootstrap';
 import axios from 'axios';
+import { fetchPage, withPageSize } from '../../utils/pagination';
 import { useAuth } from '../../context/AuthContext';
 
 const UserManagement = () => {
   const [users, setUsers] = useState([]);
+  const [userCount, setUserCount] = useState(null);
+  // URL of the next page of users, null once all are loaded
+  const [nextPage, setNextPage] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState('');
   
   // User form state
@@ -41,8 +46,13 @@ const UserManagement = () => {
     setError('');
     
     try {
-      const { data } = await axios.get('http://localhost:8000/api/accounts/users/');
-      setUsers(data);
+      const [page, { data: stats }] = await Promise.all([
+        fetchPage(withPageSize('http://localhost:8000/api/accounts/users/')),
+        axios.get('http://localhost:8000/api/accounts/users/stats/')
+      ]);
+      setUsers(page.rows);
+      setNextPage(page.next);
+      setUserCount(stats.total);
     } catch (err) {
       console.error('Error fetching users:', err);
       setError('Failed to load users. Please try again.');
@@ -51,6 +61,20 @@ const UserManagement = () => {
     }
   };
   
+  const loadMoreUsers = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(nextPage);
+      setUsers(current => [...current, ...page.rows]);
+      setNextPage(page.next);
+    } catch (err) {
+      console.error('Error fetching users:', err);
+      setError('Failed to load more users. Please try again.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+  
   const handleOpenCreateModal = () => {
     // Reset form
     setUsername('');
@@ -300,6 +324,17 @@ const UserManagement = () => {
                 </tbody>
               </Table>
             )}
+            
+            <div className="d-flex justify-content-between align-items-center mt-3">
+              <span className="text-muted">
+                Showing {users.length}{userCount !== null && ` of ${userCount}`} users
+              </span>
+              {nextPage && (
+                <Button variant="outline-primary" onClick={loadMoreUsers} disabled={loadingMore}>
+                  {loadingMore ? 'Loading...' : 'Load More'}
+                </Button>
+              )}
+            </div>
           </Card.Body>
         </Card>
       )}
@@ -3,6 +3,7 @@ import React, { useState, useEffect } from 'react';
 import { Container, Row, Col, Card, Table, Button, Badge, Spinner, Alert } from 'react-bootstrap';
 import { Link } from 'react-router-dom';
 import axios from 'axios';
+import { fetchPage, withPageSize } from '../../utils/pagination';
 import { useAuth } from '../../context/AuthContext';
 
 const TechnicianDashboard = () => {
@@ -32,25 +33,24 @@ const TechnicianDashboard = () => {
           return;
         }
         
-        // Get deployments assigned to this technician
-        const deploymentsResponse = await axios.get(
-          `http://localhost:8000/api/deployments/deployments/?technician=${currentTech.id}`
-        );
+        // The first few assignments, and the counts from the stats endpoint
+        const [deployments, { data: techStats }] = await Promise.all([
+          fetchPage(withPageSize(
+            `http://localhost:8000/api/deployments/deployments/?technician=${currentTech.id}`, 5
+          )),
+          axios.get(`http://localhost:8000/api/deployments/technicians/${currentTech.id}/stats/`)
+        ]);
+        setAssignedDeployments(deployments.rows);
         
-        const deployments = deploymentsResponse.data;
-        setAssignedDeployments(deployments);
-        
-        // Calculate stats
-        const total = deployments.length;
-        const pending = deployments.filter(d => d.status_name === 'Pending').length;
-        const inProgress = deployments.filter(d => d.status_name === 'In Progress').length;
-        const completed = deployments.filter(d => d.status_name === 'Completed').length;
+        const countOf = (name) => techStats.by_status
+          .filter(status => status.name === name)
+          .reduce((count, status) => count + status.count, 0);
         
         setStats({
-          total,
-          pending,
-          inProgress,
-          completed
+          total: techStats.total,
+          pending: countOf('Pending'),
+          inProgress: countOf('In Progress'),
+          completed: countOf('Completed')
         });
         
       } catch (error) {
@@ -187,7 +187,7 @@ const TechnicianDashboard = () => {
                       </tr>
                     </thead>
                     <tbody>
-                      {assignedDeployments.slice(0, 5).map(deployment => (
+                      {assignedDeployments.map(deployment => (
                         <tr key={deployment.id}>
                           <td>{deployment.deployment_id}</td>
                           <td>{deployment.project_name}</td>
@@ -217,7 +217,7 @@ const TechnicianDashboard = () => {
                     </tbody>
                   </Table>
                   
-                  {assignedDeployments.length > 5 && (
+                  {stats.total > assignedDeployments.length && (
                     <div className="text-center mt-3">
                       <Button as={Link} to="/deployments" variant="outline-primary">
                         View All Assignments
@@ -309,7 +309,7 @@ const DeploymentForm = () => {
                   type="text"
                   value={deploymentId}
                   onChange={(e) => setDeploymentId(e.target.value)}
-                  placeholder="E.g., DEP-001"
+                  placeholder="Leave blank to number it automatically"
                 />
               </Form.Group>
             )}
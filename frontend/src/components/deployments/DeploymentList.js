@@ -1,14 +1,41 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { Container, Row, Col, Table, Button, Form, Card, Badge, Spinner, Alert } from 'react-bootstrap';
 import { Link, useSearchParams } from 'react-router-dom';
 import axios from 'axios';
+import { fetchPage, withPageSize } from '../../utils/pagination';
+import { subscribeToProject } from '../../utils/deploymentEvents';
 import ExcelUploader from './ExcelUploader';
 
+// Deployments matching the list filters according to the project stats, or
+// null when more than one of status, department and technician is set
+const countFromStats = (projectStats, filters) => {
+  const active = [
+    ['by_status', filters.status],
+    ['by_department', filters.department],
+    ['by_technician', filters.technician],
+  ].filter(([, id]) => id);
+  if (active.length > 1) {
+    return null;
+  }
+  return projectStats.reduce((sum, stats) => {
+    if (!active.length) {
+      return sum + stats.total;
+    }
+    const [key, id] = active[0];
+    const entry = stats[key].find(group => String(group.id) === String(id));
+    return sum + (entry ? entry.count : 0);
+  }, 0);
+};
+
 const DeploymentList = () => {
   const [searchParams] = useSearchParams();
   const initialProjectId = searchParams.get('project');
   
   const [deployments, setDeployments] = useState([]);
+  // URL of the next page, null once the list is fully loaded
+  const [nextPage, setNextPage] = useState(null);
+  const nextPageRef = useRef(null);
+  const [totalCount, setTotalCount] = useState(null);
   const [projects, setProjects] = useState([]);
   const [statuses, setStatuses] = useState([]);
   const [departments, setDepartments] = useState([]);
@@ -19,8 +46,10 @@ const DeploymentList = () => {
   const [selectedDepartment, setSelectedDepartment] = useState('');
   const [selectedTechnician, setSelectedTechnician] = useState('');
   const [searchTerm, setSearchTerm] = useState('');
+  const [searchText, setSearchText] = useState('');
   
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState('');
   const [currentProject, setCurrentProject] = useState(null);
   const [showUploader, setShowUploader] = useState(false);
@@ -64,39 +93,85 @@ const DeploymentList = () => {
     fetchReferenceData();
   }, [selectedProject]);
   
+  // Search on the server once typing pauses
+  useEffect(() => {
+    const timer = setTimeout(() => setSearchText(searchTerm.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+  
+  useEffect(() => {
+    nextPageRef.current = nextPage;
+  }, [nextPage]);
+  
+  const deploymentsUrl = useCallback(() => {
+    // Build query params
+    let url = searchText
+      ? 'http://localhost:8000/api/deployments/deployments/search/'
+      : 'http://localhost:8000/api/deployments/deployments/';
+    const params = new URLSearchParams();
+    
+    if (searchText) {
+      params.append('q', searchText);
+    }
+    
+    if (selectedProject) {
+      params.append('project', selectedProject);
+    }
+    
+    if (selectedStatus) {
+      params.append('status', selectedStatus);
+    }
+    
+    if (selectedDepartment) {
+      params.append('department', selectedDepartment);
+    }
+    
+    if (selectedTechnician) {
+      params.append('technician', selectedTechnician);
+    }
+    
+    const queryString = params.toString();
+    if (queryString) {
+      url += `?${queryString}`;
+    }
+    return withPageSize(url);
+  }, [searchText, selectedProject, selectedStatus, selectedDepartment, selectedTechnician]);
+  
+  // Only the first page is loaded; the rest as the user asks for it
+  const loadFirstPage = useCallback(async () => {
+    const page = await fetchPage(deploymentsUrl());
+    setDeployments(page.rows);
+    setNextPage(page.next);
+  }, [deploymentsUrl]);
+  
+  // The number of matching deployments, from the stats endpoints
+  const loadCount = useCallback(async () => {
+    if (searchText) {
+      setTotalCount(null);
+      return;
+    }
+    try {
+      const { data } = await axios.get(selectedProject
+        ? `http://localhost:8000/api/projects/${selectedProject}/stats/`
+        : 'http://localhost:8000/api/projects/stats/');
+      setTotalCount(countFromStats(selectedProject ? [data] : data, {
+        status: selectedStatus,
+        department: selectedDepartment,
+        technician: selectedTechnician,
+      }));
+    } catch (error) {
+      console.error('Error fetching deployment counts:', error);
+      setTotalCount(null);
+    }
+  }, [searchText, selectedProject, selectedStatus, selectedDepartment, selectedTechnician]);
+  
   useEffect(() => {
     const fetchDeployments = async () => {
       setLoading(true);
       setError('');
       
       try {
-        // Build query params
-        let url = 'http://localhost:8000/api/deployments/deployments/';
-        const params = new URLSearchParams();
-        
-        if (selectedProject) {
-          params.append('project', selectedProject);
-        }
-        
-        if (selectedStatus) {
-          params.append('status', selectedStatus);
-        }
-        
-        if (selectedDepartment) {
-          params.append('department', selectedDepartment);
-        }
-        
-        if (selectedTechnician) {
-          params.append('technician', selectedTechnician);
-        }
-        
-        const queryString = params.toString();
-        if (queryString) {
-          url += `?${queryString}`;
-        }
-        
-        const { data } = await axios.get(url);
-        setDeployments(data);
+        await Promise.all([loadFirstPage(), loadCount()]);
       } catch (error) {
         console.error('Error fetching deployments:', error);
         setError('Failed to load deployments');
@@ -106,18 +181,92 @@ const DeploymentList = () => {
     };
     
     fetchDeployments();
-  }, [selectedProject, selectedStatus, selectedDepartment, selectedTechnician]);
+  }, [loadFirstPage, loadCount]);
+  
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(nextPage);
+      setDeployments(current => [...current, ...page.rows]);
+      setNextPage(page.next);
+    } catch (error) {
+      console.error('Error fetching deployments:', error);
+      setError('Failed to load more deployments');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+  
+  // Keep the list current from the project's change events instead of polling
+  useEffect(() => {
+    if (!selectedProject) {
+      return undefined;
+    }
+    
+    let connected = false;
+    let reloadTimer = null;
+    const filtered = Boolean(selectedStatus || selectedDepartment || selectedTechnician || searchText);
+    
+    const reload = () => {
+      // Coalesce bursts of events, e.g. from an import, into one reload
+      // of the first page
+      clearTimeout(reloadTimer);
+      reloadTimer = setTimeout(async () => {
+        try {
+          await Promise.all([loadFirstPage(), loadCount()]);
+        } catch (error) {
+          console.error('Error refreshing deployments:', error);
+        }
+      }, 1000);
+    };
+    
+    const refetch = async (ids) => {
+      try {
+        const responses = await Promise.all(ids.map(id =>
+          axios.get(`http://localhost:8000/api/deployments/deployments/${id}/`)
+        ));
+        const fresh = Object.fromEntries(responses.map(({ data }) => [data.id, data]));
+        setDeployments(current => [
+          ...current.map(deployment => fresh[deployment.id] || deployment),
+          // New deployments sort last, so they only belong in a fully loaded list
+          ...(nextPageRef.current ? [] : responses.map(({ data }) => data).filter(
+            data => !current.some(deployment => deployment.id === data.id)
+          )),
+        ]);
+        loadCount();
+      } catch (error) {
+        reload();
+      }
+    };
+    
+    const close = subscribeToProject(selectedProject, (event) => {
+      if (event.type === 'ready') {
+        // Changes may have been missed while reconnecting
+        if (connected) {
+          reload();
+        }
+        connected = true;
+      } else if (event.type === 'deleted') {
+        setDeployments(current => current.filter(deployment => !event.ids.includes(deployment.id)));
+        loadCount();
+      } else if (event.type === 'reload' || filtered || event.ids.length > 20) {
+        // Filtered lists reload since a changed deployment may no longer match
+        reload();
+      } else {
+        refetch(event.ids);
+      }
+    });
+    
+    return () => {
+      clearTimeout(reloadTimer);
+      close();
+    };
+  }, [loadFirstPage, loadCount, searchText, selectedProject, selectedStatus, selectedDepartment, selectedTechnician]);
   
   const handleUploadSuccess = async () => {
     // Refresh the deployments list
     try {
-      let url = 'http://localhost:8000/api/deployments/deployments/';
-      if (selectedProject) {
-        url += `?project=${selectedProject}`;
-      }
-      
-      const { data } = await axios.get(url);
-      setDeployments(data);
+      await Promise.all([loadFirstPage(), loadCount()]);
       setShowUploader(false);
     } catch (error) {
       console.error('Error refreshing deployments:', error);
@@ -133,23 +282,6 @@ const DeploymentList = () => {
     window.location.href = `http://localhost:8000/api/deployments/deployments/export_excel/?project=${selectedProject}`;
   };
   
-  // Filter deployments by search term
-  const filteredDeployments = deployments.filter(deployment => {
-    if (!searchTerm) return true;
-    
-    const term = searchTerm.toLowerCase();
-    return (
-      deployment.deployment_id.toLowerCase().includes(term) ||
-      deployment.assigned_to?.toLowerCase().includes(term) ||
-      deployment.position?.toLowerCase().includes(term) ||
-      deployment.location?.toLowerCase().includes(term) ||
-      deployment.current_model?.toLowerCase().includes(term) ||
-      deployment.current_sn?.toLowerCase().includes(term) ||
-      deployment.new_model?.toLowerCase().includes(term) ||
-      deployment.new_sn?.toLowerCase().includes(term)
-    );
-  });
-  
   const getStatusBadgeVariant = (statusName) => {
     const statusMap = {
       'Pending': 'warning',
@@ -296,7 +428,7 @@ const DeploymentList = () => {
                 <Form.Label>Search</Form.Label>
                 <Form.Control
                   type="text"
-                  placeholder="Search by ID, name, location, model, etc."
+                  placeholder="Search by serial number, model, user or custom field value"
                   value={searchTerm}
                   onChange={(e) => setSearchTerm(e.target.value)}
                 />
@@ -318,7 +450,7 @@ const DeploymentList = () => {
           <Card>
             <Card.Body>
               <div className="table-responsive">
-                {filteredDeployments.length === 0 ? (
+                {deployments.length === 0 ? (
                   <div className="text-center my-4">
                     <p>No deployments found matching your criteria.</p>
                     <Button 
@@ -344,7 +476,7 @@ const DeploymentList = () => {
                       </tr>
                     </thead>
                     <tbody>
-                      {filteredDeployments.map(deployment => (
+                      {deployments.map(deployment => (
                         <tr key={deployment.id}>
                           <td>{deployment.deployment_id}</td>
                           <td>
@@ -386,9 +518,14 @@ const DeploymentList = () => {
               <div className="d-flex justify-content-between align-items-center mt-3">
                 <div>
                   <span className="text-muted">
-                    Showing {filteredDeployments.length} of {deployments.length} deployments
+                    Showing {deployments.length}{totalCount !== null && ` of ${totalCount}`} deployments
                   </span>
                 </div>
+                {nextPage && (
+                  <Button variant="outline-primary" onClick={handleLoadMore} disabled={loadingMore}>
+                    {loadingMore ? 'Loading...' : 'Load More'}
+                  </Button>
+                )}
               </div>
             </Card.Body>
           </Card>
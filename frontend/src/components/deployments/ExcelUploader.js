@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Card, Button, Form, Alert, Spinner, Table, Modal } from 'react-bootstrap';
 import * as XLSX from 'xlsx';
 import axios from 'axios';
+import { waitForImport } from '../../utils/importJobs';
 
 const ExcelUploader = ({ projectId, onUploadSuccess }) => {
   const [file, setFile] = useState(null);
@@ -12,6 +13,8 @@ const ExcelUploader = ({ projectId, onUploadSuccess }) => {
   const [showPreviewModal, setShowPreviewModal] = useState(false);
   const [columnMap, setColumnMap] = useState({});
   const [projectFields, setProjectFields] = useState([]);
+  // Empty to add every row; otherwise the column existing deployments are matched on
+  const [upsertKey, setUpsertKey] = useState('');
   
   useEffect(() => {
     // Fetch project fields
@@ -121,9 +124,13 @@ const ExcelUploader = ({ projectId, onUploadSuccess }) => {
     const formData = new FormData();
     formData.append('file', file);
     formData.append('column_map', JSON.stringify(columnMap));
+    if (upsertKey) {
+      formData.append('mode', 'upsert');
+      formData.append('key', upsertKey);
+    }
     
     try {
-      const { data } = await axios.post(
+      const response = await axios.post(
         `http://localhost:8000/api/projects/${projectId}/import_excel/`,
         formData,
         {
@@ -132,6 +139,7 @@ const ExcelUploader = ({ projectId, onUploadSuccess }) => {
           }
         }
       );
+      const data = await waitForImport(response);
       
       if (onUploadSuccess) {
         onUploadSuccess(data);
@@ -178,6 +186,16 @@ const ExcelUploader = ({ projectId, onUploadSuccess }) => {
           </Form.Text>
         </Form.Group>
         
+        <Form.Group className="mb-3">
+          <Form.Label>Rows Already Imported</Form.Label>
+          <Form.Select value={upsertKey} onChange={(e) => setUpsertKey(e.target.value)}>
+            <option value="">Add every row as a new deployment</option>
+            <option value="new_sn">Update deployments with the same New SN</option>
+            <option value="current_sn">Update deployments with the same Current SN</option>
+            <option value="deployment_id">Update deployments with the same Deployment ID</option>
+          </Form.Select>
+        </Form.Group>
+        
         {fileName && (
           <Alert variant="info">
             <div className="d-flex justify-content-between align-items-center">
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useParams, Link, useNavigate } from 'react-router-dom';
 import { Container, Row, Col, Card, Button, Table, Form, Modal, Spinner, Alert } from 'react-bootstrap';
 import axios from 'axios';
+import { waitForImport } from '../../utils/importJobs';
 
 const ProjectDetail = () => {
   const { id } = useParams();
@@ -35,8 +36,8 @@ const ProjectDetail = () => {
         
         // Fetch deployment count in a separate request
         try {
-          const deploymentResponse = await axios.get(`http://localhost:8000/api/deployments/deployments/?project=${id}`);
-          setDeploymentCount(deploymentResponse.data.length);
+          const { data: stats } = await axios.get(`http://localhost:8000/api/projects/${id}/stats/`);
+          setDeploymentCount(stats.total);
         } catch (error) {
           console.error('Error fetching deployments:', error);
         }
@@ -141,7 +142,7 @@ const ProjectDetail = () => {
     formData.append('file', uploadFile);
     
     try {
-      const { data } = await axios.post(
+      const response = await axios.post(
         `http://localhost:8000/api/projects/${id}/import_excel/`,
         formData,
         {
@@ -150,6 +151,7 @@ const ProjectDetail = () => {
           }
         }
       );
+      await waitForImport(response);
       
       // Refresh project data after successful import
       const projectResponse = await axios.get(`http://localhost:8000/api/projects/${id}/`);
@@ -157,8 +159,8 @@ const ProjectDetail = () => {
       
       // Refresh deployment count
       // To this
-      const deploymentResponse = await axios.get(`http://localhost:8000/api/deployments/deployments/?project=${id}`);
-      setDeploymentCount(deploymentResponse.data.length);
+      const { data: stats } = await axios.get(`http://localhost:8000/api/projects/${id}/stats/`);
+      setDeploymentCount(stats.total);
       
       setShowUploadModal(false);
     } catch (error) {
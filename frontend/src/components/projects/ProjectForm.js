@@ -21,11 +21,17 @@ const ProjectForm = () => {
   // Custom fields state
   const [customFields, setCustomFields] = useState([]);
   
+  // Server-side copy of the file, set once it has been analyzed
+  const [uploadId, setUploadId] = useState(null);
+  // Also create a deployment for each row of the sheet
+  const [importRows, setImportRows] = useState(false);
+  
   const handleFileChange = (e) => {
     const selectedFile = e.target.files[0];
     if (selectedFile) {
       setFile(selectedFile);
       setFileName(selectedFile.name);
+      setUploadId(null);
       
       // Preview the Excel file
       const reader = new FileReader();
@@ -70,13 +76,16 @@ const ProjectForm = () => {
         }
       });
       
-      const { columns } = response.data;
+      const { columns, upload_id } = response.data;
+      setUploadId(upload_id);
       
       // Update column preview with suggested field types
       setColumnPreview(prevColumns => 
         prevColumns.map((col, index) => ({
           ...col,
           fieldType: columns[index]?.field_type || 'text',
+          confidence: columns[index]?.confidence,
+          suggestedOptions: columns[index]?.options || [],
           sampleValues: columns[index]?.sample_values || []
         }))
       );
@@ -121,7 +130,9 @@ const ProjectForm = () => {
         fieldType: col.fieldType,
         isRequired: false,
         order: index,
-        options: col.fieldType === 'dropdown' ? col.sampleValues : null
+        options: col.fieldType === 'dropdown'
+          ? (col.suggestedOptions?.length ? col.suggestedOptions : col.sampleValues)
+          : null
       }));
     
     setCustomFields(fields);
@@ -171,7 +182,15 @@ const ProjectForm = () => {
         formData.append('name', name);
         formData.append('description', description);
         formData.append('expected_count', expectedCount === '' ? 0 : parseInt(expectedCount));
-        formData.append('file', file);
+        // Refer to the analyzed file instead of sending it again
+        if (uploadId) {
+          formData.append('upload_id', uploadId);
+        } else {
+          formData.append('file', file);
+        }
+        if (importRows) {
+          formData.append('import_rows', 'true');
+        }
         
         const projectResponse = await axios.post(
           'http://localhost:8000/api/projects/create_with_excel/',
@@ -300,6 +319,15 @@ const ProjectForm = () => {
               <Form.Text className="text-muted">
                 Upload an Excel file to automatically create fields based on the columns.
               </Form.Text>
+              {file && (
+                <Form.Check
+                  type="checkbox"
+                  className="mt-2"
+                  label="Import the rows as deployments"
+                  checked={importRows}
+                  onChange={(e) => setImportRows(e.target.checked)}
+                />
+              )}
             </Form.Group>
             
             <Button variant="primary" type="submit">
@@ -0,0 +1,26 @@
+// Change events for a project's deployments, pushed by the server as
+// server-sent events. EventSource cannot send headers, so the token goes in
+// the URL. The browser reconnects by itself; every (re)connection starts
+// with a `ready` event, after which the caller should reload what it shows
+// since events may have been missed while disconnected.
+const EVENT_TYPES = ['ready', 'created', 'updated', 'deleted', 'reload'];
+
+export const subscribeToProject = (projectId, onEvent) => {
+  if (!window.EventSource) {
+    return () => {};
+  }
+
+  const token = localStorage.getItem('authToken');
+  const params = token ? `?token=${encodeURIComponent(token)}` : '';
+  const source = new EventSource(
+    `http://localhost:8000/api/deployments/events/${projectId}/${params}`
+  );
+
+  EVENT_TYPES.forEach((type) => {
+    source.addEventListener(type, (message) => {
+      onEvent({ type, ...JSON.parse(message.data || '{}') });
+    });
+  });
+
+  return () => source.close();
+};
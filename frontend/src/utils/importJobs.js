@@ -0,0 +1,24 @@
+import axios from 'axios';
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Uploads are imported in the background: a 202 response carries a status_url
+// to poll until the job has finished. Synchronous responses are returned as-is.
+export const waitForImport = async (response, interval = 1000) => {
+  if (response.status !== 202) {
+    return response.data;
+  }
+
+  let job = response.data.job;
+  while (job.status === 'queued' || job.status === 'running') {
+    await sleep(interval);
+    ({ data: job } = await axios.get(response.data.status_url));
+  }
+
+  if (job.status === 'failed') {
+    const error = new Error(job.message);
+    error.response = { data: { error: job.message } };
+    throw error;
+  }
+  return job;
+};
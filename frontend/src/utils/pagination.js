@@ -0,0 +1,21 @@
+import axios from 'axios';
+
+// Rows fetched per request by lists that load more as the user asks for them
+export const PAGE_SIZE = 100;
+
+// Fetch one page of a paginated list endpoint. `next` is the URL of the
+// following page (a cursor link), or null on the last one. Unpaginated
+// endpoints (plain arrays) come back as a single page.
+export const fetchPage = async (url) => {
+  const { data } = await axios.get(url);
+  if (Array.isArray(data)) {
+    return { rows: data, next: null };
+  }
+  return { rows: data.results, next: data.next };
+};
+
+// Add page_size to a list URL
+export const withPageSize = (url, pageSize = PAGE_SIZE) => {
+  const separator = url.includes('?') ? '&' : '?';
+  return `${url}${separator}page_size=${pageSize}`;
+};